@@ -1,68 +1,156 @@
 # Required Libraries
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
-import seaborn as sns
-import mysql.connector
-from mysql.connector import Error
-import chardet
+from chardet import UniversalDetector
 from datetime import datetime
+import argparse
+import functools
+import json
+from concurrent.futures import ThreadPoolExecutor
+import os
+import tempfile
+import threading
+import time
+from table_cache import source_fingerprint, evict_cache
+from table_schemas import apply_schema
+from db_loader import foreign_key_graph, load_levels, partition_by_key_range
+from incremental_load import TableDelta, DatabaseFingerprints, create_metadata_tables, bump_table_version
+from storage_backends import MySQLBackend, backend_names, get_backend
+from query_catalog import load_query_script, load_catalog, run_catalog
+from table_indexes import (secondary_indexes, create_secondary_indexes, drop_secondary_indexes,
+                           partition_by_order_year, index_usage_report)
+from sales_summaries import refresh_summaries, summary_query_file
+from star_schema import StarSchema
+from currency_conversion import ExchangeRates, create_local_revenue_view, local_revenue
+from customer_analytics import create_customer_views, rfm_scores, cohort_matrix
+from streaming_stats import StatsAccumulator
+from heavy_hitters import SalesTopK, top_values
+from sales_rollups import SalesRollups, rollup_store_path
+from data_quality import DataValidator, quarantine_dir, table_rules
+from stage_profiler import enable_profiling, profiled, set_rows, stage
+from pipeline_dag import FingerprintStore, Pipeline, TableStore
+from chart_rendering import ChartReport, chart_modes, chart_formats, large_data_rows, kde_sample_size
 
 
+cache_dir = '.dataspark_cache'
+encoding_cache_file = os.path.join(cache_dir, 'encodings.json')
 
-def detect_encoding(file_path):
+# Rows folded into the EDA statistics at a time
+eda_chunk_rows = 1 << 18
+
+
+# Read cached encodings, keyed by path, size and modification time
+def load_encoding_cache():
+    try:
+        with open(encoding_cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# Add one entry to the encoding cache. The file is re-read first so that parallel loaders
+# writing their own entries do not overwrite each other.
+def save_encoding_cache(cache_key, encoding):
+    cache = load_encoding_cache()
+    cache[cache_key] = encoding
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{encoding_cache_file}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, encoding_cache_file)
+
+
+# Yield a bounded prefix plus a few strided windows of the file, or every block when
+# sample_size is None
+def read_sample_blocks(f, file_size, sample_size, windows, window_size, block_size=1 << 16):
+    if sample_size is None or file_size <= sample_size + windows * window_size:
+        yield from iter(lambda: f.read(block_size), b'')
+        return
+    while f.tell() < sample_size:
+        yield f.read(min(block_size, sample_size - f.tell()))
+    for i in range(1, windows + 1):
+        # Start each window on a line boundary so multi-byte characters are not split
+        f.seek(file_size * i // (windows + 1))
+        f.readline()
+        yield f.read(window_size)
+
+
+# Detect the encoding from a sample of the file, stopping as soon as chardet is confident.
+# sample_size=None scans the whole file; refresh=True ignores the cache.
+@profiled
+def detect_encoding(file_path, sample_size=1 << 20, windows=4, window_size=1 << 16, refresh=False):
+    stat = os.stat(file_path)
+    cache_key = f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    if not refresh:
+        cache = load_encoding_cache()
+        if cache_key in cache:
+            return cache[cache_key]
+
+    detector = UniversalDetector()
+    fed = False
     with open(file_path, 'rb') as f:
-        rawdata = f.read()
-    result = chardet.detect(rawdata)
-    return result['encoding']
+        for block in read_sample_blocks(f, stat.st_size, sample_size, windows, window_size):
+            # Pure ASCII blocks carry no evidence about the encoding
+            if block.isascii():
+                continue
+            detector.feed(block)
+            fed = True
+            if detector.done:
+                break
+    detector.close()
+    encoding = detector.result['encoding'] if fed else 'ascii'
+
+    save_encoding_cache(cache_key, encoding)
+    return encoding
 
 #Perform summary statistics and basic EDA
-def eda_summary(df, file_name):
+# The statistics come from one pass of a StatsAccumulator over eda_chunk_rows rows at a time;
+# pass stats to summarize a table that was accumulated elsewhere (say while it was streamed
+# into the database) without needing the DataFrame.
+@profiled
+def eda_summary(df, file_name, stats=None, report=None):
+    report = report if report is not None else ChartReport()
     print(f"\nEDA Summary for {file_name}")
+    if stats is None:
+        stats = StatsAccumulator()
+        for start in range(0, len(df), eda_chunk_rows):
+            stats.update(df.iloc[start:start + eda_chunk_rows])
 
     # Print summary statistics
     print(f'\nSummary Statistics:')
-    print(df.describe(include='all'))
+    print(stats.summary())
 
     # Correlation matrix
-    if df.select_dtypes(include=['number']).shape[1] > 1:
-        plt.figure(figsize=(10, 8))
-        numeric_df = df.select_dtypes(include=['number'])
-        sns.heatmap(numeric_df.corr().round(2), annot=True, cmap='viridis')
-        plt.title(f'Correlation Matrix for {file_name}')
-        plt.show(block=False)
+    correlation = stats.correlation()
+    if correlation.shape[1] > 1:
+        report.add('heatmap', correlation, f'Correlation Matrix for {file_name}', figsize=(10, 8))
 
     # Check for unique values
     print('\nUnique values per column:')
-    for col in df.columns:
-        print(f'{col}: {df[col].nunique()} unique values')
+    for col, unique in stats.distinct_counts().items():
+        print(f'{col}: {unique} unique values')
 
 
 # Customer demographics analysis
-def analyze_customer_demographics(mydf):
+@profiled
+def analyze_customer_demographics(mydf, report=None):
+    report = report if report is not None else ChartReport()
     print('\nCustomer Demographics Analysis')
-    mydf['Birthday'] = pd.to_datetime(mydf['Birthday'], errors='coerce')
+    # Derived columns stay local: the Customers frame is shared with the stages loading it
+    birthday = pd.to_datetime(mydf['Birthday'], errors='coerce')
     today = pd.Timestamp('today')
-    mydf['Age'] = (today - mydf['Birthday']).dt.days // 365
-
-    plt.figure(figsize=(8, 6))
-    sns.countplot(data=mydf, x='Gender')
-    plt.title('Gender Distribution')
-    plt.show(block=False)
+    age = (today - birthday).dt.days // 365
 
-    plt.figure(figsize=(8, 6))
-    sns.histplot(mydf['Age'].dropna(), bins=20, kde=True)
-    plt.title('Age Distribution')
-    plt.show(block=False)
-
-    plt.figure(figsize=(8, 6))
-    mydf['City'].value_counts().head(10).plot(kind='bar')
-    plt.title('Top 10 Cities by Number of Customers')
-    plt.xlabel('City')
-    plt.ylabel('Number of Customers')
-    plt.show(block=False)
+    report.add('count', mydf['Gender'], 'Gender Distribution')
+    report.add('hist', age.dropna().rename('Age'), 'Age Distribution', bins=20)
+    report.add('bar', top_values(mydf['City'], 10), 'Top 10 Cities by Number of Customers',
+               xlabel='City', ylabel='Number of Customers')
 
 # Customer purchase analysis
-def analyze_customer_purchases(df):
+@profiled
+def analyze_customer_purchases(df, report=None):
+    report = report if report is not None else ChartReport()
     print('\nCustomer Purchase Analysis')
     if 'Quantity' in df.columns and 'Unit Price USD' in df.columns:
         # Clean 'Unit Price USD' by removing extra dollar signs and any non-numeric characters
@@ -81,73 +169,106 @@ def analyze_customer_purchases(df):
         df['Order Value'] = pd.to_numeric(df['Order Value'], errors='coerce')
         
         # Plot Order Value Distribution
-        plt.figure(figsize=(10, 6))
-        sns.histplot(df['Order Value'], bins=30, kde=True)
-        plt.title('Order Value Distribution')
-        plt.xlabel('Order Value')
-        plt.ylabel('Frequency')
-        plt.show(block=False)
+        report.add('hist', df['Order Value'], 'Order Value Distribution', xlabel='Order Value',
+                   ylabel='Frequency', figsize=(10, 6), bins=30)
 
         # Calculate Average Order Value
         avg_order_value = round(df['Order Value'].mean(), 2)
         print(f"Average Order Value: ${avg_order_value:.2f}")
     
         # Total Orders by Product        
-        plt.figure(figsize=(10, 6))
-        df['Product Name'].value_counts().head(10).plot(kind='bar', color='skyblue')
-        plt.title('Top 10 Products by Total Orders')
-        plt.xlabel('Product')
-        plt.ylabel('Total Orders')
-        plt.xticks(rotation=45, ha='right')
-        plt.show(block=False)
+        report.add('bar', top_values(df['Product Name'], 10), 'Top 10 Products by Total Orders',
+                   xlabel='Product', ylabel='Total Orders', figsize=(10, 6), color='skyblue', rotate_labels=True)
 
 
 # Sales trend analysis
-def analyze_sales_trends(mydf):
+# Monthly line counts come from the daily rollups (see sales_rollups.py) rather than a resample
+# of every Sales row; without rollups they are built from mydf, which is left unchanged.
+@profiled
+def analyze_sales_trends(mydf, rollups=None, period='month', report=None):
+    report = report if report is not None else ChartReport()
     print('\nSales Trends Analysis')
-    if 'Order Date' in mydf.columns:
-        mydf['Order Date'] = pd.to_datetime(mydf['Order Date'], errors='coerce')
-        mydf.set_index('Order Date', inplace=True)
-        monthly_sales = mydf.resample('ME').size()
+    if rollups is None:
+        if mydf is None or 'Order Date' not in mydf.columns:
+            return
+        rollups = SalesRollups()
+        rollups.append(mydf)
+    sales = rollups.rollup(period)['Line Count']
+    report.add('line', sales, f"{'Daily' if period == 'day' else period.capitalize() + 'ly'} Sales Trends",
+               xlabel='Date', ylabel='Number of Sales', figsize=(12, 6))
+
 
-        plt.figure(figsize=(12, 6))
-        monthly_sales.plot()
-        plt.title('Monthly Sales Trends')
-        plt.xlabel('Date')
-        plt.ylabel('Number of Sales')
-        plt.show(block=False)
+# Customer value analysis: RFM segments and monthly acquisition cohorts (see customer_analytics.py)
+@profiled
+def analyze_customer_value(sales, products, report=None):
+    report = report if report is not None else ChartReport()
+    print('\nCustomer Value Analysis')
+    scores = rfm_scores(sales, products)
+    print(f"RFM scores for {len(scores)} customers (5 = most recent / frequent / valuable):")
+    print(scores.groupby('R')[['Recency', 'Frequency', 'Monetary']].mean().round(2))
+    print("Largest RFM segments:")
+    print(scores['RFM'].value_counts().head(10))
+
+    active, retention = cohort_matrix(sales)
+    print(f"Monthly cohorts: {len(active)}, average month-1 retention: {retention[1].mean():.2%}"
+          if len(retention.columns) > 1 else f"Monthly cohorts: {len(active)}")
+    report.add('heatmap', retention, 'Monthly Cohort Retention', xlabel='Months Since First Order',
+               ylabel='Cohort', figsize=(14, 10), annotate=len(retention.columns) <= 12)
 
 
 # Product analysis
-def analyze_products(mydf):
+@profiled
+def analyze_products(mydf, report=None):
+    report = report if report is not None else ChartReport()
     print('\nProduct Analysis')
 
     if 'Unit Price USD' in mydf.columns:
-        mydf['Unit Price USD'] = mydf['Unit Price USD'].replace({r'\$': '', ' ': ''}, regex=True)
-        mydf['Unit Price USD'] = pd.to_numeric(mydf['Unit Price USD'], errors='coerce')
+        # Parsed into a local series: the Products frame is shared with the stages loading it
+        prices = mydf['Unit Price USD'].replace({r'\$': '', ' ': ''}, regex=True)
+        prices = pd.to_numeric(prices, errors='coerce')
 
-        plt.figure(figsize=(8, 6))
-        sns.histplot(mydf['Unit Price USD'].dropna(), bins=20, kde=True)
-        plt.title('Product Price Distribution')
-        plt.xlabel('Product Price (USD)')
-        plt.ylabel('Frequency')
-        plt.show(block=False)
+        report.add('hist', prices.dropna(), 'Product Price Distribution',
+                   xlabel='Product Price (USD)', ylabel='Frequency', bins=20)
 
     if 'Category' in mydf.columns:
-        plt.figure(figsize=(10, 8))
-        mydf['Category'].value_counts().plot(kind='bar')
-        plt.title('Product Category Distribution')
-        plt.xlabel('Category')
-        plt.ylabel('Number of Products')
-        plt.show()
+        report.add('bar', mydf['Category'].value_counts(), 'Product Category Distribution',
+                   xlabel='Category', ylabel='Number of Products', figsize=(10, 8))
+
 
+# Column types applied while parsing, so every chunk of a table comes out with the same dtypes
+csv_dtypes = {
+    "Sales": {'Order Number': 'int64', 'Line Item': 'int64', 'CustomerKey': 'int64', 'StoreKey': 'int64',
+              'ProductKey': 'int64', 'Quantity': 'int64', 'Currency Code': str},
+    "Products": {'ProductKey': 'int64', 'SubcategoryKey': 'int64', 'CategoryKey': 'int64'},
+    "Customers": {'CustomerKey': 'int64', 'Zip Code': str},
+    "Stores": {'StoreKey': 'int64'}
+}
 
-# Load csv file
-def detect_and_load_csv(file_path):
+
+# Load csv file, detecting the encoding unless one is given. With chunksize set, returns an
+# iterator of DataFrames of at most chunksize rows instead of one DataFrame.
+@profiled
+def detect_and_load_csv(file_path, encoding=None, chunksize=None, dtype=None):
     try:
-        encoding = detect_encoding(file_path)
-        print(f"Detected encoding for {file_path}: {encoding}")
-        df = pd.read_csv(file_path, encoding=encoding)
+        sampled = encoding is None
+        if sampled:
+            encoding = detect_encoding(file_path)
+            print(f"Detected encoding for {file_path}: {encoding}")
+        else:
+            print(f"Using encoding {encoding} for {file_path}")
+
+        if chunksize:
+            return stream_csv_chunks(file_path, chunksize, encoding, dtype=dtype, redetect=sampled)
+
+        try:
+            df = pd.read_csv(file_path, encoding=encoding, dtype=dtype)
+        except UnicodeDecodeError:
+            if not sampled:
+                raise
+            # The sample missed the non-ASCII bytes; fall back to scanning the whole file
+            encoding = detect_encoding(file_path, sample_size=None, refresh=True)
+            print(f"Re-detected encoding for {file_path} from the full file: {encoding}")
+            df = pd.read_csv(file_path, encoding=encoding, dtype=dtype)
         return df
     except FileNotFoundError:
         print(f"File {file_path} not found. Please check the file path.")
@@ -155,6 +276,28 @@ def detect_and_load_csv(file_path):
         print(f"An error occurred while loading {file_path}: {e}")
     return None
 
+
+# Yield a csv file in chunks of chunksize rows. If a sampled encoding turns out to be wrong,
+# re-detect it from the full file and resume after the rows already yielded.
+def stream_csv_chunks(file_path, chunksize, encoding, dtype=None, redetect=False):
+    rows_read = 0
+    while True:
+        try:
+            with pd.read_csv(file_path, encoding=encoding, dtype=dtype, chunksize=chunksize,
+                             skiprows=range(1, rows_read + 1)) as reader:
+                for chunk in reader:
+                    rows_read += len(chunk)
+                    yield chunk
+            return
+        except UnicodeDecodeError:
+            if not redetect:
+                raise
+            redetect = False
+            encoding = detect_encoding(file_path, sample_size=None, refresh=True)
+            print(f"Re-detected encoding for {file_path} from the full file: {encoding}, "
+                  f"resuming after row {rows_read}")
+
+
 # Convert date format 
 def convert_date_format(date_str):
     # Check if the date_str is NaN or not a string
@@ -166,226 +309,635 @@ def convert_date_format(date_str):
     except ValueError:
         return None  # Return None if date cannot be parsed
 
+# Normalize a column of date strings to datetime64. Dates repeat heavily, so each distinct
+# value is parsed once and the results are mapped back by position. NaN, non-strings and
+# unparseable values become NaT, matching the None returned by convert_date_format.
+@profiled
+def normalize_dates(series, date_format='%m/%d/%Y'):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    codes, uniques = pd.factorize(series)
+    uniques = pd.Series(uniques, dtype=object)
+    parsed = pd.to_datetime(uniques.where(uniques.map(type) == str), format=date_format, errors='coerce')
+    # factorize marks missing values with -1, which picks up the trailing NaT
+    lookup = np.append(parsed.to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))
+    return pd.Series(lookup[codes], index=series.index, name=series.name)
+
+
+# Bump whenever clean_table or csv_dtypes change, so cached cleaned tables are rebuilt
+cleaning_version = 3
+
+# Date columns parsed by clean_table
+date_columns = {
+    "Sales": ['Order Date', 'Delivery Date'],
+    "Customers": ['Birthday'],
+    "Stores": ['Open Date'],
+    "Exchange_Rates": ['Date']
+}
+
+
+# Clean one table (or one chunk of it) in place of the raw csv columns. Date text that does not
+# parse becomes NaT and is recorded in df.attrs['Unparsed Dates'] (column -> [index label, text]
+# pairs) so that data_quality.py can reject those rows instead of loading them without a date.
+@profiled
+def clean_table(table_name, df):
+    unparsed = {}
+    for col in date_columns.get(table_name, ()):
+        raw = df[col]
+        df[col] = normalize_dates(raw)
+        failed = raw.notna().to_numpy() & df[col].isna().to_numpy()
+        if failed.any():
+            unparsed[col] = [[int(label), str(value)] for label, value in raw[failed].items()]
+    if unparsed:
+        df.attrs['Unparsed Dates'] = unparsed
+
+    if table_name == "Products":
+        df['Unit Cost USD'] = df['Unit Cost USD'].replace({r'\$': '', ',': ''}, regex=True).astype(float)
+        df['Unit Price USD'] = df['Unit Price USD'].replace({r'\$': '', ',': ''}, regex=True).astype(float)
+
+    return df
+
+# Read one table's CSV file; the load stages of build_pipeline run it on a worker process
+@profiled
+def load_table(table_name, path, encoding=None):
+    print(f"Loading {table_name} data from {path}")
+    df = detect_and_load_csv(path, encoding=encoding, dtype=csv_dtypes.get(table_name))
+    if df is None:
+        print(f"Failed to load {table_name} data.")
+    return df
+
+
+# MySQL connection settings
+mysql_config = {
+    'host': 'localhost',
+    'database': 'data_spark',
+    'user': 'root',
+    'password': 'aashi'
+}
+
+# Default storage backend; --backend sqlite/duckdb swaps in an embedded engine
+mysql_backend = MySQLBackend(mysql_config)
+
+
 # Connect to MySQL
-def connect_to_mysql():
-    try:
-        conn = mysql.connector.connect(
-            host='localhost',
-            database='data_spark',
-            user='root',
-            password='aashi'
-        )
-        if conn.is_connected():
-            print("Connected to MySQL database")
-            return conn, conn.cursor()
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
-        return None, None
+def connect_to_mysql(allow_local_infile=False):
+    return mysql_backend.connect(allow_local_infile=allow_local_infile)
 
 
 # Close MySQL connection    
 def close_mysql_connection(conn, cursor):
-    if cursor:
-        cursor.close()
-    if conn:
-        conn.close()
-    print("MySQL connection is closed")
-
-
-
-# Create MySQL table
-def create_table(table_name, cursor):
-    table_definitions = {
-        "Sales": """
-            CREATE TABLE IF NOT EXISTS Sales (
-                `Order Number` INT,
-                `Line Item` INT,
-                `Order Date` DATE,
-                `Delivery Date` DATE,
-                CustomerKey INT,
-                StoreKey INT,
-                ProductKey INT,
-                Quantity INT,
-                `Currency Code` VARCHAR(3),
-                PRIMARY KEY (`Order Number`, `Line Item`),  -- Composite primary key
-                FOREIGN KEY (CustomerKey) REFERENCES Customers(CustomerKey),
-                FOREIGN KEY (ProductKey) REFERENCES Products(ProductKey)
-            );
-        """,
-        "Customers": """
-            CREATE TABLE IF NOT EXISTS Customers (
-                CustomerKey INT PRIMARY KEY,
-                Gender VARCHAR(10),
-                `Name` VARCHAR(255),
-                City VARCHAR(255),
-                State VARCHAR(255),
-                `State Code` VARCHAR(5),
-                `Zip Code` VARCHAR(10),
-                Country VARCHAR(255),
-                Continent VARCHAR(255),
-                Birthday DATE
-            );
-        """,
-        "Products": """
-            CREATE TABLE IF NOT EXISTS Products (
-                ProductKey INT PRIMARY KEY,
-                `Product Name` VARCHAR(255),
-                Brand VARCHAR(255),
-                Color VARCHAR(50),
-                `Unit Cost USD` DECIMAL(10,2),
-                `Unit Price USD` DECIMAL(10,2),
-                SubcategoryKey INT,
-                Subcategory VARCHAR(255),
-                CategoryKey INT,
-                Category VARCHAR(255)
-            );
-        """,
-        "Exchange_Rates": """
-            CREATE TABLE IF NOT EXISTS Exchange_Rates (
-                `Date` DATE PRIMARY KEY,
-                `Currency` VARCHAR(3),
-                `Exchange` DECIMAL(10,4)
-            );
-        """,
-        "Data_Dictionary": """
-            CREATE TABLE IF NOT EXISTS Data_Dictionary (
-                `Table` VARCHAR(255),
-                `Field` VARCHAR(255),
-                `Description` TEXT
-            );
-        """,
-        "Stores": """
-            CREATE TABLE IF NOT EXISTS Stores(
-                StoreKey INT PRIMARY KEY,
-                Country VARCHAR(100),
-                State VARCHAR(255), 
-               `Square Meters` INT, 
-               `Open Date` DATE 
-            );
-        """
-          
-    }
+    mysql_backend.close(conn, cursor)
+
+
+
+# MySQL table definitions
+table_definitions = {
+    "Sales": """
+        CREATE TABLE IF NOT EXISTS Sales (
+            `Order Number` INT,
+            `Line Item` INT,
+            `Order Date` DATE,
+            `Delivery Date` DATE,
+            CustomerKey INT,
+            StoreKey INT,
+            ProductKey INT,
+            Quantity INT,
+            `Currency Code` VARCHAR(3),
+            PRIMARY KEY (`Order Number`, `Line Item`),  -- Composite primary key
+            FOREIGN KEY (CustomerKey) REFERENCES Customers(CustomerKey),
+            FOREIGN KEY (ProductKey) REFERENCES Products(ProductKey)
+        );
+    """,
+    "Customers": """
+        CREATE TABLE IF NOT EXISTS Customers (
+            CustomerKey INT PRIMARY KEY,
+            Gender VARCHAR(10),
+            `Name` VARCHAR(255),
+            City VARCHAR(255),
+            State VARCHAR(255),
+            `State Code` VARCHAR(5),
+            `Zip Code` VARCHAR(10),
+            Country VARCHAR(255),
+            Continent VARCHAR(255),
+            Birthday DATE
+        );
+    """,
+    "Products": """
+        CREATE TABLE IF NOT EXISTS Products (
+            ProductKey INT PRIMARY KEY,
+            `Product Name` VARCHAR(255),
+            Brand VARCHAR(255),
+            Color VARCHAR(50),
+            `Unit Cost USD` DECIMAL(10,2),
+            `Unit Price USD` DECIMAL(10,2),
+            SubcategoryKey INT,
+            Subcategory VARCHAR(255),
+            CategoryKey INT,
+            Category VARCHAR(255)
+        );
+    """,
+    "Exchange_Rates": """
+        CREATE TABLE IF NOT EXISTS Exchange_Rates (
+            `Date` DATE,
+            `Currency` VARCHAR(3),
+            `Exchange` DECIMAL(10,4),
+            PRIMARY KEY (`Date`, `Currency`)  -- One rate per currency per day
+        );
+    """,
+    "Data_Dictionary": """
+        CREATE TABLE IF NOT EXISTS Data_Dictionary (
+            `Table` VARCHAR(255),
+            `Field` VARCHAR(255),
+            `Description` TEXT
+        );
+    """,
+    "Stores": """
+        CREATE TABLE IF NOT EXISTS Stores(
+            StoreKey INT PRIMARY KEY,
+            Country VARCHAR(100),
+            State VARCHAR(255), 
+           `Square Meters` INT, 
+           `Open Date` DATE 
+        );
+    """
 
+}
+
+
+# Create MySQL table (translated to the backend's dialect). partition_years=(first, last)
+# creates Sales RANGE-partitioned by order year on backends that support it.
+def create_table(table_name, cursor, backend=mysql_backend, partition_years=None):
     if table_name in table_definitions:
+        ddl = table_definitions[table_name]
+        if table_name == "Sales" and partition_years:
+            if backend.supports_partitioning:
+                ddl = partition_by_order_year(ddl, *partition_years)
+            else:
+                print(f"The {backend.name} backend has no table partitioning; creating Sales unpartitioned.")
         try:
-            cursor.execute(table_definitions[table_name])
+            cursor.execute(backend.translate_ddl(ddl))
             print(f"Table {table_name} created or already exists.")
-        except mysql.connector.Error as err:
+        except backend.error as err:
             print(f"Error creating table {table_name}: {err}")
 
 
+# Column order used when inserting each table
+table_columns = {
+    "Sales": ['Order Number', 'Line Item', 'Order Date', 'Delivery Date', 'CustomerKey',
+              'StoreKey', 'ProductKey', 'Quantity', 'Currency Code'],
+    "Customers": ['CustomerKey', 'Gender', 'Name', 'City', 'State', 'State Code',
+                  'Zip Code', 'Country', 'Continent', 'Birthday'],
+    "Products": ['ProductKey', 'Product Name', 'Brand', 'Color', 'Unit Cost USD', 'Unit Price USD',
+                 'SubcategoryKey', 'Subcategory', 'CategoryKey', 'Category'],
+    "Exchange_Rates": ['Date', 'Currency', 'Exchange'],
+    "Data_Dictionary": ['Table', 'Field', 'Description'],
+    "Stores": ['StoreKey', 'Country', 'State', 'Square Meters', 'Open Date']
+}
+
+# Primary key of each table, the conflict target for ON CONFLICT upserts
+key_columns = {
+    "Sales": ['Order Number', 'Line Item'],
+    "Customers": ['CustomerKey'],
+    "Products": ['ProductKey'],
+    "Exchange_Rates": ['Date', 'Currency'],
+    "Data_Dictionary": [],
+    "Stores": ['StoreKey']
+}
+
+# Columns refreshed by ON DUPLICATE KEY UPDATE for each table
+update_columns = {
+    "Sales": ['Order Date', 'Delivery Date', 'CustomerKey', 'StoreKey', 'ProductKey',
+              'Quantity', 'Currency Code'],
+    "Customers": ['Gender', 'Name', 'City', 'State', 'State Code', 'Zip Code', 'Country',
+                  'Continent', 'Birthday'],
+    "Products": ['Product Name', 'Brand', 'Color', 'Unit Cost USD', 'Unit Price USD',
+                 'SubcategoryKey', 'Subcategory', 'CategoryKey', 'Category'],
+    "Exchange_Rates": ['Exchange'],
+    "Data_Dictionary": ['Description'],
+    "Stores": ['Country', 'State', 'Square Meters', 'Open Date']
+}
+
+insert_modes = ['row', 'executemany', 'batch', 'infile']
+
+
+# Build an upsert statement with row_count groups of placeholders
+def build_upsert_statement(table_name, row_count=1, backend=mysql_backend):
+    return backend.upsert_statement(table_name, table_columns[table_name], key_columns[table_name],
+                                    update_columns[table_name], row_count)
+
+
+# Convert a slice of a DataFrame into row tuples, replacing NaN with None (for SQL compatibility)
+def dataframe_rows(table_name, df):
+    frame = df[table_columns[table_name]]
+    values = frame.astype(object)
+    # Bind datetime64 columns as plain dates to match the DATE columns
+    for col in frame.select_dtypes(include=['datetime']).columns:
+        values[col] = frame[col].dt.date.astype(object)  # an all-NaT batch would stay datetime64
+    values = values.where(pd.notnull(values), None)
+    return list(values.itertuples(index=False, name=None))
+
+
+# Bulk load through a temporary staging table filled with LOAD DATA LOCAL INFILE
+def load_data_infile(table_name, df, cursor):
+    columns = table_columns[table_name]
+    column_list = ', '.join(f'`{col}`' for col in columns)
+    updates = ', '.join(f'`{col}` = VALUES(`{col}`)' for col in update_columns[table_name])
+    staging_table = f"{table_name}_Staging"
+
+    # Backslash is MySQL's escape character, so double it in text columns; \\N marks NULL
+    staged = df[columns].copy()
+    for col in staged.select_dtypes(include=['object', 'string', 'category']).columns:
+        staged[col] = staged[col].str.replace('\\', '\\\\', regex=False)
+
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='', encoding='utf-8') as f:
+        staged.to_csv(f, index=False, header=False, na_rep='\\N', date_format='%Y-%m-%d',
+                      lineterminator='\n')
+        csv_path = f.name
+
+    try:
+        cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging_table}")
+        cursor.execute(f"CREATE TEMPORARY TABLE {staging_table} LIKE {table_name}")
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE '{csv_path.replace(os.sep, '/')}'
+            INTO TABLE {staging_table}
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+            LINES TERMINATED BY '\\n'
+            ({column_list})
+        """)
+        cursor.execute(f"""
+            INSERT INTO {table_name} ({column_list})
+            SELECT {column_list} FROM {staging_table}
+            ON DUPLICATE KEY UPDATE {updates}
+        """)
+        cursor.execute(f"DROP TEMPORARY TABLE {staging_table}")
+    finally:
+        os.remove(csv_path)
+
+
+# Print how much of a table an incremental load actually sends, and return that delta
+def report_delta(table_name, df, delta_df):
+    print(f"Incremental load for {table_name}: {len(delta_df)} new or changed rows of {len(df)}.")
+    return delta_df
+
+
 # Insert data into MySQL table with handling for NaN and duplicates
-def insert_data(table_name, df, cursor, conn):
+# mode: 'row' sends one upsert per row, 'executemany' and 'batch' send batch_size rows per
+# round trip, 'infile' streams the table through LOAD DATA LOCAL INFILE (or, on DuckDB, scans
+# the DataFrame directly).
+# incremental=True only sends rows that are new or changed since the last incremental load.
+@profiled
+def insert_data(table_name, df, cursor, conn, mode='batch', batch_size=1000, incremental=False,
+                backend=mysql_backend):
+    if mode not in backend.insert_modes:
+        raise ValueError(f"Unknown insert mode {mode!r} for {backend.name}, expected one of {backend.insert_modes}")
+    if table_name not in table_columns:
+        print(f"No insert logic defined for {table_name}.")
+        return None
+
+    start = time.perf_counter()
     try:
-        for index, row in df.iterrows():
-            # Replace NaN values with None (for SQL compatibility)
-            row = row.where(pd.notnull(row), None)
+        delta = None
+        if incremental:
+            delta = TableDelta(table_name, cursor, backend)
+            df = report_delta(table_name, df, delta.filter(df))
 
-            if table_name == "Sales":
-                insert_stmt = """
-                    INSERT INTO Sales (`Order Number`, `Line Item`, `Order Date`, `Delivery Date`, CustomerKey, StoreKey, ProductKey, Quantity, `Currency Code`)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                    `Order Date` = VALUES(`Order Date`),
-                    `Delivery Date` = VALUES(`Delivery Date`),
-                    CustomerKey = VALUES(CustomerKey),
-                    StoreKey = VALUES(StoreKey),
-                    ProductKey = VALUES(ProductKey),
-                    Quantity = VALUES(Quantity),
-                    `Currency Code` = VALUES(`Currency Code`);
-                """
-                cursor.execute(insert_stmt, (
-                    row['Order Number'], row['Line Item'], row['Order Date'],
-                    row['Delivery Date'], row['CustomerKey'], row['StoreKey'],
-                    row['ProductKey'], row['Quantity'], row['Currency Code']
-                ))
-
-            elif table_name == "Customers":
-                insert_stmt = """
-                    INSERT INTO Customers (CustomerKey, Gender, Name, City, State, `State Code`, `Zip Code`, Country, Continent, Birthday)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                    Gender = VALUES(Gender),
-                    Name = VALUES(Name),
-                    City = VALUES(City),
-                    State = VALUES(State), 
-                    `State Code` = VALUES(`State Code`),
-                    `Zip Code` = VALUES(`Zip Code`),
-                    Country = VALUES(Country),
-                    Continent = VALUES(Continent),
-                    Birthday = VALUES(Birthday);
-                """
-                cursor.execute(insert_stmt, (
-                    row['CustomerKey'], row['Gender'], row['Name'], row['City'], row['State'],
-                    row['State Code'], row['Zip Code'], row['Country'], row['Continent'], row['Birthday']
-                ))
-
-            elif table_name == "Products":
-                insert_stmt = """
-                    INSERT INTO Products (ProductKey, `Product Name`, Brand, Color, `Unit Cost USD`, `Unit Price USD`, SubcategoryKey, Subcategory, CategoryKey, Category)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                    `Product Name` = VALUES(`Product Name`),
-                    Brand = VALUES(Brand),
-                    Color = VALUES(Color),
-                    `Unit Cost USD` = VALUES(`Unit Cost USD`),
-                    `Unit Price USD` = VALUES(`Unit Price USD`),
-                    SubcategoryKey = VALUES(SubcategoryKey),
-                    Subcategory = VALUES(Subcategory),
-                    CategoryKey = VALUES(CategoryKey),
-                    Category = VALUES(Category);
-                """
-                cursor.execute(insert_stmt, (
-                    row['ProductKey'], row['Product Name'], row['Brand'], row['Color'],
-                    row['Unit Cost USD'], row['Unit Price USD'], row['SubcategoryKey'],
-                    row['Subcategory'], row['CategoryKey'], row['Category']
-                ))
-
-            elif table_name == 'Exchange_Rates':
-                insert_stmt = '''
-                   INSERT INTO Exchange_Rates (Date, Currency, Exchange)
-                   VALUES (%s,%s,%s)
-                   ON DUPLICATE KEY UPDATE
-                   Exchange = VALUES(Exchange);
-                '''
-                cursor.execute(insert_stmt, (
-                    row['Date'], row['Currency'], row['Exchange']
-                ))
-
-            elif table_name == 'Data_Dictionary':
-                insert_stmt = '''
-                   INSERT INTO Data_Dictionary(`Table`, `Field`, `Description`)
-                   VALUES (%s, %s, %s)
-                   ON DUPLICATE KEY UPDATE
-                   `Description` = VALUES(`Description`);
-                '''
-                cursor.execute(insert_stmt, (
-                    row['Table'], row['Field'], row['Description']
-                ))
-
-            elif table_name == "Stores":  # Insert logic for Stores
-                insert_stmt = """
-                    INSERT INTO Stores (StoreKey, Country, State, `Square Meters`, `Open Date`)
-                    VALUES (%s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                    Country = VALUES(Country),
-                    State = VALUES(State),
-                    `Square Meters` = VALUES(`Square Meters`),
-                    `Open Date` = VALUES(`Open Date`);
-                """
-                cursor.execute(insert_stmt, (
-                    row['StoreKey'], row['Country'], row['State'], row['Square Meters'], row['Open Date']
-                ))    
+        if mode == 'infile':
+            if len(df) and backend.name == 'mysql':
+                load_data_infile(table_name, df, cursor)
+            elif len(df):
+                backend.bulk_upsert(cursor, table_name, df[table_columns[table_name]], key_columns[table_name],
+                                    update_columns[table_name])
+        else:
+            single_row_stmt = build_upsert_statement(table_name, backend=backend)
+            # Keep multi-row statements under the backend's bound-parameter limit
+            batch_size = min(batch_size, backend.max_parameters // len(table_columns[table_name]))
+            for begin in range(0, len(df), batch_size):
+                rows = dataframe_rows(table_name, df.iloc[begin:begin + batch_size])
+                if mode == 'row':
+                    for row in rows:
+                        cursor.execute(single_row_stmt, row)
+                elif mode == 'executemany':
+                    cursor.executemany(single_row_stmt, rows)
+                else:
+                    cursor.execute(build_upsert_statement(table_name, len(rows), backend),
+                                   [value for row in rows for value in row])
+        if delta is not None:
+            delta.save(cursor)
+        # New data version, so cached query results over this table are recomputed
+        if len(df):
+            bump_table_version(cursor, backend, table_name)
 
         # Commit the transaction
         conn.commit()
-        print(f"Inserted data successfully into {table_name}.")
+        elapsed = time.perf_counter() - start
+        rows_per_sec = len(df) / elapsed if elapsed > 0 else float('inf')
+        print(f"Inserted data successfully into {table_name}: {len(df)} rows in {elapsed:.2f}s "
+              f"({rows_per_sec:,.0f} rows/sec, mode={mode}).")
+        return rows_per_sec
 
-    except mysql.connector.Error as err:
+    except backend.error as err:
         print(f"Error inserting data into {table_name}: {err}")
+    return None
+
+
+# Clean and insert a table chunk by chunk so memory use depends on the chunk size, not the
+# file size. Chunks are only kept (and returned as one DataFrame) when keep is True; every
+# cleaned chunk is checked by validator (rejected rows are quarantined, not inserted) and the
+# rest is passed to each of observers (such as StatsAccumulator.update). With insert=False the
+# chunks are only cleaned, checked and observed (cursor and conn may be None).
+@profiled
+def stream_table(table_name, chunks, cursor, conn, mode='batch', batch_size=1000, keep=False,
+                 incremental=False, backend=mysql_backend, observers=(), validator=None, insert=True):
+    kept = []
+    total_rows = 0
+    start = time.perf_counter()
+    # The delta state is read once, so chunks are all compared against the previous load
+    delta = TableDelta(table_name, cursor, backend) if incremental and insert else None
+    for chunk in chunks:
+        chunk = apply_schema(table_name, clean_table(table_name, chunk), report=False)
+        if validator is not None:
+            chunk = validator.validate(table_name, chunk)
+        if keep:
+            kept.append(chunk)
+        for observer in observers:
+            observer(chunk)
+        if delta is not None:
+            chunk = report_delta(table_name, chunk, delta.filter(chunk))
+        if insert:
+            insert_data(table_name, chunk, cursor, conn, mode=mode, batch_size=batch_size, backend=backend)
+        total_rows += len(chunk)
+    if delta is not None:
+        delta.save(cursor)
+        conn.commit()
+    elapsed = time.perf_counter() - start
+    set_rows(total_rows)
+    rows_per_sec = total_rows / elapsed if elapsed > 0 else float('inf')
+    print(f"{'Streamed' if insert else 'Read'} {total_rows} rows {'into' if insert else 'of'} {table_name} "
+          f"in {elapsed:.2f}s ({rows_per_sec:,.0f} rows/sec).")
+    # Chunks with different category sets concatenate to object columns, so re-apply the schema
+    df = apply_schema(table_name, pd.concat(kept, ignore_index=True)) if kept else None
+    return df, rows_per_sec
+
+
+# Columns used to split a table across several writer connections
+writer_partition_keys = {"Sales": 'Order Number'}
+
+
+# Insert one frame on a connection borrowed from the pool; returns when it started and finished
+# and whether the insert succeeded
+def insert_with_pooled_connection(pool, table_name, df, mode, batch_size, backend):
+    start = time.perf_counter()
+    conn = pool.get_connection()
+    cursor = conn.cursor()
+    try:
+        succeeded = insert_data(table_name, df, cursor, conn, mode=mode, batch_size=batch_size,
+                                backend=backend) is not None
+    finally:
+        cursor.close()
+        conn.close()  # returns the connection to the pool
+    return start, time.perf_counter(), succeeded
+
+
+# Connections shared by the table loads of one run: a pool with a control connection (DDL,
+# delta state, index builds) for each of up to `tables_at_once` tables loading together, plus
+# `pool_size` for the writers, and the threads those writers run on. Tables in
+# writer_partition_keys are split into key ranges written by `writers` connections (embedded
+# engines have a single writer, so everything collapses to one). The pool is opened on first
+# use; close() releases the writer threads.
+class DatabaseLoader:
+    def __init__(self, backend=mysql_backend, pool_size=4, writers=4, mode='batch', batch_size=1000,
+                 incremental=False, build_indexes=True, rebuild_indexes=False, partition_years=None,
+                 tables_at_once=1):
+        self.backend = backend
+        self.tables_at_once = max(1, min(tables_at_once, backend.max_writers))
+        # The control connections count towards the backend's connection limit
+        self.pool_size = max(1, min(pool_size, backend.max_writers - self.tables_at_once))
+        self.writers = min(writers, backend.max_writers)
+        self.mode = mode
+        self.batch_size = batch_size
+        self.incremental = incremental
+        self.build_indexes = build_indexes
+        self.rebuild_indexes = rebuild_indexes
+        self.partition_years = partition_years
+        self.pool = None
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def connection(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = self.backend.create_pool(self.pool_size + self.tables_at_once,
+                                                     allow_local_infile=self.mode == 'infile')
+                self.executor = ThreadPoolExecutor(max_workers=self.pool_size)
+                print(f"Connected to {self.backend.name} database with a pool of {self.pool_size} connections")
+        return self.pool.get_connection()
+
+    # Create every table, parents first so each FOREIGN KEY target exists, the views over them
+    # and the metadata tables insert_data keeps versions and watermarks in. Returns False when
+    # the database cannot be reached.
+    def create_schema(self):
+        try:
+            conn = self.connection()
+        except self.backend.error as e:
+            print(f"Error connecting to {self.backend.name}: {e}")
+            return False
+        cursor = conn.cursor()
+        try:
+            for level in load_levels(foreign_key_graph(table_definitions)):
+                for table_name in level:
+                    create_table(table_name, cursor, self.backend, self.partition_years)
+            create_local_revenue_view(cursor, self.backend)
+            create_customer_views(cursor, self.backend)
+            create_metadata_tables(cursor, self.backend)
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        return True
+
+    # Load one table whose parents are already loaded. With incremental=True only new or changed
+    # rows are sent. The table's secondary indexes are built after its rows are in
+    # (rebuild_indexes drops existing ones first, so a full reload does not maintain them row by
+    # row). Returns rows/sec, or None when the insert failed.
+    def load_table(self, table_name, df):
+        try:
+            conn = self.connection()
+        except self.backend.error as e:
+            print(f"Error connecting to {self.backend.name}: {e}")
+            return None
+        cursor = conn.cursor()
+        try:
+            if self.rebuild_indexes:
+                drop_secondary_indexes(cursor, self.backend, table_name)
+            # Read the delta state on the control connection before any writer starts
+            delta = None
+            if self.incremental:
+                delta = TableDelta(table_name, cursor, self.backend)
+                df = report_delta(table_name, df, delta.filter(df))
+            parts = [df]
+            if table_name in writer_partition_keys:
+                parts = partition_by_key_range(df, writer_partition_keys[table_name], self.writers)
+            futures = [self.executor.submit(insert_with_pooled_connection, self.pool, table_name, part, self.mode,
+                                            self.batch_size, self.backend) for part in parts]
+            spans = [future.result() for future in futures]
+            if not all(succeeded for _, _, succeeded in spans):
+                print(f"Loading {table_name} failed; see the errors above.")
+                return None
+            elapsed = max(end for _, end, _ in spans) - min(start for start, _, _ in spans)
+            rows_per_sec = len(df) / elapsed if elapsed > 0 else float('inf')
+            print(f"Loaded {len(df)} rows into {table_name} with {len(futures)} writer(s) "
+                  f"in {elapsed:.2f}s ({rows_per_sec:,.0f} rows/sec).")
+
+            # Only advance the watermark / row hashes once every writer has committed
+            if delta is not None:
+                delta.save(cursor)
+                conn.commit()
+            if self.build_indexes and table_name in secondary_indexes:
+                create_secondary_indexes(cursor, self.backend, table_name)
+                conn.commit()
+            return rows_per_sec
+        finally:
+            cursor.close()
+            conn.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+# Load every table into the backend in foreign-key order; tables of the same level load
+# concurrently (see DatabaseLoader for the options). Returns rows/sec per table, None for a
+# table whose insert failed.
+@profiled
+def load_into_database(data_frames, backend=mysql_backend, pool_size=4, writers=4, mode='batch', batch_size=1000,
+                       incremental=False, build_indexes=True, rebuild_indexes=False, partition_years=None):
+    levels = load_levels(foreign_key_graph(table_definitions))
+    loader = DatabaseLoader(backend, pool_size, writers, mode, batch_size, incremental, build_indexes,
+                            rebuild_indexes, partition_years, tables_at_once=max(len(level) for level in levels))
+    try:
+        if not loader.create_schema():
+            return {}
+        throughput = {}
+        with ThreadPoolExecutor(max_workers=loader.tables_at_once) as tables:
+            for level in levels:
+                loading = [table_name for table_name in level if table_name in data_frames]
+                if not loading:
+                    continue
+                print(f"Loading {', '.join(loading)} in parallel")
+                futures = {table_name: tables.submit(loader.load_table, table_name, data_frames[table_name])
+                           for table_name in loading}
+                throughput.update((table_name, future.result()) for table_name, future in futures.items())
+        return throughput
+    finally:
+        loader.close()
+
+
+# Command line options
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='DataSpark pipeline for Global Electronics data')
+    parser.add_argument('--backend', choices=backend_names, default='mysql',
+                        help='Database to load into: the MySQL server or an embedded SQLite/DuckDB file')
+    parser.add_argument('--database', default=None,
+                        help='Database file for the sqlite and duckdb backends (":memory:" for no file)')
+    parser.add_argument('--insert-mode', choices=insert_modes, default='batch',
+                        help='How rows are sent to the database (default: batch; infile needs mysql or duckdb)')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Rows per round trip for the executemany and batch modes')
+    parser.add_argument('--data-dir', default=None,
+                        help='Read the six CSV files from this directory (e.g. one written by synthetic_data.py)')
+    parser.add_argument('--encoding', default=None,
+                        help='Read every CSV with this encoding instead of detecting it')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Stream each CSV into MySQL in chunks of this many rows')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Tables loaded and cleaned concurrently (default: one per table, up to the CPU count)')
+    parser.add_argument('--executor', choices=['process', 'thread'], default='process',
+                        help='Pool used by --workers (default: process)')
+    parser.add_argument('--target', nargs='+', metavar='STAGE', default=None,
+                        help='Run only these stages and what they depend on, e.g. sales_trends (default: all)')
+    parser.add_argument('--list-stages', action='store_true',
+                        help='Print every stage with its inputs (* marks the default targets) and exit')
+    parser.add_argument('--pool-size', type=int, default=4,
+                        help='MySQL connections shared by the parallel table loaders (at most 32)')
+    parser.add_argument('--writers', type=int, default=4,
+                        help='Connections writing Sales concurrently, each on its own Order Number range')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only send rows that are new (Sales watermark) or changed (dimension row hashes)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not read or write the on-disk cache of cleaned tables')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Rerun every stage, even those whose inputs have not changed since the last run')
+    parser.add_argument('--no-indexes', action='store_true',
+                        help='Do not build the Sales secondary indexes after loading')
+    parser.add_argument('--rebuild-indexes', action='store_true',
+                        help='Drop the Sales secondary indexes before loading and rebuild them afterwards')
+    parser.add_argument('--partition-sales', type=int, nargs=2, metavar=('FIRST_YEAR', 'LAST_YEAR'),
+                        help='Create Sales RANGE-partitioned by order year (MySQL; drops the Sales foreign keys)')
+    parser.add_argument('--no-summaries', action='store_true',
+                        help='Do not refresh the daily summary tables after loading')
+    parser.add_argument('--rebuild-summaries', action='store_true',
+                        help='Rebuild every date of the summary tables (needed after Products/Customers edits)')
+    parser.add_argument('--run-queries', action='store_true',
+                        help='Run the queries in Sql Queries.sql, and their summary-table versions, after loading')
+    parser.add_argument('--query-workers', type=int, default=4,
+                        help='Connections running catalog queries concurrently (default: 4)')
+    parser.add_argument('--explain', action='store_true',
+                        help='Report which secondary indexes each query in Sql Queries.sql uses')
+    parser.add_argument('--large-data-rows', type=int, default=large_data_rows,
+                        help='Histograms of more values than this are binned first and get a sampled KDE '
+                             f'(default: {large_data_rows:,})')
+    parser.add_argument('--kde-sample-size', type=int, default=kde_sample_size,
+                        help=f'Values sampled to fit the KDE of a large histogram (default: {kde_sample_size:,})')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for the KDE samples, so charts are reproducible (default: 0)')
+    parser.add_argument('--no-validate', action='store_true',
+                        help='Load rows without the data quality checks (bad keys then fail in the database)')
+    parser.add_argument('--quarantine-dir', default=quarantine_dir,
+                        help=f'Directory for the CSV files of rows rejected by the checks (default: {quarantine_dir})')
+    parser.add_argument('--rebuild-rollups', action='store_true',
+                        help='Rebuild the daily Sales trend rollups from every row instead of only new ones')
+    parser.add_argument('--charts', choices=chart_modes, default='show',
+                        help='show charts in windows (default), render them to files headless, '
+                             'or print only the numbers behind them')
+    parser.add_argument('--chart-dir', default='charts',
+                        help='Directory for --charts files (default: charts)')
+    parser.add_argument('--chart-format', choices=chart_formats, nargs='+', default=['png'],
+                        help='Image formats for --charts files (default: png)')
+    parser.add_argument('--chart-workers', type=int, default=None,
+                        help='Processes rendering --charts files (default: one per CPU)')
+    parser.add_argument('--profile', metavar='TRACE_JSON', default=None,
+                        help='Record wall/CPU time, memory and rows/sec of every stage and write them as a '
+                             'Chrome trace-event file')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='With --profile, also trace Python allocations per stage (tracemalloc; slower)')
+    parser.add_argument('--sketch-queries', action='store_true',
+                        help='Answer the top-N product and city queries from in-memory heavy hitters')
+    parser.add_argument('--top-k-capacity', type=int, default=1000,
+                        help='Keys kept per heavy-hitter summary; 0 keeps every key for exact counts (default: 1000)')
+    return parser.parse_args(argv)
 
 
-def main():
+def main(argv=None):
+    args = parse_args(argv)
+    profiler = enable_profiling(memory=args.profile_memory) if args.profile else None
+    try:
+        run_pipeline(args)
+    finally:
+        if profiler is not None:
+            profiler.print_summary()
+            profiler.write_trace(args.profile)
+            print(f"Wrote the stage profile to {args.profile} (open it in chrome://tracing or ui.perfetto.dev)")
+
+
+# The pipeline as a DAG of stages (see pipeline_dag.py), shaped by the command line options.
+# Per table, load_<table> reads the CSV, clean_<table> cleans it (kept in the table cache),
+# validate_<table> applies the data quality checks and store_<table> writes it to the database
+# (recorded in the database, so an unchanged table is not sent again); with --chunksize one
+# stream_<table> stage does all four chunk by chunk. Each analysis is a stage named after its
+# analyze_* function and reads only the tables it needs. Returns the pipeline and the stages a
+# run without --target produces.
+def build_pipeline(args, backend, report, loader):
     data_paths = {
         "Sales": "C:/Users/aashi/Downloads/Sales.csv",
         "Customers": "C:/Users/aashi/Downloads/Customers.csv",
@@ -394,73 +946,341 @@ def main():
         "Data_Dictionary": "C:/Users/aashi/Downloads/Data_Dictionary.csv",
         "Stores": "C:/Users/aashi/Downloads/Stores.csv"
     }
+    if args.data_dir:
+        data_paths = {table_name: os.path.join(args.data_dir, f"{table_name}.csv") for table_name in data_paths}
 
-    data_frames = {}
-    
-    # Load data
-    for key, path in data_paths.items():
-        print(f"Loading {key} data from {path}")
-        df = detect_and_load_csv(path)  # Assuming this function exists
-        if df is not None:
-            data_frames[key] = df
-            print(f"Loaded {key} data successfully.")
+    pipeline = Pipeline()
+    targets = []
+    frames = {}  # tables kept so far: what child keys are checked against and the sketches join to
+    table_stats = {}  # EDA statistics gathered while streaming
+    streamed = {}  # Sales heavy hitters and rollups fed while streaming
+    sent = set()  # tables streamed into the database by this run
+    top_k_capacity = args.top_k_capacity or None
+    # Rows are checked before they are written; keys against the parent rows that were kept
+    validator = None if args.no_validate else DataValidator(frames, args.quarantine_dir)
+    graph = foreign_key_graph(table_definitions)
+    # Parents before children, as required by the FOREIGN KEYs in table_definitions
+    table_order = [table for level in load_levels(graph) for table in level]
+    checked_parents = {table_name: [target[1] for kind, target in table_rules.get(table_name, ()) if kind == 'references']
+                       for table_name in data_paths}
+    database = DatabaseFingerprints(backend)
+    database_params = {'backend': backend.name, 'database': backend.path, 'partition_years': args.partition_sales}
+    rollup_store = rollup_store_path(data_paths["Sales"], backend.name, backend.path)
+    # What the source files' size and mtime say about their contents; every later stage's
+    # fingerprint builds on these
+    sources = {table_name: source_fingerprint(path, cleaning_version, encoding=args.encoding)
+               if os.path.exists(path) else None for table_name, path in data_paths.items()}
+    frame_stage = {}
+
+    def clean(table_name, df):
+        return apply_schema(table_name, clean_table(table_name, df))
+
+    def validate(table_name, df, *parents):
+        if df is None:
+            return None
+        accepted = validator.validate(table_name, df)
+        validator.report([table_name])
+        frames[table_name] = accepted
+        return accepted
+
+    def store(table_name, df, *loaded):
+        if df is None:
+            return None
+        rows_per_sec = loader.load_table(table_name, df)
+        if rows_per_sec is not None:
+            print(f"{table_name}: {rows_per_sec:,.0f} rows/sec ({args.insert_mode}, {backend.name})")
+        return rows_per_sec
+
+    # Streaming mode: clean and insert a table chunk by chunk. The dimension tables are small
+    # and kept for EDA; Sales is never held in memory as a whole. With send=False the file is
+    # read the same way but nothing is inserted. Returns True, or None when the table failed.
+    def stream(table_name, send=True):
+        conn = cursor = None
+        if send:
+            conn, cursor = backend.connect(allow_local_infile=args.insert_mode == 'infile')
+            if not (conn and cursor):
+                return None
+        try:
+            if send and args.rebuild_indexes:
+                drop_secondary_indexes(cursor, backend, table_name)
+            path = data_paths[table_name]
+            print(f"{'Streaming' if send else 'Reading'} {table_name} data from {path} in chunks of {args.chunksize} rows")
+            chunks = detect_and_load_csv(path, encoding=args.encoding, chunksize=args.chunksize,
+                                         dtype=csv_dtypes.get(table_name))
+            if chunks is None:
+                print(f"Failed to load {table_name} data.")
+                return None
+            table_stats[table_name] = StatsAccumulator()
+            observers = [table_stats[table_name].update]
+            if table_name == "Sales":
+                streamed['top_k'] = SalesTopK(frames, top_k_capacity)
+                streamed['rollups'] = SalesRollups.load(rollup_store, rebuild=args.rebuild_rollups)
+                observers += [streamed['top_k'].update,
+                              lambda chunk: streamed['rollups'].append(chunk, frames.get("Products"))]
+            df, rows_per_sec = stream_table(table_name, chunks, cursor, conn, mode=args.insert_mode,
+                                            batch_size=args.batch_size, keep=table_name != "Sales",
+                                            incremental=args.incremental, backend=backend,
+                                            observers=observers, validator=validator, insert=send)
+            if validator is not None:
+                validator.report([table_name])
+            if send:
+                print(f"{table_name}: {rows_per_sec:,.0f} rows/sec ({args.insert_mode}, {backend.name})")
+                sent.add(table_name)
+            if df is not None:
+                frames[table_name] = df
+            return True
+        finally:
+            if send:
+                backend.close(conn, cursor)
+
+    def send(table_name, schema, *parents):
+        return stream(table_name)
+
+    # The rows of a streamed table, for EDA and the tables that check their keys against it:
+    # those kept while it was sent or, when the database already held it, read from the file
+    def read_streamed(table_name, loaded, *parents):
+        if table_name not in sent and not stream(table_name, send=False):
+            return None
+        return frames.get(table_name)
+
+    def finish_database(*streamed_tables):
+        conn, cursor = backend.connect()
+        if not (conn and cursor):
+            return None
+        create_local_revenue_view(cursor, backend)
+        create_customer_views(cursor, backend)
+        if not args.no_indexes:
+            for table_name in secondary_indexes:
+                create_secondary_indexes(cursor, backend, table_name)
+        conn.commit()
+        backend.close(conn, cursor)
+        return True
+
+    # Tables, views and metadata tables are created once, before any table is loaded
+    pipeline.add('database_schema', lambda: loader.create_schema() or None, params=database_params,
+                 resource='database')
+    if args.chunksize:
+        # A table is sent again only when its source, its checks or the database changed; its
+        # parents' rows are read first, so its keys are checked against them either way
+        for table_name in table_order:
+            key = table_name.lower()
+            parents = sorted(set(graph[table_name]) | set(checked_parents.get(table_name, ())))
+            pipeline.add(f"stream_{key}", functools.partial(send, table_name),
+                         ['database_schema', *(f"read_{parent.lower()}" for parent in parents)],
+                         params={'source': sources[table_name],
+                                 'rules': None if validator is None else table_rules.get(table_name),
+                                 **database_params},
+                         store=database, resource='database', allow_missing=True)
+            frame_stage[table_name] = pipeline.add(
+                f"read_{key}", functools.partial(read_streamed, table_name),
+                [f"stream_{key}", *(f"read_{parent.lower()}" for parent in parents)]).name
+        database_stages = [pipeline.add('finish_database', finish_database,
+                                        [f"stream_{table_name.lower()}" for table_name in table_order],
+                                        resource='database', allow_missing=True).name]
+    else:
+        table_store = None if args.no_cache else TableStore()
+        database_stages = []
+        for table_name in table_order:
+            key = table_name.lower()
+            pipeline.add(f"load_{key}", functools.partial(load_table, table_name, data_paths[table_name], args.encoding),
+                         params={'source': sources[table_name]}, process=args.executor == 'process',
+                         resource='tables')
+            frame_stage[table_name] = pipeline.add(f"clean_{key}", functools.partial(clean, table_name),
+                                                   [f"load_{key}"], version=cleaning_version, store=table_store,
+                                                   resource='tables').name
+            if validator is not None:
+                frame_stage[table_name] = pipeline.add(
+                    f"validate_{key}", functools.partial(validate, table_name),
+                    [frame_stage[table_name], *(frame_stage[parent] for parent in checked_parents[table_name])],
+                    params={'rules': table_rules.get(table_name), 'quarantine_dir': args.quarantine_dir},
+                    allow_missing=True).name
+            database_stages.append(pipeline.add(
+                f"store_{key}", functools.partial(store, table_name),
+                [frame_stage[table_name], 'database_schema',
+                 *(f"store_{parent.lower()}" for parent in sorted(graph[table_name]))],
+                params=database_params, store=database, resource='database', allow_missing=True).name)
+        targets += database_stages
+
+    def roll_up_sales(sales, products=None):
+        if args.chunksize:
+            rollups = streamed.get('rollups')
+            if rollups is None:
+                return None
         else:
-            print(f"Failed to load {key} data.")
-    
-    # Clean Sales Data
-    if "Sales" in data_frames:
-        df_sales = data_frames["Sales"]
-        df_sales['Order Date'] = df_sales['Order Date'].apply(convert_date_format)  # Assuming this function exists
-        df_sales['Delivery Date'] = df_sales['Delivery Date'].apply(convert_date_format)
-
-    # Clean Products Data
-    if "Products" in data_frames:
-        df_products = data_frames["Products"]
-        df_products['Unit Cost USD'] = df_products['Unit Cost USD'].replace({r'\$': '', ',': ''}, regex=True).astype(float)
-        df_products['Unit Price USD'] = df_products['Unit Price USD'].replace({r'\$': '', ',': ''}, regex=True).astype(float)
-
-    # Clean Customers Data
-    if "Customers" in data_frames:
-        df_customers = data_frames["Customers"]
-        df_customers['Birthday'] = pd.to_datetime(df_customers['Birthday'], format='%m/%d/%Y', errors='coerce').dt.strftime('%Y-%m-%d')
-        # Replace NaN with None before inserting into database
-        df_customers = df_customers.where(pd.notnull(df_customers), None)
-
-    # Clean and process Stores Data
-    if "Stores" in data_frames:
-        df_stores = data_frames["Stores"]
-        # Convert 'Open Date' to YYYY-MM-DD format
-        df_stores['Open Date'] = pd.to_datetime(df_stores['Open Date'], format='%m/%d/%Y', errors='coerce').dt.strftime('%Y-%m-%d')
-        df_stores = df_stores.where(pd.notnull(df_stores), None)  
-
-    conn, cursor = connect_to_mysql()
-    
-    if conn and cursor:  # Check if the connection and cursor are valid
-        for table_name in ["Sales","Customers", "Products", "Exchange_Rates", "Data_Dictionary","Stores"]:
-            create_table(table_name, cursor)  # Adjust this to pass table_name if necessary
-
-            # Clean and prepare data for insertion
-            if table_name == "Exchange_Rates":
-                df_exchange_rates = data_frames["Exchange_Rates"]
-                df_exchange_rates['Date'] = pd.to_datetime(df_exchange_rates['Date']).dt.strftime('%Y-%m-%d')
-
-            # Insert data into the database
-            insert_data(table_name, data_frames[table_name], cursor, conn)  # Insert data
-
-    close_mysql_connection(conn, cursor)
-
-    merged_df = pd.merge(df_sales, df_products, on='ProductKey', how='left')
-
-    # Call EDA summary and plotting functions for each DataFrame
-    for key, df in data_frames.items():
-        eda_summary(df, key)
-        if key == 'Customers':
-            analyze_customer_demographics(df_customers)
-            analyze_customer_purchases(merged_df)
-        elif key == 'Sales':
-            analyze_sales_trends(df_sales)
-        elif key == 'Products':
-            analyze_products(df_products)
+            rollups = SalesRollups.load(rollup_store, rebuild=args.rebuild_rollups)
+            for start in range(0, len(sales), eda_chunk_rows):
+                rollups.append(sales.iloc[start:start + eda_chunk_rows], products)
+        if rollups.new_rows:
+            rollups.save()
+        print(f"Rolled up {rollups.new_rows} new Sales rows ({len(rollups.daily)} daily rollup rows stored).")
+        return rollups
+
+    def count_top_sales(sales, products=None, customers=None):
+        if args.chunksize:
+            return streamed.get('top_k')
+        top_k = SalesTopK({"Products": products, "Customers": customers}, top_k_capacity)
+        for start in range(0, len(sales), eda_chunk_rows):
+            top_k.update(sales.iloc[start:start + eda_chunk_rows])
+        return top_k
+
+    # Streamed Sales was rolled up and counted on the way in, so those stages only need it loaded
+    if args.chunksize:
+        rollup_inputs = top_k_inputs = [frame_stage["Sales"]]
+    else:
+        rollup_inputs = [frame_stage["Sales"], frame_stage["Products"]]
+        top_k_inputs = [frame_stage["Sales"], frame_stage["Products"], frame_stage["Customers"]]
+    pipeline.add('sales_rollups', roll_up_sales, rollup_inputs, params={'path': rollup_store},
+                 store=FingerprintStore(), restore=functools.partial(SalesRollups.load, rollup_store),
+                 allow_missing=bool(args.chunksize))
+    pipeline.add('sales_top_k', count_top_sales, top_k_inputs, allow_missing=bool(args.chunksize))
+
+    def connected(task):
+        def run(*loaded):
+            conn, cursor = backend.connect()
+            if not (conn and cursor):
+                return None
+            try:
+                task(cursor)
+                conn.commit()
+            finally:
+                backend.close(conn, cursor)
+            return True
+        return run
+
+    if not args.no_summaries:
+        # A full (non-incremental) load may have rewritten any date, so rebuild them all
+        targets.append(pipeline.add('summaries', connected(
+            lambda cursor: refresh_summaries(cursor, backend, full=not args.incremental or args.rebuild_summaries)),
+            database_stages, params=database_params, store=database, resource='database').name)
+    if args.explain:
+        targets.append(pipeline.add('index_usage_report', connected(
+            lambda cursor: index_usage_report(cursor, backend, load_query_script())),
+            database_stages, main_thread=True).name)
+    if args.run_queries:
+        def run_queries(*loaded):
+            sketches = loaded[-1] if args.sketch_queries else None
+            run_catalog(backend, load_catalog(), workers=args.query_workers, sketches=sketches)
+            return True
+        # After the summary refresh, which rewrites tables while it runs
+        query_inputs = database_stages + ([] if args.no_summaries else ['summaries'])
+        targets.append(pipeline.add('queries', run_queries,
+                                    query_inputs + (['sales_top_k'] if args.sketch_queries else []),
+                                    main_thread=True).name)
+        if not args.no_summaries:
+            def run_summary_queries(summaries):
+                print("Same queries answered from the summary tables:")
+                run_catalog(backend, load_catalog(summary_query_file), workers=args.query_workers)
+                return True
+            targets.append(pipeline.add('summary_queries', run_summary_queries, ['summaries'], main_thread=True).name)
+
+    pipeline.add('star_schema', lambda sales, customers, products, stores: StarSchema.from_tables(
+        {"Sales": sales, "Customers": customers, "Products": products, "Stores": stores}),
+        [frame_stage[table_name] for table_name in ["Sales", "Customers", "Products", "Stores"]])
+    # Only the columns analyze_customer_purchases reads, gathered by ProductKey instead of merged
+    pipeline.add('merge_sales', lambda star: star.view(['Quantity', 'Unit Price USD', 'Product Name']),
+                 ['star_schema'])
+
+    def revenue_by_currency(star, rates):
+        revenue = local_revenue(star, ExchangeRates(rates))
+        print("\nRevenue by currency (converted at the rate in effect on each Order Date):")
+        print(revenue.groupby('Currency Code', observed=True)[['Revenue USD', 'Revenue Local']].sum())
+        return True
+    targets.append(pipeline.add('local_revenue', revenue_by_currency, ['star_schema', frame_stage["Exchange_Rates"]],
+                                main_thread=True).name)
+
+    # EDA summary and plots for each table (streamed tables were summarized on the way in),
+    # each followed by the analyses of that table
+    def summarize(table_name, df):
+        if df is None and table_name not in table_stats:
+            return None
+        eda_summary(df, table_name, table_stats.get(table_name), report)
+        return True
+
+    def analysis(func):
+        def run(*tables):
+            func(*tables, report=report)
+            return True
+        return run
+
+    analyses = {
+        "Sales": [('sales_trends', lambda rollups, report: analyze_sales_trends(None, rollups, report=report),
+                   ['sales_rollups']),
+                  ('customer_value', analyze_customer_value, [frame_stage["Sales"], frame_stage["Products"]])],
+        "Customers": [('customer_demographics', analyze_customer_demographics, [frame_stage["Customers"]]),
+                      ('customer_purchases', analyze_customer_purchases, ['merge_sales'])],
+        "Products": [('products', analyze_products, [frame_stage["Products"]])],
+    }
+    for table_name in data_paths:
+        targets.append(pipeline.add(f"eda_{table_name.lower()}", functools.partial(summarize, table_name),
+                                    [frame_stage[table_name]], main_thread=True, allow_missing=True).name)
+        for name, func, inputs in analyses.get(table_name, ()):
+            targets.append(pipeline.add(name, analysis(func), inputs, main_thread=True).name)
+    return pipeline, targets
+
+
+# How long each table took to load and clean, from the timings of the last pipeline run, and
+# the wall-clock of the whole load next to the seconds summed across tables
+def report_table_loads(pipeline, workers, executor):
+    loaded, summed, wall_clock = 0, 0.0, 0.0
+    for table_name in table_definitions:
+        stage_names = [f"load_{table_name.lower()}", f"clean_{table_name.lower()}"]
+        timings = [pipeline.timings[name] for name in stage_names if name in pipeline.timings]
+        if not timings:
+            continue
+        seconds = sum(timing[1] for timing in timings)
+        summed += seconds
+        wall_clock = max(wall_clock, *(timing[2] for timing in timings))
+        if timings[-1][0] == 'skipped':
+            print(f"Failed to load {table_name} data.")
+        else:
+            loaded += 1
+            source = ' from the table cache' if timings[-1][0] == 'restore' else ''
+            print(f"Loaded {table_name} data{source} successfully in {seconds:.2f}s.")
+    if loaded:
+        print(f"Loaded {loaded} tables in {wall_clock:.2f}s wall-clock "
+              f"({summed:.2f}s summed across tables, {workers} {executor} worker(s)).")
+
+
+# Load, store and analyze every table as the command line options ask: the stages --target
+# names, or all of them, and whatever they depend on
+@profiled(name='pipeline')
+def run_pipeline(args):
+    if args.charts != 'show':
+        plt.switch_backend('Agg')  # headless: no windows, nothing waits on a display
+    report = ChartReport(args.charts, args.chart_dir, args.chart_format, args.chart_workers,
+                         large_rows=args.large_data_rows, sample_size=args.kde_sample_size, seed=args.seed)
+    backend = get_backend(args.backend, mysql_config, args.database)
+    if args.insert_mode not in backend.insert_modes:
+        raise SystemExit(f"--insert-mode {args.insert_mode} is not supported by the {args.backend} backend")
+    loader = DatabaseLoader(backend, args.pool_size, args.writers, args.insert_mode, args.batch_size, args.incremental,
+                            not args.no_indexes, args.rebuild_indexes, args.partition_sales,
+                            tables_at_once=len(table_definitions))
+    pipeline, default_targets = build_pipeline(args, backend, report, loader)
+    if args.list_stages:
+        for name, definition in pipeline.stages.items():
+            marker = '*' if name in default_targets else ' '
+            print(f"{marker} {name:<26} {', '.join(definition.inputs)}")
+        return
+    targets = args.target or default_targets
+    unknown = [name for name in targets if name not in pipeline.stages]
+    if unknown:
+        raise SystemExit(f"Unknown stage(s) {', '.join(unknown)}; --list-stages shows them")
+
+    force = True if args.refresh else [name for name, flag in [('sales_rollups', args.rebuild_rollups),
+                                                               ('summaries', args.rebuild_summaries)] if flag]
+    # --workers tables are read and cleaned at once; the thread pool has room for those and for
+    # every table writing to the database, the other stages being short
+    workers = args.workers or min(len(table_definitions), os.cpu_count() or 1)
+    limits = {'tables': workers, 'database': loader.tables_at_once}
+    try:
+        pipeline.run(targets, workers=sum(limits.values()), process_workers=workers, limits=limits, force=force)
+    finally:
+        loader.close()
+    report_table_loads(pipeline, workers, args.executor)
+    if not args.no_cache:
+        evict_cache()
+    with stage('render_charts'):
+        report.render()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
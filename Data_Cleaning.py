@@ -1,9 +1,27 @@
-# Load csv file
-def detect_and_load_csv(file_path):
+# Load csv file, detecting the encoding unless one is given. With chunksize set, returns an
+# iterator of DataFrames of at most chunksize rows instead of one DataFrame.
+@profiled
+def detect_and_load_csv(file_path, encoding=None, chunksize=None, dtype=None):
     try:
-        encoding = detect_encoding(file_path)
-        print(f"Detected encoding for {file_path}: {encoding}")
-        df = pd.read_csv(file_path, encoding=encoding)
+        sampled = encoding is None
+        if sampled:
+            encoding = detect_encoding(file_path)
+            print(f"Detected encoding for {file_path}: {encoding}")
+        else:
+            print(f"Using encoding {encoding} for {file_path}")
+
+        if chunksize:
+            return stream_csv_chunks(file_path, chunksize, encoding, dtype=dtype, redetect=sampled)
+
+        try:
+            df = pd.read_csv(file_path, encoding=encoding, dtype=dtype)
+        except UnicodeDecodeError:
+            if not sampled:
+                raise
+            # The sample missed the non-ASCII bytes; fall back to scanning the whole file
+            encoding = detect_encoding(file_path, sample_size=None, refresh=True)
+            print(f"Re-detected encoding for {file_path} from the full file: {encoding}")
+            df = pd.read_csv(file_path, encoding=encoding, dtype=dtype)
         return df
     except FileNotFoundError:
         print(f"File {file_path} not found. Please check the file path.")
@@ -11,6 +29,28 @@ def detect_and_load_csv(file_path):
         print(f"An error occurred while loading {file_path}: {e}")
     return None
 
+
+# Yield a csv file in chunks of chunksize rows. If a sampled encoding turns out to be wrong,
+# re-detect it from the full file and resume after the rows already yielded.
+def stream_csv_chunks(file_path, chunksize, encoding, dtype=None, redetect=False):
+    rows_read = 0
+    while True:
+        try:
+            with pd.read_csv(file_path, encoding=encoding, dtype=dtype, chunksize=chunksize,
+                             skiprows=range(1, rows_read + 1)) as reader:
+                for chunk in reader:
+                    rows_read += len(chunk)
+                    yield chunk
+            return
+        except UnicodeDecodeError:
+            if not redetect:
+                raise
+            redetect = False
+            encoding = detect_encoding(file_path, sample_size=None, refresh=True)
+            print(f"Re-detected encoding for {file_path} from the full file: {encoding}, "
+                  f"resuming after row {rows_read}")
+
+
 # Convert date format 
 def convert_date_format(date_str):
     # Check if the date_str is NaN or not a string
@@ -20,4 +60,61 @@ def convert_date_format(date_str):
         # Convert the date format
         return datetime.strptime(date_str, "%m/%d/%Y").strftime('%Y-%m-%d')
     except ValueError:
-        return None  # Return None if date cannot be parsed
\ No newline at end of file
+        return None  # Return None if date cannot be parsed
+
+# Normalize a column of date strings to datetime64. Dates repeat heavily, so each distinct
+# value is parsed once and the results are mapped back by position. NaN, non-strings and
+# unparseable values become NaT, matching the None returned by convert_date_format.
+@profiled
+def normalize_dates(series, date_format='%m/%d/%Y'):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    codes, uniques = pd.factorize(series)
+    uniques = pd.Series(uniques, dtype=object)
+    parsed = pd.to_datetime(uniques.where(uniques.map(type) == str), format=date_format, errors='coerce')
+    # factorize marks missing values with -1, which picks up the trailing NaT
+    lookup = np.append(parsed.to_numpy(dtype='datetime64[ns]'), np.datetime64('NaT', 'ns'))
+    return pd.Series(lookup[codes], index=series.index, name=series.name)
+
+
+# Bump whenever clean_table or csv_dtypes change, so cached cleaned tables are rebuilt
+cleaning_version = 3
+
+# Date columns parsed by clean_table
+date_columns = {
+    "Sales": ['Order Date', 'Delivery Date'],
+    "Customers": ['Birthday'],
+    "Stores": ['Open Date'],
+    "Exchange_Rates": ['Date']
+}
+
+
+# Clean one table (or one chunk of it) in place of the raw csv columns. Date text that does not
+# parse becomes NaT and is recorded in df.attrs['Unparsed Dates'] (column -> [index label, text]
+# pairs) so that data_quality.py can reject those rows instead of loading them without a date.
+@profiled
+def clean_table(table_name, df):
+    unparsed = {}
+    for col in date_columns.get(table_name, ()):
+        raw = df[col]
+        df[col] = normalize_dates(raw)
+        failed = raw.notna().to_numpy() & df[col].isna().to_numpy()
+        if failed.any():
+            unparsed[col] = [[int(label), str(value)] for label, value in raw[failed].items()]
+    if unparsed:
+        df.attrs['Unparsed Dates'] = unparsed
+
+    if table_name == "Products":
+        df['Unit Cost USD'] = df['Unit Cost USD'].replace({r'\$': '', ',': ''}, regex=True).astype(float)
+        df['Unit Price USD'] = df['Unit Price USD'].replace({r'\$': '', ',': ''}, regex=True).astype(float)
+
+    return df
+
+# Read one table's CSV file; the load stages of build_pipeline run it on a worker process
+@profiled
+def load_table(table_name, path, encoding=None):
+    print(f"Loading {table_name} data from {path}")
+    df = detect_and_load_csv(path, encoding=encoding, dtype=csv_dtypes.get(table_name))
+    if df is None:
+        print(f"Failed to load {table_name} data.")
+    return df
\ No newline at end of file
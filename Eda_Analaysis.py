@@ -1,68 +1,156 @@
 # Required Libraries
 import pandas as pd
+import numpy as np
 import matplotlib.pyplot as plt
-import seaborn as sns
-import mysql.connector
-from mysql.connector import Error
-import chardet
+from chardet import UniversalDetector
 from datetime import datetime
-
-
-
-def detect_encoding(file_path):
+import argparse
+import functools
+import json
+from concurrent.futures import ThreadPoolExecutor
+import os
+import tempfile
+import threading
+import time
+from table_cache import source_fingerprint, evict_cache
+from table_schemas import apply_schema
+from db_loader import foreign_key_graph, load_levels, partition_by_key_range
+from incremental_load import TableDelta, DatabaseFingerprints, create_metadata_tables, bump_table_version
+from storage_backends import MySQLBackend, backend_names, get_backend
+from query_catalog import load_query_script, load_catalog, run_catalog
+from table_indexes import (secondary_indexes, create_secondary_indexes, drop_secondary_indexes,
+                           partition_by_order_year, index_usage_report)
+from sales_summaries import refresh_summaries, summary_query_file
+from star_schema import StarSchema
+from currency_conversion import ExchangeRates, create_local_revenue_view, local_revenue
+from customer_analytics import create_customer_views, rfm_scores, cohort_matrix
+from streaming_stats import StatsAccumulator
+from heavy_hitters import SalesTopK, top_values
+from sales_rollups import SalesRollups, rollup_store_path
+from data_quality import DataValidator, quarantine_dir, table_rules
+from stage_profiler import enable_profiling, profiled, set_rows, stage
+from pipeline_dag import FingerprintStore, Pipeline, TableStore
+from chart_rendering import ChartReport, chart_modes, chart_formats, large_data_rows, kde_sample_size
+
+
+cache_dir = '.dataspark_cache'
+encoding_cache_file = os.path.join(cache_dir, 'encodings.json')
+
+# Rows folded into the EDA statistics at a time
+eda_chunk_rows = 1 << 18
+
+
+# Read cached encodings, keyed by path, size and modification time
+def load_encoding_cache():
+    try:
+        with open(encoding_cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# Add one entry to the encoding cache. The file is re-read first so that parallel loaders
+# writing their own entries do not overwrite each other.
+def save_encoding_cache(cache_key, encoding):
+    cache = load_encoding_cache()
+    cache[cache_key] = encoding
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{encoding_cache_file}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp_path, encoding_cache_file)
+
+
+# Yield a bounded prefix plus a few strided windows of the file, or every block when
+# sample_size is None
+def read_sample_blocks(f, file_size, sample_size, windows, window_size, block_size=1 << 16):
+    if sample_size is None or file_size <= sample_size + windows * window_size:
+        yield from iter(lambda: f.read(block_size), b'')
+        return
+    while f.tell() < sample_size:
+        yield f.read(min(block_size, sample_size - f.tell()))
+    for i in range(1, windows + 1):
+        # Start each window on a line boundary so multi-byte characters are not split
+        f.seek(file_size * i // (windows + 1))
+        f.readline()
+        yield f.read(window_size)
+
+
+# Detect the encoding from a sample of the file, stopping as soon as chardet is confident.
+# sample_size=None scans the whole file; refresh=True ignores the cache.
+@profiled
+def detect_encoding(file_path, sample_size=1 << 20, windows=4, window_size=1 << 16, refresh=False):
+    stat = os.stat(file_path)
+    cache_key = f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    if not refresh:
+        cache = load_encoding_cache()
+        if cache_key in cache:
+            return cache[cache_key]
+
+    detector = UniversalDetector()
+    fed = False
     with open(file_path, 'rb') as f:
-        rawdata = f.read()
-    result = chardet.detect(rawdata)
-    return result['encoding']
+        for block in read_sample_blocks(f, stat.st_size, sample_size, windows, window_size):
+            # Pure ASCII blocks carry no evidence about the encoding
+            if block.isascii():
+                continue
+            detector.feed(block)
+            fed = True
+            if detector.done:
+                break
+    detector.close()
+    encoding = detector.result['encoding'] if fed else 'ascii'
+
+    save_encoding_cache(cache_key, encoding)
+    return encoding
 
 #Perform summary statistics and basic EDA
-def eda_summary(df, file_name):
+# The statistics come from one pass of a StatsAccumulator over eda_chunk_rows rows at a time;
+# pass stats to summarize a table that was accumulated elsewhere (say while it was streamed
+# into the database) without needing the DataFrame.
+@profiled
+def eda_summary(df, file_name, stats=None, report=None):
+    report = report if report is not None else ChartReport()
     print(f"\nEDA Summary for {file_name}")
+    if stats is None:
+        stats = StatsAccumulator()
+        for start in range(0, len(df), eda_chunk_rows):
+            stats.update(df.iloc[start:start + eda_chunk_rows])
 
     # Print summary statistics
     print(f'\nSummary Statistics:')
-    print(df.describe(include='all'))
+    print(stats.summary())
 
     # Correlation matrix
-    if df.select_dtypes(include=['number']).shape[1] > 1:
-        plt.figure(figsize=(10, 8))
-        numeric_df = df.select_dtypes(include=['number'])
-        sns.heatmap(numeric_df.corr().round(2), annot=True, cmap='viridis')
-        plt.title(f'Correlation Matrix for {file_name}')
-        plt.show(block=False)
+    correlation = stats.correlation()
+    if correlation.shape[1] > 1:
+        report.add('heatmap', correlation, f'Correlation Matrix for {file_name}', figsize=(10, 8))
 
     # Check for unique values
     print('\nUnique values per column:')
-    for col in df.columns:
-        print(f'{col}: {df[col].nunique()} unique values')
+    for col, unique in stats.distinct_counts().items():
+        print(f'{col}: {unique} unique values')
 
 
 # Customer demographics analysis
-def analyze_customer_demographics(mydf):
+@profiled
+def analyze_customer_demographics(mydf, report=None):
+    report = report if report is not None else ChartReport()
     print('\nCustomer Demographics Analysis')
-    mydf['Birthday'] = pd.to_datetime(mydf['Birthday'], errors='coerce')
+    # Derived columns stay local: the Customers frame is shared with the stages loading it
+    birthday = pd.to_datetime(mydf['Birthday'], errors='coerce')
     today = pd.Timestamp('today')
-    mydf['Age'] = (today - mydf['Birthday']).dt.days // 365
+    age = (today - birthday).dt.days // 365
 
-    plt.figure(figsize=(8, 6))
-    sns.countplot(data=mydf, x='Gender')
-    plt.title('Gender Distribution')
-    plt.show(block=False)
-
-    plt.figure(figsize=(8, 6))
-    sns.histplot(mydf['Age'].dropna(), bins=20, kde=True)
-    plt.title('Age Distribution')
-    plt.show(block=False)
-
-    plt.figure(figsize=(8, 6))
-    mydf['City'].value_counts().head(10).plot(kind='bar')
-    plt.title('Top 10 Cities by Number of Customers')
-    plt.xlabel('City')
-    plt.ylabel('Number of Customers')
-    plt.show(block=False)
+    report.add('count', mydf['Gender'], 'Gender Distribution')
+    report.add('hist', age.dropna().rename('Age'), 'Age Distribution', bins=20)
+    report.add('bar', top_values(mydf['City'], 10), 'Top 10 Cities by Number of Customers',
+               xlabel='City', ylabel='Number of Customers')
 
 # Customer purchase analysis
-def analyze_customer_purchases(df):
+@profiled
+def analyze_customer_purchases(df, report=None):
+    report = report if report is not None else ChartReport()
     print('\nCustomer Purchase Analysis')
     if 'Quantity' in df.columns and 'Unit Price USD' in df.columns:
         # Clean 'Unit Price USD' by removing extra dollar signs and any non-numeric characters
@@ -81,62 +169,77 @@ def analyze_customer_purchases(df):
         df['Order Value'] = pd.to_numeric(df['Order Value'], errors='coerce')
         
         # Plot Order Value Distribution
-        plt.figure(figsize=(10, 6))
-        sns.histplot(df['Order Value'], bins=30, kde=True)
-        plt.title('Order Value Distribution')
-        plt.xlabel('Order Value')
-        plt.ylabel('Frequency')
-        plt.show(block=False)
+        report.add('hist', df['Order Value'], 'Order Value Distribution', xlabel='Order Value',
+                   ylabel='Frequency', figsize=(10, 6), bins=30)
 
         # Calculate Average Order Value
         avg_order_value = round(df['Order Value'].mean(), 2)
         print(f"Average Order Value: ${avg_order_value:.2f}")
     
         # Total Orders by Product        
-        plt.figure(figsize=(10, 6))
-        df['Product Name'].value_counts().head(10).plot(kind='bar', color='skyblue')
-        plt.title('Top 10 Products by Total Orders')
-        plt.xlabel('Product')
-        plt.ylabel('Total Orders')
-        plt.xticks(rotation=45, ha='right')
-        plt.show(block=False)
+        report.add('bar', top_values(df['Product Name'], 10), 'Top 10 Products by Total Orders',
+                   xlabel='Product', ylabel='Total Orders', figsize=(10, 6), color='skyblue', rotate_labels=True)
 
 
 # Sales trend analysis
-def analyze_sales_trends(mydf):
+# Monthly line counts come from the daily rollups (see sales_rollups.py) rather than a resample
+# of every Sales row; without rollups they are built from mydf, which is left unchanged.
+@profiled
+def analyze_sales_trends(mydf, rollups=None, period='month', report=None):
+    report = report if report is not None else ChartReport()
     print('\nSales Trends Analysis')
-    if 'Order Date' in mydf.columns:
-        mydf['Order Date'] = pd.to_datetime(mydf['Order Date'], errors='coerce')
-        mydf.set_index('Order Date', inplace=True)
-        monthly_sales = mydf.resample('ME').size()
-
-        plt.figure(figsize=(12, 6))
-        monthly_sales.plot()
-        plt.title('Monthly Sales Trends')
-        plt.xlabel('Date')
-        plt.ylabel('Number of Sales')
-        plt.show(block=False)
+    if rollups is None:
+        if mydf is None or 'Order Date' not in mydf.columns:
+            return
+        rollups = SalesRollups()
+        rollups.append(mydf)
+    sales = rollups.rollup(period)['Line Count']
+    report.add('line', sales, f"{'Daily' if period == 'day' else period.capitalize() + 'ly'} Sales Trends",
+               xlabel='Date', ylabel='Number of Sales', figsize=(12, 6))
+
+
+# Customer value analysis: RFM segments and monthly acquisition cohorts (see customer_analytics.py)
+@profiled
+def analyze_customer_value(sales, products, report=None):
+    report = report if report is not None else ChartReport()
+    print('\nCustomer Value Analysis')
+    scores = rfm_scores(sales, products)
+    print(f"RFM scores for {len(scores)} customers (5 = most recent / frequent / valuable):")
+    print(scores.groupby('R')[['Recency', 'Frequency', 'Monetary']].mean().round(2))
+    print("Largest RFM segments:")
+    print(scores['RFM'].value_counts().head(10))
+
+    active, retention = cohort_matrix(sales)
+    print(f"Monthly cohorts: {len(active)}, average month-1 retention: {retention[1].mean():.2%}"
+          if len(retention.columns) > 1 else f"Monthly cohorts: {len(active)}")
+    report.add('heatmap', retention, 'Monthly Cohort Retention', xlabel='Months Since First Order',
+               ylabel='Cohort', figsize=(14, 10), annotate=len(retention.columns) <= 12)
 
 
 # Product analysis
-def analyze_products(mydf):
+@profiled
+def analyze_products(mydf, report=None):
+    report = report if report is not None else ChartReport()
     print('\nProduct Analysis')
 
     if 'Unit Price USD' in mydf.columns:
-        mydf['Unit Price USD'] = mydf['Unit Price USD'].replace({r'\$': '', ' ': ''}, regex=True)
-        mydf['Unit Price USD'] = pd.to_numeric(mydf['Unit Price USD'], errors='coerce')
+        # Parsed into a local series: the Products frame is shared with the stages loading it
+        prices = mydf['Unit Price USD'].replace({r'\$': '', ' ': ''}, regex=True)
+        prices = pd.to_numeric(prices, errors='coerce')
 
-        plt.figure(figsize=(8, 6))
-        sns.histplot(mydf['Unit Price USD'].dropna(), bins=20, kde=True)
-        plt.title('Product Price Distribution')
-        plt.xlabel('Product Price (USD)')
-        plt.ylabel('Frequency')
-        plt.show(block=False)
+        report.add('hist', prices.dropna(), 'Product Price Distribution',
+                   xlabel='Product Price (USD)', ylabel='Frequency', bins=20)
 
     if 'Category' in mydf.columns:
-        plt.figure(figsize=(10, 8))
-        mydf['Category'].value_counts().plot(kind='bar')
-        plt.title('Product Category Distribution')
-        plt.xlabel('Category')
-        plt.ylabel('Number of Products')
-        plt.show()
\ No newline at end of file
+        report.add('bar', mydf['Category'].value_counts(), 'Product Category Distribution',
+                   xlabel='Category', ylabel='Number of Products', figsize=(10, 8))
+
+
+# Column types applied while parsing, so every chunk of a table comes out with the same dtypes
+csv_dtypes = {
+    "Sales": {'Order Number': 'int64', 'Line Item': 'int64', 'CustomerKey': 'int64', 'StoreKey': 'int64',
+              'ProductKey': 'int64', 'Quantity': 'int64', 'Currency Code': str},
+    "Products": {'ProductKey': 'int64', 'SubcategoryKey': 'int64', 'CategoryKey': 'int64'},
+    "Customers": {'CustomerKey': 'int64', 'Zip Code': str},
+    "Stores": {'StoreKey': 'int64'}
+}
\ No newline at end of file
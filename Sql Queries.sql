@@ -35,26 +35,26 @@ ORDER BY Age;
 -- 4.Top 5 Products Preferred by Female Customers:
 SELECT 
     p.`Product Name`,
-    gender,
+    c.Gender,
     SUM(s.Quantity) AS TotalQuantity
 FROM Sales s
 JOIN Customers c ON s.CustomerKey = c.CustomerKey
 JOIN Products p ON s.ProductKey = p.ProductKey
 WHERE c.Gender = 'Female'
-GROUP BY p.`Product Name`
+GROUP BY p.`Product Name`, c.Gender
 ORDER BY TotalQuantity DESC
 LIMIT 5;
 
 -- 5.Top 5 Products Preferred by Male Customers:
 SELECT 
     p.`Product Name`,
-    gender,
+    c.Gender,
     SUM(s.Quantity) AS TotalQuantity
 FROM Sales s
 JOIN Customers c ON s.CustomerKey = c.CustomerKey
 JOIN Products p ON s.ProductKey = p.ProductKey
 WHERE c.Gender = 'Male'
-GROUP BY p.`Product Name`
+GROUP BY p.`Product Name`, c.Gender
 ORDER BY TotalQuantity DESC
 LIMIT 5;
 
@@ -98,4 +98,12 @@ SELECT
 FROM Sales s
 JOIN Customers c ON s.CustomerKey = c.CustomerKey
 JOIN Products p ON s.ProductKey = p.ProductKey
-GROUP BY c.Gender;
\ No newline at end of file
+GROUP BY c.Gender;
+-- 11.Total Revenue by Currency in Local Currency:
+SELECT
+    l.`Currency Code`,
+    SUM(l.`Revenue USD`) AS TotalRevenueUSD,
+    SUM(l.`Revenue Local`) AS TotalRevenueLocal
+FROM Sales_Local_Revenue l
+GROUP BY l.`Currency Code`
+ORDER BY TotalRevenueUSD DESC;
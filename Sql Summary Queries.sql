@@ -0,0 +1,99 @@
+use data_spark;
+
+-- Same questions as Sql Queries.sql, answered from the daily summary tables kept by sales_summaries.py.
+-- The summaries are keyed by Order Date and leave out Sales lines without one, so every total
+-- here covers dated lines only. Sql Queries.sql counts undated lines too, under a NULL month in
+-- query 8 and in every other total.
+
+-- 1. Top 10 Most Popular Products by Quantity Sold:
+SELECT p.`Product Name`, SUM(d.`Quantity`) AS TotalQuantitySold
+FROM Daily_Product_Sales d
+JOIN products p ON d.`ProductKey` = p.`ProductKey`
+GROUP BY p.`Product Name`
+ORDER BY TotalQuantitySold DESC
+LIMIT 10;
+
+-- 2.Total Revenue by Product Category:
+SELECT p.`Category`, SUM(d.`Revenue`) AS TotalRevenue
+FROM Daily_Product_Sales d
+JOIN products p ON d.`ProductKey` = p.`ProductKey`
+GROUP BY p.`Category`
+ORDER BY TotalRevenue DESC;
+
+-- 3.Top 10 Cities by Total Sales:
+SELECT d.`City`, SUM(d.`Revenue`) AS TotalSales
+FROM Daily_Geo_Sales d
+GROUP BY d.`City`
+ORDER BY TotalSales DESC
+LIMIT 10;
+
+-- 4.Customer Distribution by Age:
+SELECT
+    FLOOR(DATEDIFF(CURRENT_DATE, c.Birthday) / 365) AS Age,
+    COUNT(*) AS CustomerCount
+FROM Customers c
+GROUP BY Age
+ORDER BY Age;
+
+-- 4.Top 5 Products Preferred by Female Customers:
+SELECT
+    p.`Product Name`,
+    d.Gender,
+    SUM(d.Quantity) AS TotalQuantity
+FROM Daily_Product_Sales d
+JOIN Products p ON d.ProductKey = p.ProductKey
+WHERE d.Gender = 'Female'
+GROUP BY p.`Product Name`, d.Gender
+ORDER BY TotalQuantity DESC
+LIMIT 5;
+
+-- 5.Top 5 Products Preferred by Male Customers:
+SELECT
+    p.`Product Name`,
+    d.Gender,
+    SUM(d.Quantity) AS TotalQuantity
+FROM Daily_Product_Sales d
+JOIN Products p ON d.ProductKey = p.ProductKey
+WHERE d.Gender = 'Male'
+GROUP BY p.`Product Name`, d.Gender
+ORDER BY TotalQuantity DESC
+LIMIT 5;
+
+-- 6.Total Number of Customers:
+SELECT
+    COUNT(DISTINCT CustomerKey) AS TotalCustomers
+FROM Customers;
+
+-- 7.Total Revenue by Country:
+SELECT
+    d.Country,
+    SUM(d.Revenue) AS TotalRevenue
+FROM Daily_Geo_Sales d
+GROUP BY d.Country
+ORDER BY TotalRevenue DESC;
+
+-- Lines without an Order Date are not counted (Sql Queries.sql shows them as a NULL month)
+-- 8.Count of Orders by Month:
+SELECT
+    DATE_FORMAT(d.`Order Date`, '%Y-%m') AS Month,
+    SUM(d.`Line Count`) AS OrderCount
+FROM Daily_Store_Sales d
+GROUP BY Month
+ORDER BY Month;
+
+-- 9.Average Quantity Sold per Product:
+SELECT
+    p.`Product Name`,
+    SUM(d.Quantity) * 1.0 / SUM(d.`Line Count`) AS AverageQuantitySold
+FROM Daily_Product_Sales d
+JOIN Products p ON d.ProductKey = p.ProductKey
+GROUP BY p.`Product Name`
+ORDER BY AverageQuantitySold DESC;
+
+-- 10.Total Revenue and Average Order Value by Gender:
+SELECT
+    d.Gender,
+    SUM(d.Revenue) AS TotalRevenue,
+    SUM(d.Revenue) * 1.0 / SUM(d.`Line Count`) AS AverageOrderValue
+FROM Daily_Demographic_Sales d
+GROUP BY d.Gender;
@@ -0,0 +1,65 @@
+# Benchmark: ExchangeRates as-of lookups against pd.merge and pd.merge_asof
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from currency_conversion import ExchangeRates
+
+currencies = ['USD', 'CAD', 'AUD', 'EUR', 'GBP']
+
+
+# Daily rates for every currency (as in Exchange_Rates.csv) and Sales lines spread over them
+def make_tables(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    days = pd.date_range('2015-01-01', '2021-12-31', freq='D')
+    rates = pd.DataFrame({
+        'Date': np.repeat(days, len(currencies)),
+        'Currency': pd.Categorical(np.tile(currencies, len(days))),
+        'Exchange': rng.uniform(0.5, 1.5, len(days) * len(currencies)).round(4),
+    })
+    sales = pd.DataFrame({
+        'Order Date': days[rng.integers(0, len(days), rows)],
+        'Currency Code': pd.Categorical(rng.choice(currencies, rows)),
+    })
+    return sales, rates
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare as-of exchange rate lookups')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        sales, rates = make_tables(rows)
+
+        # Exact-date merge: only correct because every day has a rate
+        start = time.perf_counter()
+        merged = pd.merge(sales, rates, left_on=['Order Date', 'Currency Code'], right_on=['Date', 'Currency'],
+                          how='left')['Exchange'].to_numpy()
+        merge_seconds = time.perf_counter() - start
+
+        # merge_asof needs both sides sorted by date, then the original order restored
+        start = time.perf_counter()
+        ordered = sales.reset_index().sort_values('Order Date', kind='stable')
+        asof = pd.merge_asof(ordered, rates.sort_values('Date'), left_on='Order Date', right_on='Date',
+                             left_by='Currency Code', right_by='Currency')
+        asof = asof.set_index('index')['Exchange'].sort_index().to_numpy()
+        asof_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        looked_up = ExchangeRates(rates).lookup(sales['Currency Code'], sales['Order Date'])
+        lookup_seconds = time.perf_counter() - start
+
+        assert np.array_equal(merged, looked_up) and np.array_equal(asof, looked_up)
+        print(f"{rows:>12,} rows: pd.merge {merge_seconds:7.3f}s  merge_asof {asof_seconds:7.3f}s  "
+              f"ExchangeRates {lookup_seconds:7.3f}s  speedup {merge_seconds / lookup_seconds:5.1f}x / "
+              f"{asof_seconds / lookup_seconds:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# Benchmark: bincount-based RFM scores and cohort matrix against the equivalent pandas groupby
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from customer_analytics import cohort_matrix, rfm_scores
+
+
+# Sales lines grouped into orders (a few lines each), every order placed by one customer on one
+# day between 2016 and 2021
+def make_tables(rows, customers=15266, products=2517, seed=0):
+    rng = np.random.default_rng(seed)
+    orders = rows // 3
+    order_numbers = np.sort(rng.integers(0, orders, rows))
+    order_days = np.sort(rng.integers(0, 6 * 365, orders))
+    sales = pd.DataFrame({
+        'Order Number': order_numbers,
+        'Order Date': pd.Timestamp('2016-01-01') + pd.to_timedelta(order_days[order_numbers], unit='D'),
+        'CustomerKey': rng.integers(1, customers + 1, orders)[order_numbers],
+        'ProductKey': rng.integers(1, products + 1, rows).astype(np.int16),
+        'Quantity': rng.integers(1, 10, rows).astype(np.int8),
+    })
+    products = pd.DataFrame({
+        'ProductKey': np.arange(1, products + 1, dtype=np.int16),
+        'Unit Price USD': rng.uniform(1, 3000, products).round(2),
+    })
+    return sales, products
+
+
+def groupby_rfm(sales, products):
+    lines = sales.merge(products, on='ProductKey', how='inner')
+    lines['Revenue'] = lines['Quantity'] * lines['Unit Price USD']
+    per_customer = lines.groupby('CustomerKey').agg(last=('Order Date', 'max'),
+                                                    Frequency=('Order Number', 'nunique'),
+                                                    Monetary=('Revenue', 'sum'))
+    per_customer['Recency'] = (lines['Order Date'].max() - per_customer['last']).dt.days
+    return per_customer
+
+
+def groupby_cohorts(sales):
+    months = sales['Order Date'].dt.year * 12 + sales['Order Date'].dt.month
+    cohort = months.groupby(sales['CustomerKey']).transform('min')
+    pairs = pd.DataFrame({'CustomerKey': sales['CustomerKey'], 'Cohort': cohort,
+                          'Months Since': months - cohort}).drop_duplicates()
+    return pairs.groupby(['Cohort', 'Months Since']).size().unstack()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare bincount RFM / cohorts with pandas groupby')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        sales, products = make_tables(rows)
+
+        start = time.perf_counter()
+        expected_rfm = groupby_rfm(sales, products)
+        expected_active = groupby_cohorts(sales)
+        groupby_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scores = rfm_scores(sales, products)
+        active, _ = cohort_matrix(sales)
+        bincount_seconds = time.perf_counter() - start
+
+        assert np.array_equal(scores['Frequency'], expected_rfm['Frequency'])
+        assert np.array_equal(scores['Recency'], expected_rfm['Recency'])
+        assert np.allclose(scores['Monetary'], expected_rfm['Monetary'])
+        assert np.array_equal(active.fillna(0).to_numpy()[:, :expected_active.shape[1]],
+                              expected_active.fillna(0).to_numpy())
+
+        print(f"{rows:>12,} rows: groupby {groupby_seconds:8.3f}s  bincount {bincount_seconds:8.3f}s  "
+              f"speedup {groupby_seconds / bincount_seconds:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# Benchmark: normalize_dates against the per-row .apply(convert_date_format) path
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from DataSparkFinal import convert_date_format, normalize_dates
+
+
+# Build a column of m/d/Y strings with the heavy repetition of real order dates
+def make_date_column(rows, distinct_days=2000, missing_share=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    days = pd.date_range('2016-01-01', periods=distinct_days, freq='D')
+    labels = np.array([f"{d.month}/{d.day}/{d.year}" for d in days], dtype=object)
+    values = labels[rng.integers(0, distinct_days, rows)]
+    values[rng.random(rows) < missing_share] = None
+    values[:3] = ['13/45/2020', 'not a date', '']
+    return pd.Series(values, name='Order Date')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare date normalization strategies')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        column = make_date_column(rows)
+
+        start = time.perf_counter()
+        applied = column.apply(convert_date_format)
+        apply_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        normalized = normalize_dates(column)
+        vectorized_seconds = time.perf_counter() - start
+
+        # Both paths must agree, with None on the .apply side matching NaT on the other
+        expected = pd.to_datetime(applied, format='%Y-%m-%d')
+        assert expected.isna().equals(normalized.isna())
+        assert (expected.dropna() == normalized.dropna()).all()
+
+        print(f"{rows:>12,} rows: apply {apply_seconds:8.3f}s  normalize_dates {vectorized_seconds:8.3f}s  "
+              f"speedup {apply_seconds / vectorized_seconds:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
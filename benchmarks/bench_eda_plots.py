@@ -0,0 +1,56 @@
+# Benchmark: histogram + KDE charts drawn by seaborn over every value against ChartReport's
+# large-data path (np.histogram over every value, KDE fitted on a seeded sample)
+import argparse
+import os
+import sys
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import seaborn as sns
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chart_rendering import bin_values, draw_chart, kde_sample_size
+
+
+# Order values as in analyze_customer_purchases: quantity times a skewed unit price
+def make_values(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.Series(rng.integers(1, 10, rows) * rng.lognormal(4, 1, rows).round(2), name='Order Value')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare full and binned histogram/KDE charts')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 5_000_000])
+    parser.add_argument('--sample-size', type=int, default=kde_sample_size)
+    parser.add_argument('--bins', type=int, default=30)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        values = make_values(rows)
+
+        start = time.perf_counter()
+        fig, ax = plt.subplots(figsize=(10, 6))
+        sns.histplot(values, bins=args.bins, kde=True, ax=ax)
+        plt.close(fig)
+        full_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        data = bin_values(values, args.bins, args.sample_size, seed=0)
+        fig = draw_chart({'kind': 'binned_hist', 'data': data, 'title': 'Order Value Distribution',
+                          'xlabel': None, 'ylabel': None, 'figsize': (10, 6)})
+        plt.close(fig)
+        binned_seconds = time.perf_counter() - start
+
+        # Same bars either way; the sampled KDE should stay close to the full one
+        counts, _ = np.histogram(values, bins=args.bins)
+        assert np.array_equal(counts, data['counts'])
+        print(f"{rows:>12,} rows: histplot(kde=True) {full_seconds:7.3f}s  binned {binned_seconds:7.3f}s  "
+              f"speedup {full_seconds / binned_seconds:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# Benchmark: every pipeline stage (encoding detection, CSV parse, cleaning, validation, database
+# insert, the query catalog, Sales merge and each EDA analysis) on synthetic data of several sizes. Results are
+# written as JSON, and --compare prints the change against an earlier run so regressions between
+# versions stand out.
+import argparse
+import collections
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import numpy as np
+import pandas as pd
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+import DataSparkFinal as pipeline
+from chart_rendering import ChartReport
+from currency_conversion import ExchangeRates, local_revenue
+from data_quality import DataValidator
+from query_catalog import default_jobs, load_catalog, run_catalog
+from star_schema import StarSchema
+from storage_backends import get_backend
+from synthetic_data import write_tables
+from table_schemas import apply_schema
+
+stage_names = ['encoding_detection', 'csv_parse', 'cleaning', 'validation', 'db_insert', 'query_catalog', 'merge',
+               'eda_summary', 'analyze_customer_demographics', 'analyze_customer_purchases',
+               'analyze_sales_trends', 'analyze_products', 'analyze_customer_value', 'chart_rendering']
+
+
+# Run fn with its printed output discarded and return (result, seconds)
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=repo_dir, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Seconds per stage for one data set. Each stage consumes the previous one's output, as main()
+# does, so the stages together are one pass of the pipeline.
+def run_stages(paths, stages, backend_name):
+    seconds = {}
+
+    encodings = {}
+    start = time.perf_counter()
+    for table, path in paths.items():
+        encodings[table] = pipeline.detect_encoding(path, refresh=True)
+    seconds['encoding_detection'] = time.perf_counter() - start
+
+    raw = {}
+    start = time.perf_counter()
+    for table, path in paths.items():
+        raw[table] = pd.read_csv(path, encoding=encodings[table], dtype=pipeline.csv_dtypes.get(table))
+    seconds['csv_parse'] = time.perf_counter() - start
+
+    data_frames, seconds['cleaning'] = timed(
+        lambda: {table: apply_schema(table, pipeline.clean_table(table, df), report=False) for table, df in raw.items()})
+    del raw
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if 'validation' in stages:
+            validator = DataValidator(data_frames, os.path.join(tmp_dir, 'quarantine'))
+
+            def validate():
+                for level in pipeline.load_levels(pipeline.foreign_key_graph(pipeline.table_definitions)):
+                    for table in level:
+                        if table in data_frames:
+                            data_frames[table] = validator.validate(table, data_frames[table])
+            _, seconds['validation'] = timed(validate)
+
+        if 'db_insert' in stages:
+            backend = get_backend(backend_name, pipeline.mysql_config, os.path.join(tmp_dir, f'bench.{backend_name}'))
+            _, seconds['db_insert'] = timed(pipeline.load_into_database, data_frames, backend, pool_size=1, writers=1,
+                                            build_indexes=False)
+
+            # Every catalog query must run on every backend, so a failing one stops the benchmark
+            if 'query_catalog' in stages:
+                catalog = load_catalog()
+                results, seconds['query_catalog'] = timed(run_catalog, backend, catalog, use_cache=False)
+                failed = collections.Counter(name for name, _ in default_jobs(catalog))
+                failed.subtract(result['name'] for result in results)
+                if any(failed.values()):
+                    raise SystemExit(f"Catalog queries failed on {backend_name}: "
+                                     f"{', '.join(name for name, count in failed.items() if count)}")
+
+        def merge():
+            star = StarSchema.from_tables(data_frames)
+            merged = star.view(['Quantity', 'Unit Price USD', 'Product Name'])
+            local_revenue(star, ExchangeRates(data_frames["Exchange_Rates"]))
+            return merged
+        merged_df, seconds['merge'] = timed(merge)
+
+        # Charts are queued, not drawn, so each analysis is timed on its own numbers
+        report = ChartReport('files', os.path.join(tmp_dir, 'charts'))
+        _, seconds['eda_summary'] = timed(
+            lambda: [pipeline.eda_summary(df, table, report=report) for table, df in data_frames.items()])
+        _, seconds['analyze_customer_demographics'] = timed(pipeline.analyze_customer_demographics,
+                                                            data_frames["Customers"], report)
+        _, seconds['analyze_customer_purchases'] = timed(pipeline.analyze_customer_purchases, merged_df, report)
+        _, seconds['analyze_sales_trends'] = timed(pipeline.analyze_sales_trends, data_frames["Sales"],
+                                                   report=report)
+        _, seconds['analyze_products'] = timed(pipeline.analyze_products, data_frames["Products"], report)
+        _, seconds['analyze_customer_value'] = timed(pipeline.analyze_customer_value, data_frames["Sales"],
+                                                     data_frames["Products"], report)
+        if 'chart_rendering' in stages:
+            _, seconds['chart_rendering'] = timed(report.render)
+    return {stage: seconds[stage] for stage in stage_names if stage in seconds and stage in stages}
+
+
+# Per-stage ratio of this run to an earlier one; stages more than threshold times (and at least
+# min_seconds) slower are flagged, so timer noise on tiny stages is not reported
+def compare(results, baseline, threshold=1.2, min_seconds=0.05):
+    previous = {(run['rows'], stage): value for run in baseline['runs'] for stage, value in run['seconds'].items()}
+    print(f"\nCompared with {baseline.get('revision') or 'the baseline'} ({baseline.get('created')}):")
+    for run in results['runs']:
+        for stage, value in run['seconds'].items():
+            before = previous.get((run['rows'], stage))
+            if not before:
+                continue
+            ratio = value / before
+            flag = '  REGRESSION' if ratio > threshold and value - before >= min_seconds else ''
+            print(f"{run['rows']:>12,} rows  {stage:<32} {before:8.3f}s -> {value:8.3f}s  {ratio:5.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time every pipeline stage on synthetic data')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--backend', choices=['sqlite', 'duckdb'], default='sqlite',
+                        help='Embedded database for the insert stage (default: sqlite)')
+    parser.add_argument('--stages', nargs='+', choices=stage_names, default=stage_names,
+                        help='Stages to time (encoding detection, parsing and cleaning always run)')
+    parser.add_argument('--data-dir', default=os.path.join(repo_dir, '.dataspark_cache', 'synthetic'),
+                        help='Where the generated data sets are kept between runs')
+    parser.add_argument('--output', default=None,
+                        help='JSON results file (default: benchmarks/results/pipeline-<revision>.json)')
+    parser.add_argument('--compare', default=None, help='Earlier JSON results file to compare against')
+    args = parser.parse_args()
+
+    revision = git_revision()
+    results = {
+        'revision': revision,
+        'created': datetime.datetime.now().replace(microsecond=0).isoformat(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'seed': args.seed,
+        'backend': args.backend,
+        'runs': [],
+    }
+    for rows in args.rows:
+        paths = write_tables(os.path.join(args.data_dir, f"{rows}-{args.seed}"), rows, args.seed)
+        seconds = run_stages(paths, set(args.stages), args.backend)
+        results['runs'].append({'rows': rows, 'seconds': seconds})
+        print(f"\n{rows:,} Sales rows:")
+        for stage, value in seconds.items():
+            print(f"  {stage:<32} {value:8.3f}s")
+
+    output = args.output or os.path.join(repo_dir, 'benchmarks', 'results', f"pipeline-{revision or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Benchmark: StarSchema gathers against pd.merge for widening Sales with dimension columns
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from star_schema import StarSchema
+
+
+# Sales and dimension tables with the shape of the real data: a few thousand products, tens of
+# thousands of customers and a few dozen stores, with some keys missing from the dimensions
+def make_tables(rows, products=2517, customers=15266, stores=67, seed=0):
+    rng = np.random.default_rng(seed)
+    sales = pd.DataFrame({
+        'Order Number': np.arange(rows, dtype=np.int64),
+        'ProductKey': rng.integers(1, products + 2, rows).astype(np.int16),
+        'CustomerKey': rng.integers(1, customers * 20, rows, dtype=np.int64),
+        'StoreKey': rng.integers(0, stores + 1, rows).astype(np.int8),
+        'Quantity': rng.integers(1, 10, rows).astype(np.int8),
+    })
+    dimensions = {
+        "Products": pd.DataFrame({
+            'ProductKey': np.arange(1, products + 1, dtype=np.int16),
+            'Product Name': pd.array([f"Product {i}" for i in range(products)], dtype='str'),
+            'Unit Price USD': rng.uniform(1, 3000, products).round(2),
+            'Category': pd.Categorical(rng.choice(['Audio', 'Cameras', 'Computers', 'TV'], products)),
+        }),
+        # Sparse customer keys exercise the binary-search path
+        "Customers": pd.DataFrame({
+            'CustomerKey': np.sort(rng.choice(customers * 20, customers, replace=False)).astype(np.int64),
+            'Country': pd.Categorical(rng.choice(['US', 'UK', 'Germany', 'Canada'], customers)),
+        }),
+        "Stores": pd.DataFrame({
+            'StoreKey': np.arange(stores, dtype=np.int8),
+            'Square Meters': rng.integers(200, 2500, stores).astype(np.int16),
+        }),
+    }
+    return sales, dimensions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare StarSchema gathers with pd.merge')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    args = parser.parse_args()
+
+    columns = ['Quantity', 'Unit Price USD', 'Product Name', 'Category', 'Country', 'Square Meters']
+    for rows in args.rows:
+        sales, dimensions = make_tables(rows)
+
+        start = time.perf_counter()
+        merged = sales
+        for name, df in dimensions.items():
+            merged = pd.merge(merged, df, on=df.columns[0], how='left')
+        merged = merged[columns]
+        merge_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        gathered = StarSchema(sales, dimensions).view(columns)
+        star_seconds = time.perf_counter() - start
+
+        for col in columns:
+            assert merged[col].equals(gathered[col]), col
+
+        print(f"{rows:>12,} rows: pd.merge {merge_seconds:8.3f}s  StarSchema {star_seconds:8.3f}s  "
+              f"speedup {merge_seconds / star_seconds:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
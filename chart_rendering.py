@@ -0,0 +1,171 @@
+# Chart output for the EDA. Each analysis describes its charts (kind, data, labels) and a
+# ChartReport either shows them interactively, renders them headless to image files on a
+# process pool, or prints only the numbers behind them without building any figure.
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+from stage_profiler import collect, stage, submit
+from streaming_stats import ReservoirSample, gaussian_kde
+
+chart_modes = ['show', 'files', 'numbers']
+chart_formats = ['png', 'svg']
+
+# Histograms of more values than this are binned before plotting and their KDE is fitted on a
+# random sample of kde_sample_size values (drawn with the report's seed, so reruns match)
+large_data_rows = 1_000_000
+kde_sample_size = 50_000
+kde_grid_points = 200
+
+
+# Bin a large histogram with np.histogram over every value and fit its KDE on a seeded random
+# sample, scaled to counts like histplot(kde=True). Only these arrays reach the plot or worker.
+def bin_values(series, bins, sample_size=kde_sample_size, seed=0):
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    values = values[~np.isnan(values)]
+    counts, edges = np.histogram(values, bins=bins)
+    sample = ReservoirSample(sample_size, seed)
+    sample.update(values)
+    grid = np.linspace(edges[0], edges[-1], kde_grid_points)
+    density = gaussian_kde(sample.values, grid)
+    return {'counts': counts, 'edges': edges, 'name': series.name, 'kde_x': grid,
+            'kde_y': None if density is None else density * len(values) * (edges[1] - edges[0])}
+
+
+# Build the figure for one chart description; the caller shows, saves or closes it
+def draw_chart(spec):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, ax = plt.subplots(figsize=spec['figsize'])
+    kind, data = spec['kind'], spec['data']
+    if kind == 'heatmap':
+        sns.heatmap(data.round(2), annot=spec.get('annotate', True), cmap='viridis', ax=ax)
+    elif kind == 'count':
+        sns.countplot(x=data, ax=ax)
+    elif kind == 'hist':
+        sns.histplot(data, bins=spec['bins'], kde=True, ax=ax)
+    elif kind == 'binned_hist':
+        edges = data['edges']
+        sns.histplot(x=(edges[:-1] + edges[1:]) / 2, weights=data['counts'], bins=len(edges) - 1,
+                     binrange=(edges[0], edges[-1]), ax=ax)
+        if data['kde_y'] is not None:
+            ax.plot(data['kde_x'], data['kde_y'])
+        ax.set_xlabel(data['name'])
+    elif kind == 'bar':
+        data.plot(kind='bar', ax=ax, color=spec.get('color'))
+    elif kind == 'line':
+        data.plot(ax=ax)
+    else:
+        raise ValueError(f"Unknown chart kind {kind!r}")
+    ax.set_title(spec['title'])
+    if spec['xlabel'] is not None:
+        ax.set_xlabel(spec['xlabel'])
+    if spec['ylabel'] is not None:
+        ax.set_ylabel(spec['ylabel'])
+    if spec.get('rotate_labels'):
+        plt.setp(ax.get_xticklabels(), rotation=45, ha='right')
+    return fig
+
+
+# Save one chart in every format and close its figure straight away; runs in a worker process
+def render_chart(spec, output_dir, formats):
+    import matplotlib.pyplot as plt
+
+    with stage('render_chart', target=spec['name']):
+        fig = draw_chart(spec)
+        try:
+            paths = []
+            for fmt in formats:
+                path = os.path.join(output_dir, f"{spec['name']}.{fmt}")
+                fig.savefig(path, format=fmt, bbox_inches='tight')
+                paths.append(path)
+            return paths
+        finally:
+            plt.close(fig)
+
+
+def use_headless_backend():
+    matplotlib.use('Agg')
+
+
+# The numbers a chart would show
+def chart_numbers(spec):
+    kind, data = spec['kind'], spec['data']
+    if kind == 'heatmap':
+        return data.round(2)
+    if kind == 'count':
+        return data.value_counts(sort=False)
+    if kind == 'hist':
+        values = data.dropna()
+        counts, edges = np.histogram(values, bins=spec['bins'])
+        return pd.Series(counts, index=pd.IntervalIndex.from_breaks(edges.round(2)), name='count')
+    if kind == 'binned_hist':
+        return pd.Series(data['counts'], index=pd.IntervalIndex.from_breaks(data['edges'].round(2)), name='count')
+    return data
+
+
+class ChartReport:
+    def __init__(self, mode='show', output_dir='charts', formats=('png',), workers=None,
+                 large_rows=large_data_rows, sample_size=kde_sample_size, seed=0):
+        if mode not in chart_modes:
+            raise ValueError(f"Chart mode must be one of {', '.join(chart_modes)}")
+        self.mode = mode
+        self.output_dir = output_dir
+        self.formats = list(formats)
+        self.workers = workers
+        self.large_rows = large_rows
+        self.sample_size = sample_size
+        self.seed = seed
+        self.specs = []
+        self.names = set()
+
+    # File name for a chart: its title as a slug, numbered when a title repeats
+    def chart_name(self, title):
+        base = re.sub(r'[^a-z0-9]+', '_', title.lower()).strip('_') or 'chart'
+        name, suffix = base, 2
+        while name in self.names:
+            name, suffix = f"{base}_{suffix}", suffix + 1
+        self.names.add(name)
+        return name
+
+    # Add one chart: kind is heatmap, count, hist, bar or line
+    def add(self, kind, data, title, xlabel=None, ylabel=None, figsize=(8, 6), **options):
+        if kind == 'hist' and self.mode != 'numbers' and len(data) > self.large_rows:
+            kind, data = 'binned_hist', bin_values(data, options['bins'], self.sample_size, self.seed)
+        spec = {'kind': kind, 'data': data, 'title': title, 'xlabel': xlabel, 'ylabel': ylabel,
+                'figsize': figsize, 'name': self.chart_name(title), **options}
+        if self.mode == 'numbers':
+            print(f"\n{title}:")
+            print(chart_numbers(spec))
+        elif self.mode == 'show':
+            import matplotlib.pyplot as plt
+            draw_chart(spec)
+            plt.show(block=False)
+        else:
+            self.specs.append(spec)
+
+    # Finish the report: in files mode render every queued chart on a process pool (returns the
+    # written paths); in show mode block until the chart windows are closed
+    def render(self):
+        if self.mode == 'show':
+            import matplotlib.pyplot as plt
+            plt.show()
+            return []
+        if self.mode == 'numbers' or not self.specs:
+            return []
+        start = time.perf_counter()
+        os.makedirs(self.output_dir, exist_ok=True)
+        workers = min(self.workers or os.cpu_count() or 1, len(self.specs))
+        with ProcessPoolExecutor(max_workers=workers, initializer=use_headless_backend) as pool:
+            futures = [submit(pool, render_chart, spec, self.output_dir, self.formats) for spec in self.specs]
+            paths = [path for future in futures for path in collect(future)]
+        print(f"Rendered {len(self.specs)} charts to {self.output_dir} in {time.perf_counter() - start:.2f}s "
+              f"on {workers} process(es).")
+        self.specs = []
+        return paths
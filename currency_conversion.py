@@ -0,0 +1,104 @@
+# Currency conversion for Sales: every line is converted with the exchange rate in effect on its
+# Order Date (the latest rate on or before that date), in Python and in SQL
+import numpy as np
+import pandas as pd
+
+# The same as-of lookup as a view. Exchange is units of the local currency per USD, NULL when
+# the currency has no rate on or before the Order Date (the line still counts in USD).
+local_revenue_view = """
+    CREATE OR REPLACE VIEW Sales_Local_Revenue AS
+    SELECT s.`Order Number`, s.`Line Item`, s.`Order Date`, s.`Currency Code`,
+           s.Quantity * p.`Unit Price USD` AS `Revenue USD`,
+           r.`Exchange`,
+           s.Quantity * p.`Unit Price USD` * r.`Exchange` AS `Revenue Local`
+    FROM Sales s
+    JOIN Products p ON s.ProductKey = p.ProductKey
+    {rate_join};
+"""
+
+# MySQL and SQLite find the rate by seeking the (Currency, Date) index for the latest
+# Date <= Order Date, once per line
+index_rate_join = """LEFT JOIN Exchange_Rates r ON r.`Currency` = s.`Currency Code`
+        AND r.`Date` = (SELECT MAX(r2.`Date`) FROM Exchange_Rates r2
+                        WHERE r2.`Currency` = s.`Currency Code` AND r2.`Date` <= s.`Order Date`)"""
+
+# DuckDB does not use indexes for that subquery and rescans the rates for every line; its
+# ASOF join sorts both sides once and merges them
+asof_rate_join = """ASOF LEFT JOIN Exchange_Rates r ON r.`Currency` = s.`Currency Code`
+        AND s.`Order Date` >= r.`Date`"""
+
+# Tables the view reads, for the query result cache
+local_revenue_view_tables = ['Sales', 'Products', 'Exchange_Rates']
+
+
+def create_local_revenue_view(cursor, backend):
+    rate_join = asof_rate_join if backend.supports_asof_join else index_rate_join
+    cursor.execute(backend.translate_ddl(local_revenue_view.format(rate_join=rate_join)))
+
+
+# Widest order-date range (in days) served from a precomputed as-of table
+max_table_days = 1 << 16
+
+
+# Exchange_Rates held as one pair of sorted arrays (days, rates) per currency
+class ExchangeRates:
+    def __init__(self, rates_df):
+        rates = rates_df.dropna(subset=['Date', 'Currency', 'Exchange'])
+        rates = rates.sort_values('Date', kind='stable').drop_duplicates(['Date', 'Currency'], keep='last')
+        self.arrays = {}
+        for currency, group in rates.groupby(rates['Currency'].astype(str)):
+            self.arrays[currency] = (group['Date'].to_numpy().astype('datetime64[D]'),
+                                     group['Exchange'].to_numpy(dtype=np.float64))
+
+    # Rate in effect on each date for each currency: the latest rate on or before the date,
+    # NaN when the currency has no rate that early (or the date is missing)
+    def lookup(self, currencies, dates):
+        currencies = pd.Categorical(currencies)
+        days = np.asarray(dates).astype('datetime64[D]')
+        missing = np.isnat(days)
+        if missing.all():
+            return np.full(len(days), np.nan)
+        first, last = days[~missing].min(), days[~missing].max()
+        span = int((last - first).astype(np.int64)) + 1
+        if span > max_table_days:
+            return self.lookup_rows(currencies, days, missing)
+
+        # As-of rate of every currency on every day between the first and last order date
+        # (one searchsorted per currency over the calendar), then one gather per Sales line.
+        # The extra last row and column stay NaN for unknown currencies and missing dates.
+        calendar = first + np.arange(span)
+        table = np.full((len(currencies.categories) + 1, span + 1), np.nan)
+        for code, currency in enumerate(currencies.categories):
+            if currency in self.arrays:
+                rate_days, rate_values = self.arrays[currency]
+                positions = np.searchsorted(rate_days, calendar, side='right') - 1
+                table[code, :span] = np.where(positions >= 0, rate_values[positions.clip(0)], np.nan)
+        rows = np.where(currencies.codes >= 0, currencies.codes, len(currencies.categories))
+        columns = np.where(missing, span, (days - first).astype(np.int64))
+        return table[rows, columns]
+
+    # Same lookup with one binary search per Sales line, for date ranges too wide for a table
+    def lookup_rows(self, currencies, days, missing):
+        result = np.full(len(days), np.nan)
+        for code, currency in enumerate(currencies.categories):
+            if currency not in self.arrays:
+                continue
+            rate_days, rate_values = self.arrays[currency]
+            rows = np.flatnonzero((currencies.codes == code) & ~missing)
+            positions = np.searchsorted(rate_days, days[rows], side='right') - 1
+            found = positions >= 0
+            result[rows[found]] = rate_values[positions[found]]
+        return result
+
+
+# USD and local-currency revenue of every Sales line, aligned with the Sales index
+def local_revenue(star, rates):
+    view = star.view(['Order Date', 'Currency Code', 'Quantity', 'Unit Price USD'])
+    revenue_usd = view['Quantity'] * view['Unit Price USD']
+    exchange = rates.lookup(view['Currency Code'], view['Order Date'])
+    return pd.DataFrame({
+        'Currency Code': view['Currency Code'],
+        'Revenue USD': revenue_usd,
+        'Exchange': exchange,
+        'Revenue Local': revenue_usd * exchange,
+    }, index=view.index)
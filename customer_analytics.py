@@ -0,0 +1,147 @@
+# Customer RFM (recency, frequency, monetary) scores and monthly acquisition cohorts over all
+# Sales history. Customers and months are integer-coded so every per-customer and per-cohort
+# figure is one bincount / ufunc.at pass over the Sales lines, with no Python-level groupby.
+# The same metrics are available in the database as the Customer_RFM and Customer_Cohorts views.
+import numpy as np
+import pandas as pd
+
+from star_schema import StarSchema
+
+rfm_buckets = 5
+
+# Recency is in days before the last Order Date in Sales. R, F and M are NTILE(5) buckets
+# (5 = most recent, most frequent, highest spending), ties broken by CustomerKey, exactly as
+# rfm_scores computes them.
+customer_rfm_view = """
+    CREATE OR REPLACE VIEW Customer_RFM AS
+    SELECT t.CustomerKey, t.Recency, t.Frequency, t.Monetary,
+           NTILE(5) OVER (ORDER BY t.Recency DESC, t.CustomerKey) AS R,
+           NTILE(5) OVER (ORDER BY t.Frequency, t.CustomerKey) AS F,
+           NTILE(5) OVER (ORDER BY t.Monetary, t.CustomerKey) AS M
+    FROM (
+        SELECT c.CustomerKey, DATEDIFF(d.`As Of`, c.`Last Order`) AS Recency, c.Frequency, c.Monetary
+        FROM (
+            SELECT s.CustomerKey, MAX(s.`Order Date`) AS `Last Order`,
+                   COUNT(DISTINCT s.`Order Number`) AS Frequency,
+                   SUM(s.Quantity * p.`Unit Price USD`) AS Monetary
+            FROM Sales s
+            JOIN Products p ON s.ProductKey = p.ProductKey
+            WHERE s.`Order Date` IS NOT NULL
+            GROUP BY s.CustomerKey
+        ) c
+        CROSS JOIN (SELECT MAX(`Order Date`) AS `As Of` FROM Sales) d
+    ) t;
+"""
+
+# Active customers per acquisition cohort (month of the first order) and months since it;
+# Retention is the share of the cohort active that month
+customer_cohorts_view = """
+    CREATE OR REPLACE VIEW Customer_Cohorts AS
+    SELECT f.Cohort, a.`Order Month` - f.`Cohort Month` AS `Months Since`,
+           COUNT(*) AS `Active Customers`,
+           1.0 * COUNT(*) / MAX(COUNT(*)) OVER (PARTITION BY f.Cohort) AS Retention
+    FROM (
+        SELECT CustomerKey, DATE_FORMAT(MIN(`Order Date`), '%Y-%m') AS Cohort,
+               MIN(EXTRACT(YEAR FROM `Order Date`) * 12 + EXTRACT(MONTH FROM `Order Date`)) AS `Cohort Month`
+        FROM Sales
+        WHERE `Order Date` IS NOT NULL
+        GROUP BY CustomerKey
+    ) f
+    JOIN (
+        SELECT DISTINCT CustomerKey, EXTRACT(YEAR FROM `Order Date`) * 12 + EXTRACT(MONTH FROM `Order Date`) AS `Order Month`
+        FROM Sales
+        WHERE `Order Date` IS NOT NULL
+    ) a ON a.CustomerKey = f.CustomerKey
+    GROUP BY f.Cohort, a.`Order Month` - f.`Cohort Month`;
+"""
+
+
+def create_customer_views(cursor, backend):
+    for view in (customer_rfm_view, customer_cohorts_view):
+        cursor.execute(backend.translate_query(backend.translate_ddl(view)))
+
+
+# NTILE(buckets) of each value, as SQL numbers rows ordered by value then key: the first
+# len % buckets tiles hold one row more than the others
+def ntile(values, keys, buckets=rfm_buckets, descending=False):
+    n = len(values)
+    order = np.lexsort((keys, -values if descending else values))
+    size, larger = divmod(n, buckets)
+    positions = np.arange(n)
+    split = larger * (size + 1)
+    tiles = np.where(positions < split, positions // max(size + 1, 1),
+                     larger + (positions - split) // max(size, 1)) + 1
+    result = np.empty(n, dtype=np.int64)
+    result[order] = tiles
+    return result
+
+
+# Sales lines with an Order Date (and, given products, a product: the rows the RFM view's inner
+# join keeps), with integer customer codes (positions in customers) and revenue
+def coded_lines(sales, products=None):
+    columns = ['CustomerKey', 'Order Number', 'Order Date', 'Quantity']
+    if products is None:
+        view = sales[columns]
+        view = view[view['Order Date'].notna().to_numpy()]
+        revenue = None
+    else:
+        view = StarSchema(sales, {"Products": products}).view([*columns, 'Unit Price USD'])
+        view = view[view['Order Date'].notna().to_numpy() & view['Unit Price USD'].notna().to_numpy()]
+        revenue = view['Quantity'].to_numpy(dtype=np.float64) * view['Unit Price USD'].to_numpy(dtype=np.float64)
+    codes, customers = pd.factorize(view['CustomerKey'], sort=True)
+    days = view['Order Date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    return view, codes, customers, days, revenue
+
+
+# Recency (days before as_of, by default the last Order Date), Frequency (distinct orders),
+# Monetary (revenue in USD) and their R, F, M scores for every customer with Sales lines
+def rfm_scores(sales, products, as_of=None, buckets=rfm_buckets):
+    view, codes, customers, days, revenue = coded_lines(sales, products)
+    n = len(customers)
+    last = np.full(n, np.iinfo(np.int64).min)
+    np.maximum.at(last, codes, days)
+    as_of_day = days.max() if as_of is None else np.datetime64(pd.Timestamp(as_of), 'D').astype(np.int64)
+    # An order belongs to one customer, so its first line counts it once
+    first_line = ~view['Order Number'].duplicated().to_numpy()
+    frequency = np.bincount(codes[first_line], minlength=n)
+    monetary = np.bincount(codes, weights=revenue, minlength=n)
+    recency = as_of_day - last
+    keys = customers.to_numpy()
+    scores = pd.DataFrame({
+        'Recency': recency,
+        'Frequency': frequency,
+        'Monetary': monetary,
+        'R': ntile(recency, keys, buckets, descending=True),
+        'F': ntile(frequency, keys, buckets),
+        'M': ntile(monetary, keys, buckets),
+    }, index=pd.Index(keys, name='CustomerKey'))
+    scores['RFM'] = scores['R'].astype(str) + scores['F'].astype(str) + scores['M'].astype(str)
+    return scores
+
+
+# Monthly acquisition cohorts: (active customers, retention), each a cohort x months-since
+# matrix indexed by the cohort month ('YYYY-MM'). Cells past the last month of data are NaN.
+def cohort_matrix(sales):
+    _, codes, customers, days, _ = coded_lines(sales)
+    months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    first_month_index, last_month_index = months.min(), months.max()
+    span = int(last_month_index - first_month_index) + 1
+    months = months - first_month_index
+    cohort = np.full(len(customers), span, dtype=np.int64)
+    np.minimum.at(cohort, codes, months)
+
+    # Each (customer, month) pair counts once, in its customer's cohort row
+    pairs = pd.unique(codes.astype(np.int64) * span + months)
+    pair_codes, pair_months = np.divmod(pairs, span)
+    pair_cohorts = cohort[pair_codes]
+    active = np.bincount(pair_cohorts * span + (pair_months - pair_cohorts), minlength=span * span)
+    active = active.reshape(span, span).astype(np.float64)
+    # Months since acquisition that lie beyond the data are unknown, not zero
+    active[np.arange(span)[:, None] + np.arange(span)[None, :] >= span] = np.nan
+
+    labels = (np.datetime64('1970-01', 'M') + first_month_index + np.arange(span)).astype(str)
+    active = pd.DataFrame(active, index=pd.Index(labels, name='Cohort'),
+                          columns=pd.RangeIndex(span, name='Months Since'))
+    sizes = active[0]
+    active = active[sizes > 0]
+    return active, active.div(sizes[sizes > 0], axis=0)
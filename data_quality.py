@@ -0,0 +1,176 @@
+# Row-level data quality checks, run on every cleaned table (or streamed chunk) before it is
+# written to the database. Each rule is one vectorized expression over the whole frame and sets
+# one bit of a per-row uint32 mask; rows with any bit set are written to a quarantine CSV and
+# left out of the load, so a bad key is reported up front instead of failing a FOREIGN KEY
+# halfway through insert_data.
+import os
+
+import numpy as np
+import pandas as pd
+
+from incremental_load import row_key_columns
+from star_schema import max_lookup_density, max_lookup_slots
+
+quarantine_dir = 'quarantine'
+
+# Rules per table, as (kind, target):
+#   required    column          the value is missing
+#   unparsed    column          clean_table could not parse the date text (it became NaT)
+#   not_before  (first, second) second is earlier than first
+#   positive    column          the value is zero or negative
+#   references  (column, table) the key has no row in the referenced table
+#   unique      columns         the key repeats on a later row, which the upsert would keep instead
+table_rules = {
+    "Sales": [('required', 'Order Date'), ('unparsed', 'Order Date'), ('unparsed', 'Delivery Date'),
+              ('not_before', ('Order Date', 'Delivery Date')), ('positive', 'Quantity'),
+              ('references', ('CustomerKey', "Customers")), ('references', ('ProductKey', "Products")),
+              ('references', ('StoreKey', "Stores")), ('unique', ('Order Number', 'Line Item'))],
+    "Customers": [('unique', tuple(row_key_columns["Customers"])), ('unparsed', 'Birthday')],
+    "Products": [('unique', tuple(row_key_columns["Products"])), ('required', 'Unit Price USD'),
+                 ('positive', 'Unit Price USD'), ('positive', 'Unit Cost USD')],
+    "Stores": [('unique', tuple(row_key_columns["Stores"])), ('unparsed', 'Open Date')],
+    "Exchange_Rates": [('unique', tuple(row_key_columns["Exchange_Rates"])), ('required', 'Date'),
+                       ('unparsed', 'Date'), ('positive', 'Exchange')],
+}
+
+
+def rule_name(kind, target):
+    if kind == 'required':
+        return f"missing {target}"
+    if kind == 'unparsed':
+        return f"unparsed {target}"
+    if kind == 'not_before':
+        return f"{target[1]} before {target[0]}"
+    if kind == 'positive':
+        return f"non-positive {target}"
+    if kind == 'references':
+        return f"unknown {target[0]}"
+    if kind == 'unique':
+        return f"duplicate {'/'.join(target)}"
+    raise ValueError(f"Unknown rule kind {kind!r}")
+
+
+# Whether each value occurs in sorted_keys. Dense keys (see star_schema) are looked up in a
+# table with one slot per key value; sparse ones by binary search of the sorted keys.
+def key_found(values, sorted_keys):
+    values = np.asarray(values, dtype=np.int64)
+    if not len(sorted_keys):
+        return np.zeros(len(values), dtype=bool)
+    low, span = int(sorted_keys[0]), int(sorted_keys[-1] - sorted_keys[0]) + 1
+    if span <= max(max_lookup_density * len(sorted_keys), max_lookup_slots):
+        # The extra last slot (False) catches every value outside [low, high]
+        present = np.zeros(span + 1, dtype=bool)
+        present[sorted_keys - low] = True
+        offsets = values - low
+        offsets[(offsets < 0) | (offsets >= span)] = span
+        return present.take(offsets)
+    positions = np.searchsorted(sorted_keys, values).clip(max=len(sorted_keys) - 1)
+    return sorted_keys[positions] == values
+
+
+# Row labels of the dates clean_table could not parse, with their original text
+def unparsed_dates(df, column):
+    return dict(df.attrs.get('Unparsed Dates', {}).get(column, ()))
+
+
+class DataValidator:
+    # references maps table names to the frames their keys are checked against (main passes
+    # data_frames, so a child table is checked against the rows of its parents that were kept)
+    def __init__(self, references=None, output_dir=quarantine_dir):
+        self.references = references if references is not None else {}
+        self.output_dir = output_dir
+        self.sorted_keys = {}  # (table, column) -> (frame id, sorted unique keys)
+        self.counts = {}  # table -> violations per rule
+        self.checked = {}  # table -> rows checked
+        self.rejected = {}  # table -> rows quarantined
+        self.skipped = {}  # table -> rules that could not be checked (referenced table not loaded)
+
+    def reference_keys(self, table, column):
+        frame = self.references[table]
+        cached = self.sorted_keys.get((table, column))
+        if cached is None or cached[0] != id(frame):
+            cached = (id(frame), np.unique(frame[column].to_numpy(dtype=np.int64)))
+            self.sorted_keys[(table, column)] = cached
+        return cached[1]
+
+    # Bit i of a row's mask is set when the row breaks rule i of table_rules[table_name]
+    def violation_masks(self, table_name, df):
+        masks = np.zeros(len(df), dtype=np.uint32)
+        for bit, (kind, target) in enumerate(table_rules.get(table_name, ())):
+            if kind == 'required':
+                broken = df[target].isna().to_numpy()
+            elif kind == 'unparsed':
+                broken = df.index.isin(list(unparsed_dates(df, target)))
+            elif kind == 'not_before':
+                broken = (df[target[1]] < df[target[0]]).to_numpy()
+            elif kind == 'positive':
+                broken = (df[target] <= 0).to_numpy()
+            elif kind == 'references':
+                column, table = target
+                if table not in self.references:
+                    self.skipped.setdefault(table_name, set()).add(rule_name(kind, target))
+                    continue
+                broken = ~key_found(df[column].to_numpy(), self.reference_keys(table, column))
+            else:
+                broken = df.duplicated(list(target), keep='last').to_numpy()
+            masks[broken] |= np.uint32(1 << bit)
+        return masks
+
+    # Check a table (or one chunk of it, in order): count every rule's violations, append the
+    # offending rows to the table's quarantine file and return the rows that passed
+    def validate(self, table_name, df):
+        rules = table_rules.get(table_name)
+        if not rules:
+            return df
+        masks = self.violation_masks(table_name, df)
+        first_chunk = table_name not in self.checked
+        names = [rule_name(kind, target) for kind, target in rules]
+        bits = np.uint32(1) << np.arange(len(rules), dtype=np.uint32)
+        counts = pd.Series(((masks[:, None] & bits) != 0).sum(axis=0), index=names)
+        self.counts[table_name] = counts if first_chunk else self.counts[table_name] + counts
+        self.checked[table_name] = self.checked.get(table_name, 0) + len(df)
+
+        rejected = masks != 0
+        self.rejected[table_name] = self.rejected.get(table_name, 0) + int(rejected.sum())
+        self.quarantine(table_name, df[rejected], masks[rejected], names, first_chunk)
+        accepted = df[~rejected]
+        accepted.attrs.pop('Unparsed Dates', None)
+        return accepted
+
+    def quarantine_path(self, table_name):
+        return os.path.join(self.output_dir, f"{table_name}.csv")
+
+    # Rejected rows with the rules they broke; dates that did not parse keep their original text.
+    # The file is replaced on the first chunk of each run, so it only lists this run's rows.
+    def quarantine(self, table_name, rows, masks, names, first_chunk):
+        path = self.quarantine_path(table_name)
+        if first_chunk and os.path.exists(path):
+            os.remove(path)
+        if not len(rows):
+            return
+        rows = rows.copy()
+        for column, raw in rows.attrs.get('Unparsed Dates', {}).items():
+            text = rows.index.map(dict(raw))
+            rows[column] = rows[column].astype(object).where(text.isna(), text)
+        rows.attrs = {}
+        # Few distinct masks occur, so each one's description is built once
+        distinct, inverse = np.unique(masks, return_inverse=True)
+        labels = np.array(['; '.join(name for bit, name in enumerate(names) if mask >> bit & 1) for mask in distinct],
+                          dtype=object)
+        rows.insert(0, 'Violations', labels[inverse])
+        os.makedirs(self.output_dir, exist_ok=True)
+        rows.to_csv(path, mode='a', header=not os.path.exists(path), index=False)
+
+    # Print rows checked, rejected and broken per rule for every validated table
+    def report(self, tables=None):
+        for table_name in tables or list(self.counts):
+            if table_name not in self.counts:
+                continue
+            rejected = self.rejected[table_name]
+            where = f", quarantined in {self.quarantine_path(table_name)}" if rejected else ""
+            print(f"Validated {table_name}: {self.checked[table_name]} rows, {rejected} rejected{where}.")
+            counts = self.counts[table_name]
+            for rule, count in counts[counts > 0].items():
+                print(f"  {rule}: {count} rows")
+            for rule in sorted(self.skipped.get(table_name, ())):
+                print(f"  {rule}: not checked, the referenced table was not loaded")
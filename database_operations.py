@@ -1,217 +1,464 @@
+# MySQL connection settings
+mysql_config = {
+    'host': 'localhost',
+    'database': 'data_spark',
+    'user': 'root',
+    'password': 'aashi'
+}
+
+# Default storage backend; --backend sqlite/duckdb swaps in an embedded engine
+mysql_backend = MySQLBackend(mysql_config)
+
+
 # Connect to MySQL
-def connect_to_mysql():
-    try:
-        conn = mysql.connector.connect(
-            host='localhost',
-            database='data_spark',
-            user='root',
-            password='aashi'
-        )
-        if conn.is_connected():
-            print("Connected to MySQL database")
-            return conn, conn.cursor()
-    except Error as e:
-        print(f"Error connecting to MySQL: {e}")
-        return None, None
+def connect_to_mysql(allow_local_infile=False):
+    return mysql_backend.connect(allow_local_infile=allow_local_infile)
 
 
 # Close MySQL connection    
 def close_mysql_connection(conn, cursor):
-    if cursor:
-        cursor.close()
-    if conn:
-        conn.close()
-    print("MySQL connection is closed")
-
-
-
-# Create MySQL table
-def create_table(table_name, cursor):
-    table_definitions = {
-        "Sales": """
-            CREATE TABLE IF NOT EXISTS Sales (
-                `Order Number` INT,
-                `Line Item` INT,
-                `Order Date` DATE,
-                `Delivery Date` DATE,
-                CustomerKey INT,
-                StoreKey INT,
-                ProductKey INT,
-                Quantity INT,
-                `Currency Code` VARCHAR(3),
-                PRIMARY KEY (`Order Number`, `Line Item`),  -- Composite primary key
-                FOREIGN KEY (CustomerKey) REFERENCES Customers(CustomerKey),
-                FOREIGN KEY (ProductKey) REFERENCES Products(ProductKey)
-            );
-        """,
-        "Customers": """
-            CREATE TABLE IF NOT EXISTS Customers (
-                CustomerKey INT PRIMARY KEY,
-                Gender VARCHAR(10),
-                `Name` VARCHAR(255),
-                City VARCHAR(255),
-                State VARCHAR(255),
-                `State Code` VARCHAR(5),
-                `Zip Code` VARCHAR(10),
-                Country VARCHAR(255),
-                Continent VARCHAR(255),
-                Birthday DATE
-            );
-        """,
-        "Products": """
-            CREATE TABLE IF NOT EXISTS Products (
-                ProductKey INT PRIMARY KEY,
-                `Product Name` VARCHAR(255),
-                Brand VARCHAR(255),
-                Color VARCHAR(50),
-                `Unit Cost USD` DECIMAL(10,2),
-                `Unit Price USD` DECIMAL(10,2),
-                SubcategoryKey INT,
-                Subcategory VARCHAR(255),
-                CategoryKey INT,
-                Category VARCHAR(255)
-            );
-        """,
-        "Exchange_Rates": """
-            CREATE TABLE IF NOT EXISTS Exchange_Rates (
-                `Date` DATE PRIMARY KEY,
-                `Currency` VARCHAR(3),
-                `Exchange` DECIMAL(10,4)
-            );
-        """,
-        "Data_Dictionary": """
-            CREATE TABLE IF NOT EXISTS Data_Dictionary (
-                `Table` VARCHAR(255),
-                `Field` VARCHAR(255),
-                `Description` TEXT
-            );
-        """,
-        "Stores": """
-            CREATE TABLE IF NOT EXISTS Stores(
-                StoreKey INT PRIMARY KEY,
-                Country VARCHAR(100),
-                State VARCHAR(255), 
-               `Square Meters` INT, 
-               `Open Date` DATE 
-            );
-        """
-          
-    }
+    mysql_backend.close(conn, cursor)
+
+
 
+# MySQL table definitions
+table_definitions = {
+    "Sales": """
+        CREATE TABLE IF NOT EXISTS Sales (
+            `Order Number` INT,
+            `Line Item` INT,
+            `Order Date` DATE,
+            `Delivery Date` DATE,
+            CustomerKey INT,
+            StoreKey INT,
+            ProductKey INT,
+            Quantity INT,
+            `Currency Code` VARCHAR(3),
+            PRIMARY KEY (`Order Number`, `Line Item`),  -- Composite primary key
+            FOREIGN KEY (CustomerKey) REFERENCES Customers(CustomerKey),
+            FOREIGN KEY (ProductKey) REFERENCES Products(ProductKey)
+        );
+    """,
+    "Customers": """
+        CREATE TABLE IF NOT EXISTS Customers (
+            CustomerKey INT PRIMARY KEY,
+            Gender VARCHAR(10),
+            `Name` VARCHAR(255),
+            City VARCHAR(255),
+            State VARCHAR(255),
+            `State Code` VARCHAR(5),
+            `Zip Code` VARCHAR(10),
+            Country VARCHAR(255),
+            Continent VARCHAR(255),
+            Birthday DATE
+        );
+    """,
+    "Products": """
+        CREATE TABLE IF NOT EXISTS Products (
+            ProductKey INT PRIMARY KEY,
+            `Product Name` VARCHAR(255),
+            Brand VARCHAR(255),
+            Color VARCHAR(50),
+            `Unit Cost USD` DECIMAL(10,2),
+            `Unit Price USD` DECIMAL(10,2),
+            SubcategoryKey INT,
+            Subcategory VARCHAR(255),
+            CategoryKey INT,
+            Category VARCHAR(255)
+        );
+    """,
+    "Exchange_Rates": """
+        CREATE TABLE IF NOT EXISTS Exchange_Rates (
+            `Date` DATE,
+            `Currency` VARCHAR(3),
+            `Exchange` DECIMAL(10,4),
+            PRIMARY KEY (`Date`, `Currency`)  -- One rate per currency per day
+        );
+    """,
+    "Data_Dictionary": """
+        CREATE TABLE IF NOT EXISTS Data_Dictionary (
+            `Table` VARCHAR(255),
+            `Field` VARCHAR(255),
+            `Description` TEXT
+        );
+    """,
+    "Stores": """
+        CREATE TABLE IF NOT EXISTS Stores(
+            StoreKey INT PRIMARY KEY,
+            Country VARCHAR(100),
+            State VARCHAR(255), 
+           `Square Meters` INT, 
+           `Open Date` DATE 
+        );
+    """
+
+}
+
+
+# Create MySQL table (translated to the backend's dialect). partition_years=(first, last)
+# creates Sales RANGE-partitioned by order year on backends that support it.
+def create_table(table_name, cursor, backend=mysql_backend, partition_years=None):
     if table_name in table_definitions:
+        ddl = table_definitions[table_name]
+        if table_name == "Sales" and partition_years:
+            if backend.supports_partitioning:
+                ddl = partition_by_order_year(ddl, *partition_years)
+            else:
+                print(f"The {backend.name} backend has no table partitioning; creating Sales unpartitioned.")
         try:
-            cursor.execute(table_definitions[table_name])
+            cursor.execute(backend.translate_ddl(ddl))
             print(f"Table {table_name} created or already exists.")
-        except mysql.connector.Error as err:
+        except backend.error as err:
             print(f"Error creating table {table_name}: {err}")
 
 
+# Column order used when inserting each table
+table_columns = {
+    "Sales": ['Order Number', 'Line Item', 'Order Date', 'Delivery Date', 'CustomerKey',
+              'StoreKey', 'ProductKey', 'Quantity', 'Currency Code'],
+    "Customers": ['CustomerKey', 'Gender', 'Name', 'City', 'State', 'State Code',
+                  'Zip Code', 'Country', 'Continent', 'Birthday'],
+    "Products": ['ProductKey', 'Product Name', 'Brand', 'Color', 'Unit Cost USD', 'Unit Price USD',
+                 'SubcategoryKey', 'Subcategory', 'CategoryKey', 'Category'],
+    "Exchange_Rates": ['Date', 'Currency', 'Exchange'],
+    "Data_Dictionary": ['Table', 'Field', 'Description'],
+    "Stores": ['StoreKey', 'Country', 'State', 'Square Meters', 'Open Date']
+}
+
+# Primary key of each table, the conflict target for ON CONFLICT upserts
+key_columns = {
+    "Sales": ['Order Number', 'Line Item'],
+    "Customers": ['CustomerKey'],
+    "Products": ['ProductKey'],
+    "Exchange_Rates": ['Date', 'Currency'],
+    "Data_Dictionary": [],
+    "Stores": ['StoreKey']
+}
+
+# Columns refreshed by ON DUPLICATE KEY UPDATE for each table
+update_columns = {
+    "Sales": ['Order Date', 'Delivery Date', 'CustomerKey', 'StoreKey', 'ProductKey',
+              'Quantity', 'Currency Code'],
+    "Customers": ['Gender', 'Name', 'City', 'State', 'State Code', 'Zip Code', 'Country',
+                  'Continent', 'Birthday'],
+    "Products": ['Product Name', 'Brand', 'Color', 'Unit Cost USD', 'Unit Price USD',
+                 'SubcategoryKey', 'Subcategory', 'CategoryKey', 'Category'],
+    "Exchange_Rates": ['Exchange'],
+    "Data_Dictionary": ['Description'],
+    "Stores": ['Country', 'State', 'Square Meters', 'Open Date']
+}
+
+insert_modes = ['row', 'executemany', 'batch', 'infile']
+
+
+# Build an upsert statement with row_count groups of placeholders
+def build_upsert_statement(table_name, row_count=1, backend=mysql_backend):
+    return backend.upsert_statement(table_name, table_columns[table_name], key_columns[table_name],
+                                    update_columns[table_name], row_count)
+
+
+# Convert a slice of a DataFrame into row tuples, replacing NaN with None (for SQL compatibility)
+def dataframe_rows(table_name, df):
+    frame = df[table_columns[table_name]]
+    values = frame.astype(object)
+    # Bind datetime64 columns as plain dates to match the DATE columns
+    for col in frame.select_dtypes(include=['datetime']).columns:
+        values[col] = frame[col].dt.date.astype(object)  # an all-NaT batch would stay datetime64
+    values = values.where(pd.notnull(values), None)
+    return list(values.itertuples(index=False, name=None))
+
+
+# Bulk load through a temporary staging table filled with LOAD DATA LOCAL INFILE
+def load_data_infile(table_name, df, cursor):
+    columns = table_columns[table_name]
+    column_list = ', '.join(f'`{col}`' for col in columns)
+    updates = ', '.join(f'`{col}` = VALUES(`{col}`)' for col in update_columns[table_name])
+    staging_table = f"{table_name}_Staging"
+
+    # Backslash is MySQL's escape character, so double it in text columns; \\N marks NULL
+    staged = df[columns].copy()
+    for col in staged.select_dtypes(include=['object', 'string', 'category']).columns:
+        staged[col] = staged[col].str.replace('\\', '\\\\', regex=False)
+
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, newline='', encoding='utf-8') as f:
+        staged.to_csv(f, index=False, header=False, na_rep='\\N', date_format='%Y-%m-%d',
+                      lineterminator='\n')
+        csv_path = f.name
+
+    try:
+        cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {staging_table}")
+        cursor.execute(f"CREATE TEMPORARY TABLE {staging_table} LIKE {table_name}")
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE '{csv_path.replace(os.sep, '/')}'
+            INTO TABLE {staging_table}
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+            LINES TERMINATED BY '\\n'
+            ({column_list})
+        """)
+        cursor.execute(f"""
+            INSERT INTO {table_name} ({column_list})
+            SELECT {column_list} FROM {staging_table}
+            ON DUPLICATE KEY UPDATE {updates}
+        """)
+        cursor.execute(f"DROP TEMPORARY TABLE {staging_table}")
+    finally:
+        os.remove(csv_path)
+
+
+# Print how much of a table an incremental load actually sends, and return that delta
+def report_delta(table_name, df, delta_df):
+    print(f"Incremental load for {table_name}: {len(delta_df)} new or changed rows of {len(df)}.")
+    return delta_df
+
+
 # Insert data into MySQL table with handling for NaN and duplicates
-def insert_data(table_name, df, cursor, conn):
+# mode: 'row' sends one upsert per row, 'executemany' and 'batch' send batch_size rows per
+# round trip, 'infile' streams the table through LOAD DATA LOCAL INFILE (or, on DuckDB, scans
+# the DataFrame directly).
+# incremental=True only sends rows that are new or changed since the last incremental load.
+@profiled
+def insert_data(table_name, df, cursor, conn, mode='batch', batch_size=1000, incremental=False,
+                backend=mysql_backend):
+    if mode not in backend.insert_modes:
+        raise ValueError(f"Unknown insert mode {mode!r} for {backend.name}, expected one of {backend.insert_modes}")
+    if table_name not in table_columns:
+        print(f"No insert logic defined for {table_name}.")
+        return None
+
+    start = time.perf_counter()
     try:
-        for index, row in df.iterrows():
-            # Replace NaN values with None (for SQL compatibility)
-            row = row.where(pd.notnull(row), None)
-
-            if table_name == "Sales":
-                insert_stmt = """
-                    INSERT INTO Sales (`Order Number`, `Line Item`, `Order Date`, `Delivery Date`, CustomerKey, StoreKey, ProductKey, Quantity, `Currency Code`)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                    `Order Date` = VALUES(`Order Date`),
-                    `Delivery Date` = VALUES(`Delivery Date`),
-                    CustomerKey = VALUES(CustomerKey),
-                    StoreKey = VALUES(StoreKey),
-                    ProductKey = VALUES(ProductKey),
-                    Quantity = VALUES(Quantity),
-                    `Currency Code` = VALUES(`Currency Code`);
-                """
-                cursor.execute(insert_stmt, (
-                    row['Order Number'], row['Line Item'], row['Order Date'],
-                    row['Delivery Date'], row['CustomerKey'], row['StoreKey'],
-                    row['ProductKey'], row['Quantity'], row['Currency Code']
-                ))
-
-            elif table_name == "Customers":
-                insert_stmt = """
-                    INSERT INTO Customers (CustomerKey, Gender, Name, City, State, `State Code`, `Zip Code`, Country, Continent, Birthday)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                    Gender = VALUES(Gender),
-                    Name = VALUES(Name),
-                    City = VALUES(City),
-                    State = VALUES(State), 
-                    `State Code` = VALUES(`State Code`),
-                    `Zip Code` = VALUES(`Zip Code`),
-                    Country = VALUES(Country),
-                    Continent = VALUES(Continent),
-                    Birthday = VALUES(Birthday);
-                """
-                cursor.execute(insert_stmt, (
-                    row['CustomerKey'], row['Gender'], row['Name'], row['City'], row['State'],
-                    row['State Code'], row['Zip Code'], row['Country'], row['Continent'], row['Birthday']
-                ))
-
-            elif table_name == "Products":
-                insert_stmt = """
-                    INSERT INTO Products (ProductKey, `Product Name`, Brand, Color, `Unit Cost USD`, `Unit Price USD`, SubcategoryKey, Subcategory, CategoryKey, Category)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                    `Product Name` = VALUES(`Product Name`),
-                    Brand = VALUES(Brand),
-                    Color = VALUES(Color),
-                    `Unit Cost USD` = VALUES(`Unit Cost USD`),
-                    `Unit Price USD` = VALUES(`Unit Price USD`),
-                    SubcategoryKey = VALUES(SubcategoryKey),
-                    Subcategory = VALUES(Subcategory),
-                    CategoryKey = VALUES(CategoryKey),
-                    Category = VALUES(Category);
-                """
-                cursor.execute(insert_stmt, (
-                    row['ProductKey'], row['Product Name'], row['Brand'], row['Color'],
-                    row['Unit Cost USD'], row['Unit Price USD'], row['SubcategoryKey'],
-                    row['Subcategory'], row['CategoryKey'], row['Category']
-                ))
-
-            elif table_name == 'Exchange_Rates':
-                insert_stmt = '''
-                   INSERT INTO Exchange_Rates (Date, Currency, Exchange)
-                   VALUES (%s,%s,%s)
-                   ON DUPLICATE KEY UPDATE
-                   Exchange = VALUES(Exchange);
-                '''
-                cursor.execute(insert_stmt, (
-                    row['Date'], row['Currency'], row['Exchange']
-                ))
-
-            elif table_name == 'Data_Dictionary':
-                insert_stmt = '''
-                   INSERT INTO Data_Dictionary(`Table`, `Field`, `Description`)
-                   VALUES (%s, %s, %s)
-                   ON DUPLICATE KEY UPDATE
-                   `Description` = VALUES(`Description`);
-                '''
-                cursor.execute(insert_stmt, (
-                    row['Table'], row['Field'], row['Description']
-                ))
-
-            elif table_name == "Stores":  # Insert logic for Stores
-                insert_stmt = """
-                    INSERT INTO Stores (StoreKey, Country, State, `Square Meters`, `Open Date`)
-                    VALUES (%s, %s, %s, %s, %s)
-                    ON DUPLICATE KEY UPDATE
-                    Country = VALUES(Country),
-                    State = VALUES(State),
-                    `Square Meters` = VALUES(`Square Meters`),
-                    `Open Date` = VALUES(`Open Date`);
-                """
-                cursor.execute(insert_stmt, (
-                    row['StoreKey'], row['Country'], row['State'], row['Square Meters'], row['Open Date']
-                ))    
+        delta = None
+        if incremental:
+            delta = TableDelta(table_name, cursor, backend)
+            df = report_delta(table_name, df, delta.filter(df))
+
+        if mode == 'infile':
+            if len(df) and backend.name == 'mysql':
+                load_data_infile(table_name, df, cursor)
+            elif len(df):
+                backend.bulk_upsert(cursor, table_name, df[table_columns[table_name]], key_columns[table_name],
+                                    update_columns[table_name])
+        else:
+            single_row_stmt = build_upsert_statement(table_name, backend=backend)
+            # Keep multi-row statements under the backend's bound-parameter limit
+            batch_size = min(batch_size, backend.max_parameters // len(table_columns[table_name]))
+            for begin in range(0, len(df), batch_size):
+                rows = dataframe_rows(table_name, df.iloc[begin:begin + batch_size])
+                if mode == 'row':
+                    for row in rows:
+                        cursor.execute(single_row_stmt, row)
+                elif mode == 'executemany':
+                    cursor.executemany(single_row_stmt, rows)
+                else:
+                    cursor.execute(build_upsert_statement(table_name, len(rows), backend),
+                                   [value for row in rows for value in row])
+        if delta is not None:
+            delta.save(cursor)
+        # New data version, so cached query results over this table are recomputed
+        if len(df):
+            bump_table_version(cursor, backend, table_name)
 
         # Commit the transaction
         conn.commit()
-        print(f"Inserted data successfully into {table_name}.")
+        elapsed = time.perf_counter() - start
+        rows_per_sec = len(df) / elapsed if elapsed > 0 else float('inf')
+        print(f"Inserted data successfully into {table_name}: {len(df)} rows in {elapsed:.2f}s "
+              f"({rows_per_sec:,.0f} rows/sec, mode={mode}).")
+        return rows_per_sec
+
+    except backend.error as err:
+        print(f"Error inserting data into {table_name}: {err}")
+    return None
+
+
+# Clean and insert a table chunk by chunk so memory use depends on the chunk size, not the
+# file size. Chunks are only kept (and returned as one DataFrame) when keep is True; every
+# cleaned chunk is checked by validator (rejected rows are quarantined, not inserted) and the
+# rest is passed to each of observers (such as StatsAccumulator.update). With insert=False the
+# chunks are only cleaned, checked and observed (cursor and conn may be None).
+@profiled
+def stream_table(table_name, chunks, cursor, conn, mode='batch', batch_size=1000, keep=False,
+                 incremental=False, backend=mysql_backend, observers=(), validator=None, insert=True):
+    kept = []
+    total_rows = 0
+    start = time.perf_counter()
+    # The delta state is read once, so chunks are all compared against the previous load
+    delta = TableDelta(table_name, cursor, backend) if incremental and insert else None
+    for chunk in chunks:
+        chunk = apply_schema(table_name, clean_table(table_name, chunk), report=False)
+        if validator is not None:
+            chunk = validator.validate(table_name, chunk)
+        if keep:
+            kept.append(chunk)
+        for observer in observers:
+            observer(chunk)
+        if delta is not None:
+            chunk = report_delta(table_name, chunk, delta.filter(chunk))
+        if insert:
+            insert_data(table_name, chunk, cursor, conn, mode=mode, batch_size=batch_size, backend=backend)
+        total_rows += len(chunk)
+    if delta is not None:
+        delta.save(cursor)
+        conn.commit()
+    elapsed = time.perf_counter() - start
+    set_rows(total_rows)
+    rows_per_sec = total_rows / elapsed if elapsed > 0 else float('inf')
+    print(f"{'Streamed' if insert else 'Read'} {total_rows} rows {'into' if insert else 'of'} {table_name} "
+          f"in {elapsed:.2f}s ({rows_per_sec:,.0f} rows/sec).")
+    # Chunks with different category sets concatenate to object columns, so re-apply the schema
+    df = apply_schema(table_name, pd.concat(kept, ignore_index=True)) if kept else None
+    return df, rows_per_sec
+
+
+# Columns used to split a table across several writer connections
+writer_partition_keys = {"Sales": 'Order Number'}
+
+
+# Insert one frame on a connection borrowed from the pool; returns when it started and finished
+# and whether the insert succeeded
+def insert_with_pooled_connection(pool, table_name, df, mode, batch_size, backend):
+    start = time.perf_counter()
+    conn = pool.get_connection()
+    cursor = conn.cursor()
+    try:
+        succeeded = insert_data(table_name, df, cursor, conn, mode=mode, batch_size=batch_size,
+                                backend=backend) is not None
+    finally:
+        cursor.close()
+        conn.close()  # returns the connection to the pool
+    return start, time.perf_counter(), succeeded
 
-    except mysql.connector.Error as err:
-        print(f"Error inserting data into {table_name}: {err}")
\ No newline at end of file
+
+# Connections shared by the table loads of one run: a pool with a control connection (DDL,
+# delta state, index builds) for each of up to `tables_at_once` tables loading together, plus
+# `pool_size` for the writers, and the threads those writers run on. Tables in
+# writer_partition_keys are split into key ranges written by `writers` connections (embedded
+# engines have a single writer, so everything collapses to one). The pool is opened on first
+# use; close() releases the writer threads.
+class DatabaseLoader:
+    def __init__(self, backend=mysql_backend, pool_size=4, writers=4, mode='batch', batch_size=1000,
+                 incremental=False, build_indexes=True, rebuild_indexes=False, partition_years=None,
+                 tables_at_once=1):
+        self.backend = backend
+        self.tables_at_once = max(1, min(tables_at_once, backend.max_writers))
+        # The control connections count towards the backend's connection limit
+        self.pool_size = max(1, min(pool_size, backend.max_writers - self.tables_at_once))
+        self.writers = min(writers, backend.max_writers)
+        self.mode = mode
+        self.batch_size = batch_size
+        self.incremental = incremental
+        self.build_indexes = build_indexes
+        self.rebuild_indexes = rebuild_indexes
+        self.partition_years = partition_years
+        self.pool = None
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def connection(self):
+        with self.lock:
+            if self.pool is None:
+                self.pool = self.backend.create_pool(self.pool_size + self.tables_at_once,
+                                                     allow_local_infile=self.mode == 'infile')
+                self.executor = ThreadPoolExecutor(max_workers=self.pool_size)
+                print(f"Connected to {self.backend.name} database with a pool of {self.pool_size} connections")
+        return self.pool.get_connection()
+
+    # Create every table, parents first so each FOREIGN KEY target exists, the views over them
+    # and the metadata tables insert_data keeps versions and watermarks in. Returns False when
+    # the database cannot be reached.
+    def create_schema(self):
+        try:
+            conn = self.connection()
+        except self.backend.error as e:
+            print(f"Error connecting to {self.backend.name}: {e}")
+            return False
+        cursor = conn.cursor()
+        try:
+            for level in load_levels(foreign_key_graph(table_definitions)):
+                for table_name in level:
+                    create_table(table_name, cursor, self.backend, self.partition_years)
+            create_local_revenue_view(cursor, self.backend)
+            create_customer_views(cursor, self.backend)
+            create_metadata_tables(cursor, self.backend)
+            conn.commit()
+        finally:
+            cursor.close()
+            conn.close()
+        return True
+
+    # Load one table whose parents are already loaded. With incremental=True only new or changed
+    # rows are sent. The table's secondary indexes are built after its rows are in
+    # (rebuild_indexes drops existing ones first, so a full reload does not maintain them row by
+    # row). Returns rows/sec, or None when the insert failed.
+    def load_table(self, table_name, df):
+        try:
+            conn = self.connection()
+        except self.backend.error as e:
+            print(f"Error connecting to {self.backend.name}: {e}")
+            return None
+        cursor = conn.cursor()
+        try:
+            if self.rebuild_indexes:
+                drop_secondary_indexes(cursor, self.backend, table_name)
+            # Read the delta state on the control connection before any writer starts
+            delta = None
+            if self.incremental:
+                delta = TableDelta(table_name, cursor, self.backend)
+                df = report_delta(table_name, df, delta.filter(df))
+            parts = [df]
+            if table_name in writer_partition_keys:
+                parts = partition_by_key_range(df, writer_partition_keys[table_name], self.writers)
+            futures = [self.executor.submit(insert_with_pooled_connection, self.pool, table_name, part, self.mode,
+                                            self.batch_size, self.backend) for part in parts]
+            spans = [future.result() for future in futures]
+            if not all(succeeded for _, _, succeeded in spans):
+                print(f"Loading {table_name} failed; see the errors above.")
+                return None
+            elapsed = max(end for _, end, _ in spans) - min(start for start, _, _ in spans)
+            rows_per_sec = len(df) / elapsed if elapsed > 0 else float('inf')
+            print(f"Loaded {len(df)} rows into {table_name} with {len(futures)} writer(s) "
+                  f"in {elapsed:.2f}s ({rows_per_sec:,.0f} rows/sec).")
+
+            # Only advance the watermark / row hashes once every writer has committed
+            if delta is not None:
+                delta.save(cursor)
+                conn.commit()
+            if self.build_indexes and table_name in secondary_indexes:
+                create_secondary_indexes(cursor, self.backend, table_name)
+                conn.commit()
+            return rows_per_sec
+        finally:
+            cursor.close()
+            conn.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+# Load every table into the backend in foreign-key order; tables of the same level load
+# concurrently (see DatabaseLoader for the options). Returns rows/sec per table, None for a
+# table whose insert failed.
+@profiled
+def load_into_database(data_frames, backend=mysql_backend, pool_size=4, writers=4, mode='batch', batch_size=1000,
+                       incremental=False, build_indexes=True, rebuild_indexes=False, partition_years=None):
+    levels = load_levels(foreign_key_graph(table_definitions))
+    loader = DatabaseLoader(backend, pool_size, writers, mode, batch_size, incremental, build_indexes,
+                            rebuild_indexes, partition_years, tables_at_once=max(len(level) for level in levels))
+    try:
+        if not loader.create_schema():
+            return {}
+        throughput = {}
+        with ThreadPoolExecutor(max_workers=loader.tables_at_once) as tables:
+            for level in levels:
+                loading = [table_name for table_name in level if table_name in data_frames]
+                if not loading:
+                    continue
+                print(f"Loading {', '.join(loading)} in parallel")
+                futures = {table_name: tables.submit(loader.load_table, table_name, data_frames[table_name])
+                           for table_name in loading}
+                throughput.update((table_name, future.result()) for table_name, future in futures.items())
+        return throughput
+    finally:
+        loader.close()
\ No newline at end of file
@@ -0,0 +1,41 @@
+# Helpers for loading tables in foreign-key order over a pool of connections
+import re
+
+import numpy as np
+
+foreign_key_pattern = re.compile(r'FOREIGN\s+KEY\s*\([^)]*\)\s*REFERENCES\s+`?(\w+)`?', re.IGNORECASE)
+
+
+# Map every table to the set of tables its FOREIGN KEY clauses reference
+def foreign_key_graph(table_definitions):
+    return {table: {parent for parent in foreign_key_pattern.findall(ddl) if parent != table}
+            for table, ddl in table_definitions.items()}
+
+
+# Group tables into levels: every table's parents sit in an earlier level, and the tables of one
+# level are independent of each other so they can be loaded concurrently
+def load_levels(graph, tables=None):
+    tables = list(graph) if tables is None else list(tables)
+    pending = {table: set(graph.get(table, ())) & set(tables) for table in tables}
+    levels = []
+    while pending:
+        ready = [table for table in tables if table in pending and not pending[table]]
+        if not ready:
+            raise ValueError(f"Foreign key cycle between tables: {sorted(pending)}")
+        levels.append(ready)
+        for table in ready:
+            del pending[table]
+        for parents in pending.values():
+            parents.difference_update(ready)
+    return levels
+
+
+# Split a frame into at most `parts` pieces over disjoint ranges of key, so concurrent writers
+# never touch the same primary-key range
+def partition_by_key_range(df, key, parts):
+    if parts <= 1 or len(df) == 0:
+        return [df]
+    values = df[key].to_numpy()
+    bounds = np.unique(np.quantile(values, np.linspace(0, 1, parts + 1)[1:-1]))
+    assignment = np.searchsorted(bounds, values, side='right')
+    return [df[assignment == part] for part in range(len(bounds) + 1) if (assignment == part).any()]
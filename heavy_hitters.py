@@ -0,0 +1,174 @@
+# Bounded-memory top-K ("heavy hitters") over streamed values: a Space-Saving summary of the
+# heaviest keys with a Count-Min sketch to tighten their counts. Both merge across chunks and
+# workers. The "Top 10" questions of Sql Queries.sql can be answered from them in memory.
+import numpy as np
+import pandas as pd
+
+from star_schema import StarSchema
+
+# Catalog entry (see query_catalog.load_catalog) -> key column and weight of the Sales view;
+# a None weight counts Sales lines
+top_queries = {
+    'top_most_popular_products_by_quantity_sold': ('Product Name', 'Quantity'),
+    'top_cities_by_total_sales': ('City', 'Revenue'),
+}
+
+
+# Count-Min sketch: depth rows of width counters. A key's estimate is its smallest counter, which
+# overestimates the true total by at most e / width * total weight with probability
+# 1 - e**-depth (weights must not be negative).
+class CountMinSketch:
+    def __init__(self, width=2048, depth=4, seed=0):
+        self.width = width
+        self.depth = depth
+        self.hash_key = f"{seed:016d}"[:16]
+        self.table = np.zeros((depth, width))
+
+    # Counter of every key in every row, from two halves of one 64-bit hash (h1 + i * h2)
+    def positions(self, keys):
+        hashes = pd.util.hash_array(np.asarray(keys, dtype=object), hash_key=self.hash_key)
+        low, high = hashes & np.uint64(0xFFFFFFFF), hashes >> np.uint64(32)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((low + rows * high) % np.uint64(self.width)).astype(np.intp)
+
+    def update(self, keys, weights):
+        positions = self.positions(keys)
+        for row in range(self.depth):
+            np.add.at(self.table[row], positions[row], weights)
+
+    def merge(self, other):
+        if (other.width, other.depth, other.hash_key) != (self.width, self.depth, self.hash_key):
+            raise ValueError("Count-Min sketches must have the same shape and seed to merge")
+        self.table += other.table
+
+    def estimate(self, keys):
+        positions = self.positions(keys)
+        return self.table[np.arange(self.depth)[:, None], positions].min(axis=0)
+
+
+# Space-Saving summary of at most capacity keys (every key when capacity is None, which makes
+# the counts exact). Each kept key has a count that never underestimates its total and an
+# error such that count - error never overestimates it; the error is at most
+# total / capacity. Chunks are pre-aggregated and folded in as exact summaries using the
+# mergeable form of Space-Saving (keys missing from a full summary count as its minimum).
+class HeavyHitters:
+    def __init__(self, capacity=1000, width=2048, depth=4, seed=0):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype=np.float64)
+        self.errors = pd.Series(dtype=np.float64)
+        self.total = 0.0
+        self.sketch = CountMinSketch(width, depth, seed) if capacity is not None else None
+
+    @property
+    def exact(self):
+        return self.capacity is None
+
+    # Smallest count a key outside the summary could have had
+    def floor(self):
+        return float(self.counts.min()) if self.capacity is not None and len(self.counts) >= self.capacity else 0.0
+
+    def update(self, keys, weights=None):
+        keys = pd.Series(keys)
+        # Aggregate the chunk per key on integer codes (-1 for missing keys)
+        if isinstance(keys.dtype, pd.CategoricalDtype):
+            codes, uniques = keys.cat.codes.to_numpy(), keys.cat.categories
+        else:
+            codes, uniques = pd.factorize(keys)
+        weights = (np.ones(len(keys)) if weights is None
+                   else pd.Series(weights).to_numpy(dtype=np.float64, na_value=np.nan))
+        present = (codes >= 0) & ~np.isnan(weights)
+        seen = np.flatnonzero(np.bincount(codes[present], minlength=len(uniques)))
+        if not len(seen):
+            return
+        sums = np.bincount(codes[present], weights[present], minlength=len(uniques))
+        chunk = pd.Series(sums[seen], index=uniques[seen])
+        self.total += float(chunk.sum())
+        if self.sketch is not None:
+            self.sketch.update(chunk.index.to_numpy(), chunk.to_numpy())
+        self.combine(chunk, pd.Series(0.0, index=chunk.index), 0.0)
+
+    def merge(self, other):
+        if other.capacity != self.capacity:
+            raise ValueError("Heavy-hitter summaries must have the same capacity to merge")
+        self.total += other.total
+        if self.sketch is not None:
+            self.sketch.merge(other.sketch)
+        self.combine(other.counts, other.errors, other.floor())
+        return self
+
+    def combine(self, counts, errors, other_floor):
+        floor = self.floor()
+        # Position of every incoming key in the summary; new keys are appended after it
+        positions = self.counts.index.get_indexer(counts.index)
+        new = positions < 0
+        positions[new] = len(self.counts) + np.arange(new.sum())
+        keys = self.counts.index.append(counts.index[new])
+        added_counts = np.full(len(keys), other_floor)
+        added_errors = np.full(len(keys), other_floor)
+        added_counts[positions] = counts.to_numpy()
+        added_errors[positions] = errors.to_numpy()
+        self.counts = pd.Series(np.concatenate([self.counts.to_numpy(), np.full(new.sum(), floor)]) + added_counts,
+                                index=keys)
+        self.errors = pd.Series(np.concatenate([self.errors.to_numpy(), np.full(new.sum(), floor)]) + added_errors,
+                                index=keys)
+        if self.capacity is not None and len(self.counts) > self.capacity:
+            kept = np.argsort(-self.counts.to_numpy(), kind='stable')[:self.capacity]
+            self.counts, self.errors = self.counts.iloc[kept], self.errors.iloc[kept]
+
+    # Largest possible overestimate of any reported count
+    def error_bound(self):
+        if self.capacity is None:
+            return 0.0
+        return min(self.total / self.capacity, np.e / self.sketch.width * self.total)
+
+    # The n heaviest keys with their counts, lower bounds and upper bounds, heaviest first. The
+    # count is the tighter of the Space-Saving and Count-Min upper bounds.
+    def bounds(self, n=10):
+        upper = self.counts
+        if self.sketch is not None and len(upper):
+            upper = np.minimum(upper, pd.Series(self.sketch.estimate(upper.index.to_numpy()), index=upper.index))
+        lower = (self.counts - self.errors).clip(lower=0)
+        table = pd.DataFrame({'count': upper, 'lower': lower, 'upper': upper})
+        return table.sort_values('count', ascending=False, kind='stable').head(n)
+
+    # The n heaviest keys and their counts, like value_counts().head(n)
+    def top(self, n=10):
+        return self.bounds(n)['count'].rename('count')
+
+
+# value_counts().head(n) (or a weighted version) from a bounded-memory summary, fed
+# chunk_rows values at a time; capacity=None gives the exact counts
+def top_values(values, n=10, weights=None, capacity=1000, chunk_rows=1 << 18):
+    hitters = HeavyHitters(capacity)
+    for start in range(0, len(values), chunk_rows):
+        hitters.update(values.iloc[start:start + chunk_rows],
+                       None if weights is None else weights.iloc[start:start + chunk_rows])
+    # Unweighted counts are whole numbers, as value_counts() gives them
+    return hitters.top(n) if weights is not None else hitters.top(n).round().astype('int64')
+
+
+# Heavy hitters for the catalogued top-N Sales queries, fed Sales chunks as they are loaded.
+# dimensions are the Products and Customers frames the chunks are joined to.
+class SalesTopK:
+    def __init__(self, dimensions, capacity=1000):
+        self.dimensions = dimensions
+        self.hitters = {name: HeavyHitters(capacity) for name in top_queries}
+
+    def update(self, sales):
+        view = StarSchema(sales, self.dimensions).view(['Product Name', 'City', 'Quantity', 'Unit Price USD'])
+        columns = {'Quantity': view['Quantity'], 'Revenue': view['Quantity'] * view['Unit Price USD']}
+        for name, (key, weight) in top_queries.items():
+            self.hitters[name].update(view[key], None if weight is None else columns[weight])
+
+    def merge(self, other):
+        for name, hitters in other.hitters.items():
+            self.hitters[name].merge(hitters)
+        return self
+
+    def can_answer(self, name):
+        return name in self.hitters
+
+    # Result rows of a catalog query: (key, total) for the top_n heaviest keys
+    def answer(self, name, params):
+        top = self.hitters[name].top(int(params.get('top_n', 10)))
+        return [(key, int(value) if float(value).is_integer() else value) for key, value in top.items()]
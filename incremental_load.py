@@ -0,0 +1,191 @@
+# Incremental (delta) loads: a per-table watermark for Sales and per-row content hashes for the
+# dimension tables, kept in metadata tables next to the data. Table_Versions records when each
+# table last changed, so cached query results can tell whether they are still current.
+import datetime
+import time
+
+import numpy as np
+import pandas as pd
+
+from pipeline_dag import FingerprintStore
+
+metadata_table_definitions = {
+    "Load_Watermarks": """
+        CREATE TABLE IF NOT EXISTS Load_Watermarks (
+            `Table` VARCHAR(64) PRIMARY KEY,
+            `Max Order Number` BIGINT,
+            `Max Order Date` DATE,
+            `Updated At` DATETIME
+        );
+    """,
+    "Load_Row_Hashes": """
+        CREATE TABLE IF NOT EXISTS Load_Row_Hashes (
+            `Table` VARCHAR(64),
+            `Row Key` VARCHAR(255),
+            `Row Hash` BIGINT,
+            PRIMARY KEY (`Table`, `Row Key`)
+        );
+    """,
+    "Table_Versions": """
+        CREATE TABLE IF NOT EXISTS Table_Versions (
+            `Table` VARCHAR(64) PRIMARY KEY,
+            `Version` BIGINT
+        );
+    """,
+    "Stage_Fingerprints": """
+        CREATE TABLE IF NOT EXISTS Stage_Fingerprints (
+            `Stage` VARCHAR(64) PRIMARY KEY,
+            `Fingerprint` VARCHAR(64),
+            `Updated At` DATETIME
+        );
+    """
+}
+
+# Fact tables tracked by a high-water mark on these (number, date) columns
+watermark_columns = {"Sales": ('Order Number', 'Order Date')}
+
+# Dimension tables tracked by a content hash per row, keyed by these columns
+row_key_columns = {
+    "Customers": ['CustomerKey'],
+    "Products": ['ProductKey'],
+    "Stores": ['StoreKey'],
+    "Exchange_Rates": ['Date', 'Currency'],
+    "Data_Dictionary": ['Table', 'Field']
+}
+
+
+def create_metadata_tables(cursor, backend):
+    for ddl in metadata_table_definitions.values():
+        cursor.execute(backend.translate_ddl(ddl))
+
+
+# Give a table a new data version; call it in the transaction that changes the table
+def bump_table_version(cursor, backend, table_name):
+    cursor.execute(backend.upsert_statement('Table_Versions', ['Table', 'Version'], ['Table'], ['Version']),
+                   (table_name, time.time_ns()))
+
+
+# Current data version of every table, keyed by lower-cased table name
+def table_versions(cursor, backend):
+    cursor.execute(backend.translate_query("SELECT `Table`, `Version` FROM Table_Versions"))
+    return {table.lower(): version for table, version in cursor.fetchall()}
+
+
+# Stable 64-bit hash of every row of the given columns. Values are hashed through their text
+# form so that a dtype change (say int16 -> int32) does not make every row look changed.
+# The hashes are viewed as signed so they fit a BIGINT column on every backend.
+def row_hashes(df, columns):
+    return pd.util.hash_pandas_object(df[columns].astype(str), index=False).to_numpy().view(np.int64)
+
+
+def row_keys(df, columns):
+    keys = df[columns[0]].astype(str)
+    for col in columns[1:]:
+        keys = keys + '|' + df[col].astype(str)
+    return keys.to_numpy()
+
+
+# Tracks what is already in the database for one table. filter() reduces each frame (or chunk)
+# to new or changed rows against the state read at construction time, and save() records what
+# was sent, so the caller decides when the delta is final (after all chunks and writers).
+class TableDelta:
+    def __init__(self, table_name, cursor, backend):
+        self.table_name = table_name
+        self.backend = backend
+        self.max_number = None
+        self.max_date = None
+        self.known_hashes = {}
+        self.new_hashes = {}
+        self.new_max_number = None
+        self.new_max_date = None
+
+        if table_name in watermark_columns:
+            cursor.execute(backend.translate_query(
+                f"SELECT `Max Order Number`, `Max Order Date` FROM Load_Watermarks WHERE `Table` = {backend.placeholder}"),
+                (table_name,))
+            row = cursor.fetchone()
+            if row:
+                self.max_number = row[0]
+                self.max_date = pd.Timestamp(row[1]) if row[1] is not None else None
+        elif table_name in row_key_columns:
+            cursor.execute(backend.translate_query(
+                f"SELECT `Row Key`, `Row Hash` FROM Load_Row_Hashes WHERE `Table` = {backend.placeholder}"),
+                (table_name,))
+            self.known_hashes = {key: int(value) for key, value in cursor.fetchall()}
+
+    def filter(self, df):
+        if self.table_name in watermark_columns:
+            number_col, date_col = watermark_columns[self.table_name]
+            mask = pd.Series(True, index=df.index)
+            if self.max_number is not None:
+                mask = df[number_col] > self.max_number
+                if self.max_date is not None:
+                    mask |= df[date_col] > self.max_date
+            delta = df[mask.to_numpy()]
+            if len(delta):
+                self.new_max_number = max(int(delta[number_col].max()), self.new_max_number or self.max_number or 0)
+                latest = delta[date_col].max()
+                if pd.notna(latest):
+                    candidates = [d for d in (latest, self.new_max_date, self.max_date) if d is not None]
+                    self.new_max_date = max(candidates)
+            return delta
+
+        if self.table_name in row_key_columns:
+            keys = row_keys(df, row_key_columns[self.table_name])
+            hashes = row_hashes(df, list(df.columns))
+            changed = [self.known_hashes.get(key) != int(value) for key, value in zip(keys, hashes)]
+            delta = df[changed]
+            for key, value, is_changed in zip(keys, hashes, changed):
+                if is_changed:
+                    self.new_hashes[key] = int(value)
+            return delta
+
+        return df
+
+    def save(self, cursor):
+        if self.new_max_number is not None:
+            statement = self.backend.upsert_statement(
+                'Load_Watermarks', ['Table', 'Max Order Number', 'Max Order Date', 'Updated At'], ['Table'],
+                ['Max Order Number', 'Max Order Date', 'Updated At'])
+            cursor.execute(statement, (self.table_name, self.new_max_number,
+                                       self.new_max_date.date() if self.new_max_date is not None else None,
+                                       datetime.datetime.now().replace(microsecond=0)))
+        if self.new_hashes:
+            statement = self.backend.upsert_statement(
+                'Load_Row_Hashes', ['Table', 'Row Key', 'Row Hash'], ['Table', 'Row Key'], ['Row Hash'])
+            cursor.executemany(statement, [(self.table_name, key, value) for key, value in self.new_hashes.items()])
+        self.known_hashes.update(self.new_hashes)
+        self.new_hashes = {}
+
+
+# Fingerprints of the pipeline stages that wrote to this database (see pipeline_dag.py), kept
+# with the data so that a new or emptied database never looks up to date
+class DatabaseFingerprints(FingerprintStore):
+    def __init__(self, backend):
+        super().__init__(path=None)
+        self.backend = backend
+
+    def load(self):
+        conn, cursor = self.backend.connect()
+        if not conn:
+            return {}
+        try:
+            cursor.execute(self.backend.translate_query("SELECT `Stage`, `Fingerprint` FROM Stage_Fingerprints"))
+            return dict(cursor.fetchall())
+        except self.backend.error:
+            return {}  # nothing recorded in this database yet
+        finally:
+            self.backend.close(conn, cursor)
+
+    def save(self, name, fingerprint):
+        conn, cursor = self.backend.connect()
+        if not conn:
+            return
+        try:
+            cursor.execute(self.backend.translate_ddl(metadata_table_definitions["Stage_Fingerprints"]))
+            cursor.execute(self.backend.upsert_statement('Stage_Fingerprints', ['Stage', 'Fingerprint', 'Updated At'],
+                                                         ['Stage'], ['Fingerprint', 'Updated At']),
+                           (name, fingerprint, datetime.datetime.now().replace(microsecond=0)))
+            conn.commit()
+        finally:
+            self.backend.close(conn, cursor)
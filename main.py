@@ -1,4 +1,108 @@
-def main():
+# Command line options
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='DataSpark pipeline for Global Electronics data')
+    parser.add_argument('--backend', choices=backend_names, default='mysql',
+                        help='Database to load into: the MySQL server or an embedded SQLite/DuckDB file')
+    parser.add_argument('--database', default=None,
+                        help='Database file for the sqlite and duckdb backends (":memory:" for no file)')
+    parser.add_argument('--insert-mode', choices=insert_modes, default='batch',
+                        help='How rows are sent to the database (default: batch; infile needs mysql or duckdb)')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Rows per round trip for the executemany and batch modes')
+    parser.add_argument('--data-dir', default=None,
+                        help='Read the six CSV files from this directory (e.g. one written by synthetic_data.py)')
+    parser.add_argument('--encoding', default=None,
+                        help='Read every CSV with this encoding instead of detecting it')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Stream each CSV into MySQL in chunks of this many rows')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Tables loaded and cleaned concurrently (default: one per table, up to the CPU count)')
+    parser.add_argument('--executor', choices=['process', 'thread'], default='process',
+                        help='Pool used by --workers (default: process)')
+    parser.add_argument('--target', nargs='+', metavar='STAGE', default=None,
+                        help='Run only these stages and what they depend on, e.g. sales_trends (default: all)')
+    parser.add_argument('--list-stages', action='store_true',
+                        help='Print every stage with its inputs (* marks the default targets) and exit')
+    parser.add_argument('--pool-size', type=int, default=4,
+                        help='MySQL connections shared by the parallel table loaders (at most 32)')
+    parser.add_argument('--writers', type=int, default=4,
+                        help='Connections writing Sales concurrently, each on its own Order Number range')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only send rows that are new (Sales watermark) or changed (dimension row hashes)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='Do not read or write the on-disk cache of cleaned tables')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Rerun every stage, even those whose inputs have not changed since the last run')
+    parser.add_argument('--no-indexes', action='store_true',
+                        help='Do not build the Sales secondary indexes after loading')
+    parser.add_argument('--rebuild-indexes', action='store_true',
+                        help='Drop the Sales secondary indexes before loading and rebuild them afterwards')
+    parser.add_argument('--partition-sales', type=int, nargs=2, metavar=('FIRST_YEAR', 'LAST_YEAR'),
+                        help='Create Sales RANGE-partitioned by order year (MySQL; drops the Sales foreign keys)')
+    parser.add_argument('--no-summaries', action='store_true',
+                        help='Do not refresh the daily summary tables after loading')
+    parser.add_argument('--rebuild-summaries', action='store_true',
+                        help='Rebuild every date of the summary tables (needed after Products/Customers edits)')
+    parser.add_argument('--run-queries', action='store_true',
+                        help='Run the queries in Sql Queries.sql, and their summary-table versions, after loading')
+    parser.add_argument('--query-workers', type=int, default=4,
+                        help='Connections running catalog queries concurrently (default: 4)')
+    parser.add_argument('--explain', action='store_true',
+                        help='Report which secondary indexes each query in Sql Queries.sql uses')
+    parser.add_argument('--large-data-rows', type=int, default=large_data_rows,
+                        help='Histograms of more values than this are binned first and get a sampled KDE '
+                             f'(default: {large_data_rows:,})')
+    parser.add_argument('--kde-sample-size', type=int, default=kde_sample_size,
+                        help=f'Values sampled to fit the KDE of a large histogram (default: {kde_sample_size:,})')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for the KDE samples, so charts are reproducible (default: 0)')
+    parser.add_argument('--no-validate', action='store_true',
+                        help='Load rows without the data quality checks (bad keys then fail in the database)')
+    parser.add_argument('--quarantine-dir', default=quarantine_dir,
+                        help=f'Directory for the CSV files of rows rejected by the checks (default: {quarantine_dir})')
+    parser.add_argument('--rebuild-rollups', action='store_true',
+                        help='Rebuild the daily Sales trend rollups from every row instead of only new ones')
+    parser.add_argument('--charts', choices=chart_modes, default='show',
+                        help='show charts in windows (default), render them to files headless, '
+                             'or print only the numbers behind them')
+    parser.add_argument('--chart-dir', default='charts',
+                        help='Directory for --charts files (default: charts)')
+    parser.add_argument('--chart-format', choices=chart_formats, nargs='+', default=['png'],
+                        help='Image formats for --charts files (default: png)')
+    parser.add_argument('--chart-workers', type=int, default=None,
+                        help='Processes rendering --charts files (default: one per CPU)')
+    parser.add_argument('--profile', metavar='TRACE_JSON', default=None,
+                        help='Record wall/CPU time, memory and rows/sec of every stage and write them as a '
+                             'Chrome trace-event file')
+    parser.add_argument('--profile-memory', action='store_true',
+                        help='With --profile, also trace Python allocations per stage (tracemalloc; slower)')
+    parser.add_argument('--sketch-queries', action='store_true',
+                        help='Answer the top-N product and city queries from in-memory heavy hitters')
+    parser.add_argument('--top-k-capacity', type=int, default=1000,
+                        help='Keys kept per heavy-hitter summary; 0 keeps every key for exact counts (default: 1000)')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    profiler = enable_profiling(memory=args.profile_memory) if args.profile else None
+    try:
+        run_pipeline(args)
+    finally:
+        if profiler is not None:
+            profiler.print_summary()
+            profiler.write_trace(args.profile)
+            print(f"Wrote the stage profile to {args.profile} (open it in chrome://tracing or ui.perfetto.dev)")
+
+
+# The pipeline as a DAG of stages (see pipeline_dag.py), shaped by the command line options.
+# Per table, load_<table> reads the CSV, clean_<table> cleans it (kept in the table cache),
+# validate_<table> applies the data quality checks and store_<table> writes it to the database
+# (recorded in the database, so an unchanged table is not sent again); with --chunksize one
+# stream_<table> stage does all four chunk by chunk. Each analysis is a stage named after its
+# analyze_* function and reads only the tables it needs. Returns the pipeline and the stages a
+# run without --target produces.
+def build_pipeline(args, backend, report, loader):
     data_paths = {
         "Sales": "your_file_path",
         "Customers":"your_file_path",
@@ -7,73 +111,341 @@ def main():
         "Data_Dictionary": "your_file_path",
         "Stores": "your_file_path"
     }
+    if args.data_dir:
+        data_paths = {table_name: os.path.join(args.data_dir, f"{table_name}.csv") for table_name in data_paths}
+
+    pipeline = Pipeline()
+    targets = []
+    frames = {}  # tables kept so far: what child keys are checked against and the sketches join to
+    table_stats = {}  # EDA statistics gathered while streaming
+    streamed = {}  # Sales heavy hitters and rollups fed while streaming
+    sent = set()  # tables streamed into the database by this run
+    top_k_capacity = args.top_k_capacity or None
+    # Rows are checked before they are written; keys against the parent rows that were kept
+    validator = None if args.no_validate else DataValidator(frames, args.quarantine_dir)
+    graph = foreign_key_graph(table_definitions)
+    # Parents before children, as required by the FOREIGN KEYs in table_definitions
+    table_order = [table for level in load_levels(graph) for table in level]
+    checked_parents = {table_name: [target[1] for kind, target in table_rules.get(table_name, ()) if kind == 'references']
+                       for table_name in data_paths}
+    database = DatabaseFingerprints(backend)
+    database_params = {'backend': backend.name, 'database': backend.path, 'partition_years': args.partition_sales}
+    rollup_store = rollup_store_path(data_paths["Sales"], backend.name, backend.path)
+    # What the source files' size and mtime say about their contents; every later stage's
+    # fingerprint builds on these
+    sources = {table_name: source_fingerprint(path, cleaning_version, encoding=args.encoding)
+               if os.path.exists(path) else None for table_name, path in data_paths.items()}
+    frame_stage = {}
+
+    def clean(table_name, df):
+        return apply_schema(table_name, clean_table(table_name, df))
+
+    def validate(table_name, df, *parents):
+        if df is None:
+            return None
+        accepted = validator.validate(table_name, df)
+        validator.report([table_name])
+        frames[table_name] = accepted
+        return accepted
+
+    def store(table_name, df, *loaded):
+        if df is None:
+            return None
+        rows_per_sec = loader.load_table(table_name, df)
+        if rows_per_sec is not None:
+            print(f"{table_name}: {rows_per_sec:,.0f} rows/sec ({args.insert_mode}, {backend.name})")
+        return rows_per_sec
 
-    data_frames = {}
-    
-    # Load data
-    for key, path in data_paths.items():
-        print(f"Loading {key} data from {path}")
-        df = detect_and_load_csv(path)  # Assuming this function exists
-        if df is not None:
-            data_frames[key] = df
-            print(f"Loaded {key} data successfully.")
+    # Streaming mode: clean and insert a table chunk by chunk. The dimension tables are small
+    # and kept for EDA; Sales is never held in memory as a whole. With send=False the file is
+    # read the same way but nothing is inserted. Returns True, or None when the table failed.
+    def stream(table_name, send=True):
+        conn = cursor = None
+        if send:
+            conn, cursor = backend.connect(allow_local_infile=args.insert_mode == 'infile')
+            if not (conn and cursor):
+                return None
+        try:
+            if send and args.rebuild_indexes:
+                drop_secondary_indexes(cursor, backend, table_name)
+            path = data_paths[table_name]
+            print(f"{'Streaming' if send else 'Reading'} {table_name} data from {path} in chunks of {args.chunksize} rows")
+            chunks = detect_and_load_csv(path, encoding=args.encoding, chunksize=args.chunksize,
+                                         dtype=csv_dtypes.get(table_name))
+            if chunks is None:
+                print(f"Failed to load {table_name} data.")
+                return None
+            table_stats[table_name] = StatsAccumulator()
+            observers = [table_stats[table_name].update]
+            if table_name == "Sales":
+                streamed['top_k'] = SalesTopK(frames, top_k_capacity)
+                streamed['rollups'] = SalesRollups.load(rollup_store, rebuild=args.rebuild_rollups)
+                observers += [streamed['top_k'].update,
+                              lambda chunk: streamed['rollups'].append(chunk, frames.get("Products"))]
+            df, rows_per_sec = stream_table(table_name, chunks, cursor, conn, mode=args.insert_mode,
+                                            batch_size=args.batch_size, keep=table_name != "Sales",
+                                            incremental=args.incremental, backend=backend,
+                                            observers=observers, validator=validator, insert=send)
+            if validator is not None:
+                validator.report([table_name])
+            if send:
+                print(f"{table_name}: {rows_per_sec:,.0f} rows/sec ({args.insert_mode}, {backend.name})")
+                sent.add(table_name)
+            if df is not None:
+                frames[table_name] = df
+            return True
+        finally:
+            if send:
+                backend.close(conn, cursor)
+
+    def send(table_name, schema, *parents):
+        return stream(table_name)
+
+    # The rows of a streamed table, for EDA and the tables that check their keys against it:
+    # those kept while it was sent or, when the database already held it, read from the file
+    def read_streamed(table_name, loaded, *parents):
+        if table_name not in sent and not stream(table_name, send=False):
+            return None
+        return frames.get(table_name)
+
+    def finish_database(*streamed_tables):
+        conn, cursor = backend.connect()
+        if not (conn and cursor):
+            return None
+        create_local_revenue_view(cursor, backend)
+        create_customer_views(cursor, backend)
+        if not args.no_indexes:
+            for table_name in secondary_indexes:
+                create_secondary_indexes(cursor, backend, table_name)
+        conn.commit()
+        backend.close(conn, cursor)
+        return True
+
+    # Tables, views and metadata tables are created once, before any table is loaded
+    pipeline.add('database_schema', lambda: loader.create_schema() or None, params=database_params,
+                 resource='database')
+    if args.chunksize:
+        # A table is sent again only when its source, its checks or the database changed; its
+        # parents' rows are read first, so its keys are checked against them either way
+        for table_name in table_order:
+            key = table_name.lower()
+            parents = sorted(set(graph[table_name]) | set(checked_parents.get(table_name, ())))
+            pipeline.add(f"stream_{key}", functools.partial(send, table_name),
+                         ['database_schema', *(f"read_{parent.lower()}" for parent in parents)],
+                         params={'source': sources[table_name],
+                                 'rules': None if validator is None else table_rules.get(table_name),
+                                 **database_params},
+                         store=database, resource='database', allow_missing=True)
+            frame_stage[table_name] = pipeline.add(
+                f"read_{key}", functools.partial(read_streamed, table_name),
+                [f"stream_{key}", *(f"read_{parent.lower()}" for parent in parents)]).name
+        database_stages = [pipeline.add('finish_database', finish_database,
+                                        [f"stream_{table_name.lower()}" for table_name in table_order],
+                                        resource='database', allow_missing=True).name]
+    else:
+        table_store = None if args.no_cache else TableStore()
+        database_stages = []
+        for table_name in table_order:
+            key = table_name.lower()
+            pipeline.add(f"load_{key}", functools.partial(load_table, table_name, data_paths[table_name], args.encoding),
+                         params={'source': sources[table_name]}, process=args.executor == 'process',
+                         resource='tables')
+            frame_stage[table_name] = pipeline.add(f"clean_{key}", functools.partial(clean, table_name),
+                                                   [f"load_{key}"], version=cleaning_version, store=table_store,
+                                                   resource='tables').name
+            if validator is not None:
+                frame_stage[table_name] = pipeline.add(
+                    f"validate_{key}", functools.partial(validate, table_name),
+                    [frame_stage[table_name], *(frame_stage[parent] for parent in checked_parents[table_name])],
+                    params={'rules': table_rules.get(table_name), 'quarantine_dir': args.quarantine_dir},
+                    allow_missing=True).name
+            database_stages.append(pipeline.add(
+                f"store_{key}", functools.partial(store, table_name),
+                [frame_stage[table_name], 'database_schema',
+                 *(f"store_{parent.lower()}" for parent in sorted(graph[table_name]))],
+                params=database_params, store=database, resource='database', allow_missing=True).name)
+        targets += database_stages
+
+    def roll_up_sales(sales, products=None):
+        if args.chunksize:
+            rollups = streamed.get('rollups')
+            if rollups is None:
+                return None
         else:
-            print(f"Failed to load {key} data.")
-    
-    # Clean Sales Data
-    if "Sales" in data_frames:
-        df_sales = data_frames["Sales"]
-        df_sales['Order Date'] = df_sales['Order Date'].apply(convert_date_format)  # Assuming this function exists
-        df_sales['Delivery Date'] = df_sales['Delivery Date'].apply(convert_date_format)
-
-    # Clean Products Data
-    if "Products" in data_frames:
-        df_products = data_frames["Products"]
-        df_products['Unit Cost USD'] = df_products['Unit Cost USD'].replace({r'\$': '', ',': ''}, regex=True).astype(float)
-        df_products['Unit Price USD'] = df_products['Unit Price USD'].replace({r'\$': '', ',': ''}, regex=True).astype(float)
-
-    # Clean Customers Data
-    if "Customers" in data_frames:
-        df_customers = data_frames["Customers"]
-        df_customers['Birthday'] = pd.to_datetime(df_customers['Birthday'], format='%m/%d/%Y', errors='coerce').dt.strftime('%Y-%m-%d')
-        # Replace NaN with None before inserting into database
-        df_customers = df_customers.where(pd.notnull(df_customers), None)
-
-    # Clean and process Stores Data
-    if "Stores" in data_frames:
-        df_stores = data_frames["Stores"]
-        # Convert 'Open Date' to YYYY-MM-DD format
-        df_stores['Open Date'] = pd.to_datetime(df_stores['Open Date'], format='%m/%d/%Y', errors='coerce').dt.strftime('%Y-%m-%d')
-        df_stores = df_stores.where(pd.notnull(df_stores), None)  
-
-    conn, cursor = connect_to_mysql()
-    
-    if conn and cursor:  # Check if the connection and cursor are valid
-        for table_name in ["Sales","Customers", "Products", "Exchange_Rates", "Data_Dictionary","Stores"]:
-            create_table(table_name, cursor)  # Adjust this to pass table_name if necessary
-
-            # Clean and prepare data for insertion
-            if table_name == "Exchange_Rates":
-                df_exchange_rates = data_frames["Exchange_Rates"]
-                df_exchange_rates['Date'] = pd.to_datetime(df_exchange_rates['Date']).dt.strftime('%Y-%m-%d')
-
-            # Insert data into the database
-            insert_data(table_name, data_frames[table_name], cursor, conn)  # Insert data
-
-    close_mysql_connection(conn, cursor)
-
-    merged_df = pd.merge(df_sales, df_products, on='ProductKey', how='left')
-
-    # Call EDA summary and plotting functions for each DataFrame
-    for key, df in data_frames.items():
-        eda_summary(df, key)
-        if key == 'Customers':
-            analyze_customer_demographics(df_customers)
-            analyze_customer_purchases(merged_df)
-        elif key == 'Sales':
-            analyze_sales_trends(df_sales)
-        elif key == 'Products':
-            analyze_products(df_products)
+            rollups = SalesRollups.load(rollup_store, rebuild=args.rebuild_rollups)
+            for start in range(0, len(sales), eda_chunk_rows):
+                rollups.append(sales.iloc[start:start + eda_chunk_rows], products)
+        if rollups.new_rows:
+            rollups.save()
+        print(f"Rolled up {rollups.new_rows} new Sales rows ({len(rollups.daily)} daily rollup rows stored).")
+        return rollups
+
+    def count_top_sales(sales, products=None, customers=None):
+        if args.chunksize:
+            return streamed.get('top_k')
+        top_k = SalesTopK({"Products": products, "Customers": customers}, top_k_capacity)
+        for start in range(0, len(sales), eda_chunk_rows):
+            top_k.update(sales.iloc[start:start + eda_chunk_rows])
+        return top_k
+
+    # Streamed Sales was rolled up and counted on the way in, so those stages only need it loaded
+    if args.chunksize:
+        rollup_inputs = top_k_inputs = [frame_stage["Sales"]]
+    else:
+        rollup_inputs = [frame_stage["Sales"], frame_stage["Products"]]
+        top_k_inputs = [frame_stage["Sales"], frame_stage["Products"], frame_stage["Customers"]]
+    pipeline.add('sales_rollups', roll_up_sales, rollup_inputs, params={'path': rollup_store},
+                 store=FingerprintStore(), restore=functools.partial(SalesRollups.load, rollup_store),
+                 allow_missing=bool(args.chunksize))
+    pipeline.add('sales_top_k', count_top_sales, top_k_inputs, allow_missing=bool(args.chunksize))
+
+    def connected(task):
+        def run(*loaded):
+            conn, cursor = backend.connect()
+            if not (conn and cursor):
+                return None
+            try:
+                task(cursor)
+                conn.commit()
+            finally:
+                backend.close(conn, cursor)
+            return True
+        return run
+
+    if not args.no_summaries:
+        # A full (non-incremental) load may have rewritten any date, so rebuild them all
+        targets.append(pipeline.add('summaries', connected(
+            lambda cursor: refresh_summaries(cursor, backend, full=not args.incremental or args.rebuild_summaries)),
+            database_stages, params=database_params, store=database, resource='database').name)
+    if args.explain:
+        targets.append(pipeline.add('index_usage_report', connected(
+            lambda cursor: index_usage_report(cursor, backend, load_query_script())),
+            database_stages, main_thread=True).name)
+    if args.run_queries:
+        def run_queries(*loaded):
+            sketches = loaded[-1] if args.sketch_queries else None
+            run_catalog(backend, load_catalog(), workers=args.query_workers, sketches=sketches)
+            return True
+        # After the summary refresh, which rewrites tables while it runs
+        query_inputs = database_stages + ([] if args.no_summaries else ['summaries'])
+        targets.append(pipeline.add('queries', run_queries,
+                                    query_inputs + (['sales_top_k'] if args.sketch_queries else []),
+                                    main_thread=True).name)
+        if not args.no_summaries:
+            def run_summary_queries(summaries):
+                print("Same queries answered from the summary tables:")
+                run_catalog(backend, load_catalog(summary_query_file), workers=args.query_workers)
+                return True
+            targets.append(pipeline.add('summary_queries', run_summary_queries, ['summaries'], main_thread=True).name)
+
+    pipeline.add('star_schema', lambda sales, customers, products, stores: StarSchema.from_tables(
+        {"Sales": sales, "Customers": customers, "Products": products, "Stores": stores}),
+        [frame_stage[table_name] for table_name in ["Sales", "Customers", "Products", "Stores"]])
+    # Only the columns analyze_customer_purchases reads, gathered by ProductKey instead of merged
+    pipeline.add('merge_sales', lambda star: star.view(['Quantity', 'Unit Price USD', 'Product Name']),
+                 ['star_schema'])
+
+    def revenue_by_currency(star, rates):
+        revenue = local_revenue(star, ExchangeRates(rates))
+        print("\nRevenue by currency (converted at the rate in effect on each Order Date):")
+        print(revenue.groupby('Currency Code', observed=True)[['Revenue USD', 'Revenue Local']].sum())
+        return True
+    targets.append(pipeline.add('local_revenue', revenue_by_currency, ['star_schema', frame_stage["Exchange_Rates"]],
+                                main_thread=True).name)
+
+    # EDA summary and plots for each table (streamed tables were summarized on the way in),
+    # each followed by the analyses of that table
+    def summarize(table_name, df):
+        if df is None and table_name not in table_stats:
+            return None
+        eda_summary(df, table_name, table_stats.get(table_name), report)
+        return True
+
+    def analysis(func):
+        def run(*tables):
+            func(*tables, report=report)
+            return True
+        return run
+
+    analyses = {
+        "Sales": [('sales_trends', lambda rollups, report: analyze_sales_trends(None, rollups, report=report),
+                   ['sales_rollups']),
+                  ('customer_value', analyze_customer_value, [frame_stage["Sales"], frame_stage["Products"]])],
+        "Customers": [('customer_demographics', analyze_customer_demographics, [frame_stage["Customers"]]),
+                      ('customer_purchases', analyze_customer_purchases, ['merge_sales'])],
+        "Products": [('products', analyze_products, [frame_stage["Products"]])],
+    }
+    for table_name in data_paths:
+        targets.append(pipeline.add(f"eda_{table_name.lower()}", functools.partial(summarize, table_name),
+                                    [frame_stage[table_name]], main_thread=True, allow_missing=True).name)
+        for name, func, inputs in analyses.get(table_name, ()):
+            targets.append(pipeline.add(name, analysis(func), inputs, main_thread=True).name)
+    return pipeline, targets
+
+
+# How long each table took to load and clean, from the timings of the last pipeline run, and
+# the wall-clock of the whole load next to the seconds summed across tables
+def report_table_loads(pipeline, workers, executor):
+    loaded, summed, wall_clock = 0, 0.0, 0.0
+    for table_name in table_definitions:
+        stage_names = [f"load_{table_name.lower()}", f"clean_{table_name.lower()}"]
+        timings = [pipeline.timings[name] for name in stage_names if name in pipeline.timings]
+        if not timings:
+            continue
+        seconds = sum(timing[1] for timing in timings)
+        summed += seconds
+        wall_clock = max(wall_clock, *(timing[2] for timing in timings))
+        if timings[-1][0] == 'skipped':
+            print(f"Failed to load {table_name} data.")
+        else:
+            loaded += 1
+            source = ' from the table cache' if timings[-1][0] == 'restore' else ''
+            print(f"Loaded {table_name} data{source} successfully in {seconds:.2f}s.")
+    if loaded:
+        print(f"Loaded {loaded} tables in {wall_clock:.2f}s wall-clock "
+              f"({summed:.2f}s summed across tables, {workers} {executor} worker(s)).")
+
+
+# Load, store and analyze every table as the command line options ask: the stages --target
+# names, or all of them, and whatever they depend on
+@profiled(name='pipeline')
+def run_pipeline(args):
+    if args.charts != 'show':
+        plt.switch_backend('Agg')  # headless: no windows, nothing waits on a display
+    report = ChartReport(args.charts, args.chart_dir, args.chart_format, args.chart_workers,
+                         large_rows=args.large_data_rows, sample_size=args.kde_sample_size, seed=args.seed)
+    backend = get_backend(args.backend, mysql_config, args.database)
+    if args.insert_mode not in backend.insert_modes:
+        raise SystemExit(f"--insert-mode {args.insert_mode} is not supported by the {args.backend} backend")
+    loader = DatabaseLoader(backend, args.pool_size, args.writers, args.insert_mode, args.batch_size, args.incremental,
+                            not args.no_indexes, args.rebuild_indexes, args.partition_sales,
+                            tables_at_once=len(table_definitions))
+    pipeline, default_targets = build_pipeline(args, backend, report, loader)
+    if args.list_stages:
+        for name, definition in pipeline.stages.items():
+            marker = '*' if name in default_targets else ' '
+            print(f"{marker} {name:<26} {', '.join(definition.inputs)}")
+        return
+    targets = args.target or default_targets
+    unknown = [name for name in targets if name not in pipeline.stages]
+    if unknown:
+        raise SystemExit(f"Unknown stage(s) {', '.join(unknown)}; --list-stages shows them")
+
+    force = True if args.refresh else [name for name, flag in [('sales_rollups', args.rebuild_rollups),
+                                                               ('summaries', args.rebuild_summaries)] if flag]
+    # --workers tables are read and cleaned at once; the thread pool has room for those and for
+    # every table writing to the database, the other stages being short
+    workers = args.workers or min(len(table_definitions), os.cpu_count() or 1)
+    limits = {'tables': workers, 'database': loader.tables_at_once}
+    try:
+        pipeline.run(targets, workers=sum(limits.values()), process_workers=workers, limits=limits, force=force)
+    finally:
+        loader.close()
+    report_table_loads(pipeline, workers, args.executor)
+    if not args.no_cache:
+        evict_cache()
+    with stage('render_charts'):
+        report.render()
 
 if __name__ == "__main__":
-    main()
+    main()
\ No newline at end of file
@@ -0,0 +1,283 @@
+# The pipeline as a DAG of named stages with explicit inputs. Running a target runs only the
+# stages it depends on; stages whose inputs are ready run concurrently on a thread pool (or a
+# process pool), and a stage with a store is not rerun while its fingerprint (its name, version
+# and parameters plus the fingerprints of its inputs) matches the one it last completed with.
+# Fingerprints come from the source files' size and mtime, so whether a stage is up to date is
+# known before anything is read: an unchanged table is neither re-parsed nor re-loaded.
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+
+from stage_profiler import collect, stage as profile_stage, submit
+from table_cache import cache_path, load_cached_table, store_cached_table
+
+stage_state_file = os.path.join('.dataspark_cache', 'stages.json')
+
+
+class Stage:
+    # func is called with the outputs of inputs, in order. Options:
+    #   params        JSON-able values that change the output (file fingerprints, options)
+    #   version       bump when func changes what it produces
+    #   store         where an up-to-date output is kept (TableStore, FingerprintStore)
+    #   restore       for a FingerprintStore stage, returns its output when it is not rerun
+    #   process       run on the process pool (func and inputs must pickle)
+    #   main_thread   run on the scheduler's thread, one at a time in definition order and only
+    #                 while no other stage is running, so the output of stages that print
+    #                 reports or draw charts never interleaves with anything else
+    #   resource      name of a limited resource, e.g. 'database' for the single-writer engines
+    #   allow_missing run even when an input produced None (otherwise the stage is skipped)
+    def __init__(self, name, func, inputs=(), params=None, version=1, store=None, restore=None, process=False,
+                 main_thread=False, resource=None, allow_missing=False):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.params = params or {}
+        self.version = version
+        self.store = store
+        self.restore = restore
+        self.process = process
+        self.main_thread = main_thread
+        self.resource = resource
+        self.allow_missing = allow_missing
+
+    def fingerprint(self, input_fingerprints):
+        text = json.dumps([self.name, self.version, self.params, list(input_fingerprints)], sort_keys=True, default=str)
+        return hashlib.sha256(text.encode()).hexdigest()[:20]
+
+
+# DataFrame outputs, kept in the on-disk table cache under the stage name
+class TableStore:
+    def has(self, stage, fingerprint):
+        return os.path.exists(cache_path(stage.name, fingerprint))
+
+    def restore(self, stage, fingerprint):
+        return load_cached_table(stage.name, fingerprint)
+
+    def record(self, stage, fingerprint, value):
+        store_cached_table(stage.name, fingerprint, value)
+
+
+# Stages run for their side effects (rows written, a file saved): the fingerprint each last
+# completed with, in a JSON file. An up-to-date stage returns stage.restore(), or True.
+class FingerprintStore:
+    def __init__(self, path=stage_state_file):
+        self.path = path
+        self.lock = threading.Lock()
+        self.fingerprints = None
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    # Re-read before writing, so stages recording concurrently keep each other's entries
+    def save(self, name, fingerprint):
+        with self.lock:
+            fingerprints = self.load()
+            fingerprints[name] = fingerprint
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(fingerprints, f, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def has(self, stage, fingerprint):
+        if self.fingerprints is None:
+            self.fingerprints = self.load()
+        return self.fingerprints.get(stage.name) == fingerprint
+
+    def restore(self, stage, fingerprint):
+        return stage.restore() if stage.restore is not None else True
+
+    def record(self, stage, fingerprint, value):
+        self.save(stage.name, fingerprint)
+
+
+# Body of every stage job: time it as the stage and record its output in the stage's store
+def run_stage(stage, values, fingerprint):
+    with profile_stage(stage.name):
+        value = stage.func(*values)
+    if stage.store is not None and value is not None:
+        stage.store.record(stage, fingerprint, value)
+    return value
+
+
+def restore_stage(stage, fingerprint):
+    with profile_stage(stage.name, restored=True):
+        return stage.store.restore(stage, fingerprint)
+
+
+# Process-pool stages: the function runs under the stage's name in the worker
+def call_stage(name, func, values):
+    with profile_stage(name):
+        return func(*values)
+
+
+# Runs a job where it is scheduled (thread, worker process or the scheduler's thread), so the
+# seconds exclude time spent queued
+def timed(job, *args):
+    start = time.perf_counter()
+    value = job(*args)
+    return value, time.perf_counter() - start
+
+
+class Pipeline:
+    def __init__(self):
+        self.stages = {}
+        # Of the last run: stage name -> (how it completed: 'run', 'restore' or 'skipped', seconds it
+        # took, seconds from the start of the run until it finished)
+        self.timings = {}
+
+    # Inputs must already be defined, so definition order is a topological order and the graph
+    # cannot have a cycle
+    def add(self, name, func, inputs=(), **options):
+        if name in self.stages:
+            raise ValueError(f"Stage {name!r} is defined twice")
+        unknown = [input_name for input_name in inputs if input_name not in self.stages]
+        if unknown:
+            raise ValueError(f"Stage {name!r} depends on undefined stage(s) {unknown}")
+        self.stages[name] = Stage(name, func, inputs, **options)
+        return self.stages[name]
+
+    def fingerprints(self):
+        fingerprints = {}
+        for name, stage in self.stages.items():
+            fingerprints[name] = stage.fingerprint(fingerprints[input_name] for input_name in stage.inputs)
+        return fingerprints
+
+    # Walk back from the targets. A stage whose store holds its current fingerprint is up to date:
+    # it is restored, not run, and its own inputs are not needed. force (stage names, or True
+    # for all) reruns stages regardless. Returns the stages to run and the up-to-date ones, both
+    # in definition order, and every fingerprint.
+    def plan(self, targets, force=()):
+        unknown = [name for name in targets if name not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown stage(s) {unknown}; expected some of {list(self.stages)}")
+        fingerprints = self.fingerprints()
+        needed, fresh = set(), set()
+        pending = list(targets)
+        while pending:
+            name = pending.pop()
+            if name in needed or name in fresh:
+                continue
+            stage = self.stages[name]
+            if (force is not True and name not in force and stage.store is not None
+                    and stage.store.has(stage, fingerprints[name])):
+                fresh.add(name)
+                continue
+            needed.add(name)
+            pending.extend(stage.inputs)
+        return ([name for name in self.stages if name in needed], [name for name in self.stages if name in fresh],
+                fingerprints)
+
+    # Run (or restore) everything targets need and return the targets' outputs. Outputs are
+    # dropped as soon as every stage reading them has finished, unless they are targets.
+    def run(self, targets, workers=None, process_workers=None, limits=None, force=()):
+        to_run, fresh, fingerprints = self.plan(targets, force)
+        consumers = {}
+        for name in to_run:
+            for input_name in self.stages[name].inputs:
+                consumers[input_name] = consumers.get(input_name, 0) + 1
+        to_restore = [name for name in fresh if name in consumers]
+        print(f"Running {len(to_run)} stage(s)"
+              + (f"; up to date: {', '.join(fresh)}" if fresh else "") + ".")
+
+        limits = limits or {}
+        kinds = {name: 'restore' for name in to_restore}
+        kinds.update((name, 'run') for name in to_run)
+        pending = dict(kinds)
+        outputs, done = {}, set()
+        self.timings = {}
+        run_start = time.perf_counter()
+        running = {}  # future -> stage name
+        busy = {}  # resource -> stages holding it
+
+        def ready(name):
+            stage = self.stages[name]
+            if kinds[name] == 'run' and not all(input_name in done for input_name in stage.inputs):
+                return False
+            return not stage.resource or busy.get(stage.resource, 0) < limits.get(stage.resource, float('inf'))
+
+        def hold(stage, count):
+            if stage.resource:
+                busy[stage.resource] = busy.get(stage.resource, 0) + count
+
+        def finish(name, value, kind, seconds=0.0):
+            stage = self.stages[name]
+            self.timings[name] = (kind, seconds, time.perf_counter() - run_start)
+            outputs[name] = value
+            done.add(name)
+            if kinds[name] == 'run':
+                for input_name in stage.inputs:
+                    consumers[input_name] -= 1
+                    if not consumers[input_name] and input_name not in targets:
+                        outputs.pop(input_name, None)
+
+        use_processes = process_workers and process_workers > 1 and any(
+            self.stages[name].process for name in to_run)
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as threads, \
+                (ProcessPoolExecutor(max_workers=process_workers) if use_processes else nullcontext()) as processes:
+            try:
+                while pending or running:
+                    main_stage = None
+                    # Process stages first, so worker processes are forked before threads start
+                    for name in sorted(pending, key=lambda name: not self.stages[name].process):
+                        if not ready(name):
+                            continue
+                        stage = self.stages[name]
+                        values = [outputs[input_name] for input_name in stage.inputs] if kinds[name] == 'run' else []
+                        if not stage.allow_missing and any(value is None for value in values):
+                            missing = [input_name for input_name, value in zip(stage.inputs, values) if value is None]
+                            print(f"Skipping {name}: no data from {', '.join(missing)}.")
+                            del pending[name]
+                            finish(name, None, 'skipped')
+                            continue
+                        if kinds[name] == 'run' and stage.main_thread:
+                            main_stage = main_stage or name
+                            continue
+                        del pending[name]
+                        hold(stage, 1)
+                        if kinds[name] == 'restore':
+                            future = threads.submit(timed, restore_stage, stage, fingerprints[name])
+                        elif stage.process and use_processes:
+                            future = submit(processes, timed, call_stage, name, stage.func, values)
+                        else:
+                            future = threads.submit(timed, run_stage, stage, values, fingerprints[name])
+                        running[future] = name
+
+                    if main_stage is not None and not running:
+                        stage = self.stages[main_stage]
+                        del pending[main_stage]
+                        hold(stage, 1)
+                        value, seconds = timed(run_stage, stage, [outputs[input_name] for input_name in stage.inputs],
+                                               fingerprints[main_stage])
+                        hold(stage, -1)
+                        finish(main_stage, value, 'run', seconds)
+                        continue
+                    if not running:
+                        if pending:
+                            raise RuntimeError(f"Stages can never run: {list(pending)}")
+                        break
+
+                    completed, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in completed:
+                        name = running.pop(future)
+                        stage = self.stages[name]
+                        value, seconds = collect(future)
+                        # run_stage recorded thread results; process results are recorded here
+                        if (stage.process and use_processes and kinds[name] == 'run'
+                                and stage.store is not None and value is not None):
+                            stage.store.record(stage, fingerprints[name], value)
+                        hold(stage, -1)
+                        finish(name, value, kinds[name], seconds)
+            except BaseException:
+                for future in running:
+                    future.cancel()
+                raise
+        return {name: outputs.get(name) for name in targets}
@@ -0,0 +1,212 @@
+# The analytical queries of Sql Queries.sql as a catalog of named, parameterized queries that
+# run concurrently against any storage backend, with a result cache keyed by data version
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from currency_conversion import local_revenue_view_tables
+from incremental_load import table_versions
+
+query_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Sql Queries.sql')
+
+# Results kept in memory, least recently used first
+result_cache = OrderedDict()
+result_cache_size = 256
+result_cache_lock = threading.Lock()
+
+limit_pattern = re.compile(r'\bLIMIT\s+(\d+)', re.IGNORECASE)
+# col = 'value' comparisons, optionally qualified by a table alias
+literal_pattern = re.compile(r"\b((?:\w+\.)?(\w+))\s*=\s*'([^']*)'")
+table_pattern = re.compile(r'\b(?:FROM|JOIN)\s+`?(\w+)`?', re.IGNORECASE)
+# Views the queries read, and the tables behind them
+view_tables = {'sales_local_revenue': [table.lower() for table in local_revenue_view_tables]}
+
+
+# Split the script into (title, sql) pairs; the title is the comment above each statement
+def load_query_script(path=query_file):
+    with open(path, encoding='utf-8') as f:
+        script = f.read()
+    queries = []
+    for statement in script.split(';'):
+        lines = [line.strip() for line in statement.strip().splitlines()]
+        titles = [line.lstrip('-').strip().rstrip(':') for line in lines if line.startswith('--')]
+        sql = '\n'.join(line for line in lines if line and not line.startswith('--'))
+        # The USE statement only applies to the MySQL console
+        if not sql or re.match(r'use\s+\w+$', sql, re.IGNORECASE):
+            continue
+        queries.append((titles[-1] if titles else f"Query {len(queries) + 1}", sql))
+    return queries
+
+
+# Turn LIMIT n and col = 'value' literals into :top_n / :col parameters.
+# Returns the parameterized SQL and the literal values as default parameters.
+def parameterize(sql):
+    params = {}
+
+    def limit(match):
+        params['top_n'] = int(match.group(1))
+        return 'LIMIT :top_n'
+
+    def literal(match):
+        name = match.group(2).lower()
+        params[name] = match.group(3)
+        return f"{match.group(1)} = :{name}"
+
+    sql = limit_pattern.sub(limit, sql)
+    sql = literal_pattern.sub(literal, sql)
+    return sql, params
+
+
+# Build the catalog: {name: entry}. Statements that only differ in their literals (such as the
+# Female and Male top-5 queries) become one entry with each original literal set as a variant.
+# The title becomes a template ("Top {top_n} Products Preferred by {gender} Customers") and the
+# name is the title without its parameters.
+def load_catalog(path=query_file):
+    catalog = {}
+    by_sql = {}
+    for title, sql in load_query_script(path):
+        sql, params = parameterize(sql)
+        title = re.sub(r'^\d+\.\s*', '', title)
+        for name, value in params.items():
+            title = re.sub(rf'\b{re.escape(str(value))}\b', f'{{{name}}}', title, count=1)
+        if sql in by_sql:
+            by_sql[sql]['variants'].append(params)
+            continue
+        words = re.findall(r'[a-z]+', re.sub(r'\{\w+\}', '', title).lower())
+        entry = {
+            'name': '_'.join(words),
+            'title': title,
+            'sql': sql,
+            'tables': sorted({base for table in table_pattern.findall(sql)
+                              for base in view_tables.get(table.lower(), [table.lower()])}),
+            'variants': [params],
+        }
+        catalog[entry['name']] = entry
+        by_sql[sql] = entry
+    return catalog
+
+
+# Replace :name markers with the backend's placeholders; returns the SQL and the bound values
+def bind_parameters(sql, params, backend):
+    values = []
+
+    def placeholder(match):
+        values.append(params[match.group(1)])
+        return backend.placeholder
+
+    if backend.placeholder == '%s' and params:
+        sql = sql.replace('%', '%%')  # literal % (as in DATE_FORMAT) next to %s placeholders
+    sql = re.sub(r':(\w+)', placeholder, sql)
+    return backend.translate_query(sql), values
+
+
+# (name, params) for every variant of every catalog entry
+def default_jobs(catalog):
+    return [(name, params) for name, entry in catalog.items() for params in entry['variants']]
+
+
+def cached_result(key):
+    with result_cache_lock:
+        if key not in result_cache:
+            return None
+        result_cache.move_to_end(key)
+        return result_cache[key]
+
+
+def store_result(key, rows):
+    with result_cache_lock:
+        result_cache[key] = rows
+        result_cache.move_to_end(key)
+        while len(result_cache) > result_cache_size:
+            result_cache.popitem(last=False)
+
+
+# Run catalog queries concurrently on `workers` pooled connections. jobs is a list of
+# (name, params) pairs, params overriding the entry's defaults; by default every variant runs.
+# Results are cached per query, parameters and data version of the tables the query reads, so
+# a repeat run only hits the database for tables insert_data has changed since.
+# Queries that sketches (a heavy_hitters.SalesTopK) can answer are served from memory instead.
+# Returns one dict per job with the rows, latency and whether it came from the cache.
+def run_catalog(backend, catalog=None, jobs=None, workers=4, use_cache=True, sketches=None):
+    catalog = catalog if catalog is not None else load_catalog()
+    jobs = jobs if jobs is not None else default_jobs(catalog)
+    try:
+        pool = backend.create_pool(workers)
+        conn = pool.get_connection()
+    except backend.error as e:
+        print(f"Error connecting to {backend.name}: {e}")
+        return []
+    cursor = conn.cursor()
+    try:
+        versions = table_versions(cursor, backend)
+    except backend.error:
+        versions = {}  # nothing has been loaded through insert_data yet
+    cursor.close()
+    conn.close()
+
+    def run_job(name, params):
+        entry = catalog[name]
+        params = {**entry['variants'][0], **params}
+        key = (backend.name, backend.path, entry['sql'], tuple(sorted(params.items())),
+               tuple(versions.get(table) for table in entry['tables']))
+        start = time.perf_counter()
+        if sketches is not None and sketches.can_answer(name):
+            return {'name': name, 'title': entry['title'].format(**params), 'params': params,
+                    'rows': sketches.answer(name, params), 'seconds': time.perf_counter() - start,
+                    'cached': False, 'sketch': True}
+        rows = cached_result(key) if use_cache else None
+        cached = rows is not None
+        if not cached:
+            sql, values = bind_parameters(entry['sql'], params, backend)
+            job_conn = pool.get_connection()
+            job_cursor = job_conn.cursor()
+            try:
+                if values:
+                    job_cursor.execute(sql, values)
+                else:
+                    job_cursor.execute(sql)
+                rows = job_cursor.fetchall()
+            finally:
+                job_cursor.close()
+                job_conn.close()
+            if use_cache:
+                store_result(key, rows)
+        return {'name': name, 'title': entry['title'].format(**params), 'params': params, 'rows': rows,
+                'seconds': time.perf_counter() - start, 'cached': cached, 'sketch': False}
+
+    results = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_job, name, params) for name, params in jobs]
+        for (name, params), future in zip(jobs, futures):
+            try:
+                result = future.result()
+            except backend.error as err:
+                print(f"Error running query {name!r} on {backend.name}: {str(err).splitlines()[0]}")
+                continue
+            results.append(result)
+            print(f"{result['title']}: {len(result['rows'])} rows in {result['seconds'] * 1000:.1f} ms"
+                  f"{' (cached)' if result['cached'] else ''}{' (sketch)' if result['sketch'] else ''}")
+    print(f"Ran {len(results)} of {len(jobs)} queries in {time.perf_counter() - start:.2f}s "
+          f"on {workers} connection(s).")
+    return results
+
+
+# Run each query translated for the backend one after another; prints the row count and
+# latency of every query and returns {title: seconds} for the queries that succeeded
+def run_query_script(cursor, backend, queries=None):
+    timings = {}
+    for title, sql in queries if queries is not None else load_query_script():
+        start = time.perf_counter()
+        try:
+            cursor.execute(backend.translate_query(sql))
+            rows = cursor.fetchall()
+        except backend.error as err:
+            print(f"Error running query {title!r} on {backend.name}: {err}")
+            continue
+        timings[title] = time.perf_counter() - start
+        print(f"{title}: {len(rows)} rows in {timings[title] * 1000:.1f} ms")
+    return timings
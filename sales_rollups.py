@@ -0,0 +1,138 @@
+# Persisted daily Sales rollups per store and product category. Weekly, monthly and quarterly
+# trends are derived from the daily rows, and new Sales rows are folded in incrementally
+# (above the same Order Number / Order Date watermark the incremental loader uses), so a trend
+# refresh costs O(new rows) instead of a rescan of all history.
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from star_schema import StarSchema
+from table_cache import cache_format
+
+rollup_dir = os.path.join('.dataspark_cache', 'rollups')
+rollup_extension = 'parquet' if cache_format == 'parquet' else 'pkl'
+rollup_path = os.path.join(rollup_dir, f"sales_daily.{rollup_extension}")
+
+
+# Store for the rollups of one Sales file loaded into one database, so the watermark of one
+# data set never hides the rows of another
+def rollup_store_path(source, backend_name=None, database=None):
+    key = hashlib.sha256(f"{os.path.abspath(source)}|{backend_name}|{database}".encode()).hexdigest()[:20]
+    return os.path.join(rollup_dir, f"sales_daily-{key}.{rollup_extension}")
+
+rollup_keys = ['Order Date', 'StoreKey', 'Category']
+# Orders counts each order once, on its first line, so it adds up across stores, categories
+# and days like the other measures
+rollup_measures = ['Line Count', 'Orders', 'Quantity', 'Revenue']
+rollup_periods = {'day': 'D', 'week': 'W', 'month': 'ME', 'quarter': 'QE'}
+
+
+def empty_rollup():
+    return pd.DataFrame({
+        'Order Date': pd.Series(dtype='datetime64[s]'),
+        'StoreKey': pd.Series(dtype='int64'),
+        'Category': pd.Series(dtype=object),
+        **{measure: pd.Series(dtype='float64' if measure == 'Revenue' else 'int64') for measure in rollup_measures},
+    })
+
+
+class SalesRollups:
+    def __init__(self, daily=None, max_number=None, max_date=None, path=rollup_path):
+        self.daily = daily if daily is not None else empty_rollup()
+        self.path = path
+        # Watermark of the rows already rolled up, read once so that every chunk appended before
+        # save() is compared against the previous run, and the one save() will record
+        self.max_number = max_number
+        self.max_date = max_date
+        self.new_max_number = max_number
+        self.new_max_date = max_date
+        self.last_order = None  # Order Number of the previous appended row, to spot first lines
+        self.new_rows = 0
+
+    # The stored rollups, or an empty store when there are none yet (or rebuild is True)
+    @classmethod
+    def load(cls, path=rollup_path, rebuild=False):
+        if rebuild or not os.path.exists(path):
+            return cls(path=path)
+        try:
+            daily = pd.read_parquet(path) if cache_format == 'parquet' else pd.read_pickle(path)
+        except Exception as e:
+            print(f"Ignoring unreadable rollup store {path}: {e}")
+            return cls(path=path)
+        max_date = daily.attrs.get('Max Order Date')
+        return cls(daily, daily.attrs.get('Max Order Number'), pd.Timestamp(max_date) if max_date else None, path)
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        daily = self.daily.copy(deep=False)
+        # The watermark travels with the rows, so both are replaced together
+        daily.attrs = {'Max Order Number': self.new_max_number,
+                       'Max Order Date': self.new_max_date.isoformat() if self.new_max_date is not None else None}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        if cache_format == 'parquet':
+            daily.to_parquet(tmp_path, index=False)
+        else:
+            daily.to_pickle(tmp_path)
+        os.replace(tmp_path, self.path)
+        self.max_number, self.max_date = self.new_max_number, self.new_max_date
+
+    # Fold Sales rows (a whole frame or one chunk of it, in file order) into the daily rows.
+    # Rows at or below the stored watermark are skipped; products supplies each row's Category.
+    def append(self, sales, products=None):
+        mask = pd.Series(True, index=sales.index)
+        if self.max_number is not None:
+            mask = sales['Order Number'] > self.max_number
+            if self.max_date is not None:
+                mask |= sales['Order Date'] > self.max_date
+        mask = mask.to_numpy()
+
+        # First line of each order: its Order Number differs from the row before it
+        numbers = sales['Order Number'].to_numpy()
+        previous = np.empty(len(numbers), dtype=numbers.dtype)
+        previous[1:] = numbers[:-1]
+        first_line = numbers != previous
+        if len(numbers):
+            first_line[0] = numbers[0] != self.last_order
+            self.last_order = numbers[-1]
+
+        sales = sales[mask]
+        if not len(sales):
+            return 0
+        dimensions = {"Products": products} if products is not None else {}
+        columns = ['Unit Price USD', 'Category'] if products is not None else []
+        view = StarSchema(sales, dimensions).view(['Order Date', 'StoreKey', 'Quantity', *columns])
+        rows = pd.DataFrame({
+            'Order Date': view['Order Date'].dt.floor('D'),
+            'StoreKey': view['StoreKey'].astype('int64'),
+            'Category': view['Category'].astype(object).fillna('Unknown') if products is not None else 'Unknown',
+            'Line Count': 1,
+            'Orders': first_line[mask].astype('int64'),
+            'Quantity': view['Quantity'].astype('int64'),
+            'Revenue': view['Quantity'] * view['Unit Price USD'] if products is not None else np.nan,
+        }).dropna(subset=['Order Date'])
+        new_daily = rows.groupby(rollup_keys, sort=False, as_index=False)[rollup_measures].sum(min_count=1)
+
+        # Only the stored days the new rows touch are regrouped
+        touched = self.daily['Order Date'].isin(new_daily['Order Date'].unique())
+        merged = pd.concat([self.daily[touched], new_daily], ignore_index=True)
+        merged = merged.groupby(rollup_keys, sort=False, as_index=False)[rollup_measures].sum(min_count=1)
+        self.daily = pd.concat([self.daily[~touched], merged], ignore_index=True)
+
+        self.new_rows += len(sales)
+        self.new_max_number = max(int(sales['Order Number'].max()), self.new_max_number or 0)
+        latest = sales['Order Date'].max()
+        if pd.notna(latest):
+            self.new_max_date = max(d for d in (latest, self.new_max_date) if d is not None)
+        return len(sales)
+
+    # Measures per period ('day', 'week', 'month' or 'quarter'), optionally split by StoreKey
+    # and/or Category. Without a split every period between the first and last day is present.
+    def rollup(self, period='month', by=()):
+        freq = rollup_periods[period]
+        daily = self.daily
+        if not by:
+            return daily.groupby('Order Date')[rollup_measures].sum(min_count=1).resample(freq).sum()
+        grouper = [pd.Grouper(key='Order Date', freq=freq), *by]
+        return daily.groupby(grouper, observed=True)[rollup_measures].sum(min_count=1)
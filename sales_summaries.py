@@ -0,0 +1,162 @@
+# Daily summary tables over Sales, so the Sql Queries.sql workload can be answered without
+# scanning the fact table. A refresh only rebuilds the order dates touched since the last one.
+import os
+import time
+
+from incremental_load import create_metadata_tables, bump_table_version
+
+summary_query_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Sql Summary Queries.sql')
+
+# Watermark row (in Load_Watermarks) recording the Sales rows already summarized
+summary_watermark = 'Sales_Summaries'
+
+summary_table_definitions = {
+    "Daily_Product_Sales": """
+        CREATE TABLE IF NOT EXISTS Daily_Product_Sales (
+            `Order Date` DATE,
+            ProductKey INT,
+            Gender VARCHAR(10),
+            `Line Count` INT,
+            Quantity INT,
+            Revenue DECIMAL(18,2),
+            PRIMARY KEY (`Order Date`, ProductKey, Gender)
+        );
+    """,
+    "Daily_Store_Sales": """
+        CREATE TABLE IF NOT EXISTS Daily_Store_Sales (
+            `Order Date` DATE,
+            StoreKey INT,
+            `Line Count` INT,
+            Quantity INT,
+            Revenue DECIMAL(18,2),
+            PRIMARY KEY (`Order Date`, StoreKey)
+        );
+    """,
+    "Daily_Geo_Sales": """
+        CREATE TABLE IF NOT EXISTS Daily_Geo_Sales (
+            `Order Date` DATE,
+            Country VARCHAR(255),
+            City VARCHAR(255),
+            `Line Count` INT,
+            Quantity INT,
+            Revenue DECIMAL(18,2),
+            PRIMARY KEY (`Order Date`, Country, City)
+        );
+    """,
+    "Daily_Demographic_Sales": """
+        CREATE TABLE IF NOT EXISTS Daily_Demographic_Sales (
+            `Order Date` DATE,
+            Gender VARCHAR(10),
+            `Age Bucket` INT,
+            `Line Count` INT,
+            Quantity INT,
+            Revenue DECIMAL(18,2),
+            PRIMARY KEY (`Order Date`, Gender, `Age Bucket`)
+        );
+    """
+}
+
+# SELECT that fills each summary table; {where} restricts it to the refreshed dates. The joins
+# match the catalogued queries they replace. Age Bucket is the customer's age on the order
+# date in whole decades (20 = 20-29), -1 when the birthday is unknown.
+summary_select = {
+    "Daily_Product_Sales": """
+        SELECT s.`Order Date`, s.ProductKey, COALESCE(c.Gender, 'Unknown'),
+               COUNT(*), SUM(s.Quantity), SUM(s.Quantity * p.`Unit Price USD`)
+        FROM Sales s
+        JOIN Products p ON s.ProductKey = p.ProductKey
+        LEFT JOIN Customers c ON s.CustomerKey = c.CustomerKey
+        WHERE s.`Order Date` IS NOT NULL{where}
+        GROUP BY 1, 2, 3
+    """,
+    "Daily_Store_Sales": """
+        SELECT s.`Order Date`, s.StoreKey,
+               COUNT(*), SUM(s.Quantity), SUM(s.Quantity * p.`Unit Price USD`)
+        FROM Sales s
+        LEFT JOIN Products p ON s.ProductKey = p.ProductKey
+        WHERE s.`Order Date` IS NOT NULL{where}
+        GROUP BY 1, 2
+    """,
+    "Daily_Geo_Sales": """
+        SELECT s.`Order Date`, COALESCE(c.Country, ''), COALESCE(c.City, ''),
+               COUNT(*), SUM(s.Quantity), SUM(s.Quantity * p.`Unit Price USD`)
+        FROM Sales s
+        JOIN Customers c ON s.CustomerKey = c.CustomerKey
+        JOIN Products p ON s.ProductKey = p.ProductKey
+        WHERE s.`Order Date` IS NOT NULL{where}
+        GROUP BY 1, 2, 3
+    """,
+    "Daily_Demographic_Sales": """
+        SELECT s.`Order Date`, COALESCE(c.Gender, 'Unknown'),
+               COALESCE(FLOOR(DATEDIFF(s.`Order Date`, c.Birthday) / 3652.5) * 10, -1),
+               COUNT(*), SUM(s.Quantity), SUM(s.Quantity * p.`Unit Price USD`)
+        FROM Sales s
+        JOIN Customers c ON s.CustomerKey = c.CustomerKey
+        JOIN Products p ON s.ProductKey = p.ProductKey
+        WHERE s.`Order Date` IS NOT NULL{where}
+        GROUP BY 1, 2, 3
+    """
+}
+
+# Order dates refreshed per statement, to stay under the bound-parameter limits
+dates_per_statement = 500
+
+
+def create_summary_tables(cursor, backend):
+    for ddl in summary_table_definitions.values():
+        cursor.execute(backend.translate_ddl(ddl))
+
+
+# Order dates whose Sales rows arrived since the last refresh, or None when every date has to
+# be rebuilt (first refresh). Uses the same Order Number / Order Date watermark as the loader.
+def changed_order_dates(cursor, backend):
+    p = backend.placeholder
+    cursor.execute(backend.translate_query(
+        f"SELECT `Max Order Number`, `Max Order Date` FROM Load_Watermarks WHERE `Table` = {p}"),
+        (summary_watermark,))
+    row = cursor.fetchone()
+    if row is None or None in row:
+        return None
+    cursor.execute(backend.translate_query(
+        f"SELECT DISTINCT `Order Date` FROM Sales WHERE `Order Date` IS NOT NULL "
+        f"AND (`Order Number` > {p} OR `Order Date` > {p})"), row)
+    return [date for date, in cursor.fetchall()]
+
+
+# Bring the summary tables up to date with Sales: rebuild only the order dates that changed,
+# or every date when full is True. Changed dimension rows (say a new product price) are not
+# detected, so pass full=True after editing Products or Customers. Returns the number of dates
+# refreshed (None for a full rebuild).
+def refresh_summaries(cursor, backend, full=False):
+    start = time.perf_counter()
+    create_metadata_tables(cursor, backend)
+    create_summary_tables(cursor, backend)
+    dates = None if full else changed_order_dates(cursor, backend)
+    if dates is not None and not dates:
+        print("Summary tables are up to date.")
+        return 0
+
+    cursor.execute(backend.translate_query("SELECT MAX(`Order Number`), MAX(`Order Date`) FROM Sales"))
+    max_number, max_date = cursor.fetchone()
+    date_groups = [None] if dates is None else [dates[i:i + dates_per_statement]
+                                                for i in range(0, len(dates), dates_per_statement)]
+    for table_name, select in summary_select.items():
+        for group in date_groups:
+            if group is None:
+                cursor.execute(f"DELETE FROM {table_name}")
+                cursor.execute(backend.translate_query(f"INSERT INTO {table_name} {select.format(where='')}"))
+            else:
+                in_list = ', '.join([backend.placeholder] * len(group))
+                cursor.execute(backend.translate_query(
+                    f"DELETE FROM {table_name} WHERE `Order Date` IN ({in_list})"), group)
+                cursor.execute(backend.translate_query(
+                    f"INSERT INTO {table_name} {select.format(where=f' AND s.`Order Date` IN ({in_list})')}"),
+                    group)
+        bump_table_version(cursor, backend, table_name)
+
+    cursor.execute(backend.upsert_statement('Load_Watermarks', ['Table', 'Max Order Number', 'Max Order Date'],
+                                            ['Table'], ['Max Order Number', 'Max Order Date']),
+                   (summary_watermark, max_number, max_date))
+    scope = 'every date' if dates is None else f"{len(dates)} order date(s)"
+    print(f"Refreshed {len(summary_select)} summary tables for {scope} in {time.perf_counter() - start:.2f}s.")
+    return None if dates is None else len(dates)
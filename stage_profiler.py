@@ -0,0 +1,277 @@
+# Per-stage instrumentation for the pipeline. Every wrapped stage records its wall and CPU time,
+# resident memory before/after and how far it raised the process high-water mark, rows per
+# second, and optionally (tracemalloc) the Python allocations it made. Stages nest per thread and
+# are written as Chrome trace events, which chrome://tracing, Perfetto or speedscope show as a
+# timeline / flame chart. A stage costs a few microseconds, so profiling can stay on in
+# production; tracemalloc is the expensive part and is opt-in.
+import datetime
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+megabyte = 1024 * 1024
+
+
+# Current resident set size in bytes, or None when the platform gives no cheap way to read it
+def current_rss():
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Highest resident set size the process has reached so far, in bytes
+def peak_rss():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024  # bytes on macOS, KiB elsewhere
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss)
+    return None
+
+
+def to_megabytes(value):
+    return None if value is None else round(value / megabyte, 3)
+
+
+class StageProfiler:
+    def __init__(self, enabled=True, memory=False):
+        self.enabled = enabled
+        self.memory = memory
+        self.events = []
+        self.threads = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.origin = time.perf_counter_ns()
+        self.started_at = datetime.datetime.now().replace(microsecond=0)
+        if enabled and memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    # Time the body of a with block as one stage. rows (also settable later via set_rows) gives
+    # the rows per second; any extra keyword arguments are stored with the event.
+    @contextmanager
+    def stage(self, name, rows=None, **args):
+        if not self.enabled:
+            yield {}
+            return
+        frame = {'rows': rows, 'args': args, 'alloc_peak': 0}
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # The enclosing stage keeps the peak reached so far before this stage resets it
+            stack = self.stack()
+            if stack:
+                stack[-1]['alloc_peak'] = max(stack[-1]['alloc_peak'], peak)
+            tracemalloc.reset_peak()
+            frame['alloc_start'] = current
+        frame['rss_start'], frame['peak_start'] = current_rss(), peak_rss()
+        frame['cpu_start'], frame['thread_cpu_start'] = time.process_time(), time.thread_time()
+        frame['start'] = time.perf_counter_ns()
+        self.stack().append(frame)
+        try:
+            yield frame
+        except BaseException as e:
+            frame['args']['error'] = type(e).__name__
+            raise
+        finally:
+            self.stack().pop()
+            self.finish(name, frame)
+
+    def finish(self, name, frame):
+        end = time.perf_counter_ns()
+        wall = (end - frame['start']) / 1e9
+        rss_end, peak_end = current_rss(), peak_rss()
+        args = {
+            'wall_seconds': round(wall, 6),
+            'cpu_seconds': round(time.process_time() - frame['cpu_start'], 6),
+            'thread_cpu_seconds': round(time.thread_time() - frame['thread_cpu_start'], 6),
+            'rss_mb': to_megabytes(rss_end),
+            'rss_delta_mb': to_megabytes(rss_end - frame['rss_start']) if rss_end is not None else None,
+            'peak_rss_mb': to_megabytes(peak_end),
+            'peak_rss_growth_mb': to_megabytes(peak_end - frame['peak_start']) if peak_end is not None else None,
+        }
+        if frame['rows'] is not None:
+            args['rows'] = int(frame['rows'])
+            args['rows_per_sec'] = round(frame['rows'] / wall, 1) if wall > 0 else None
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(frame['alloc_peak'], peak)
+            stack = self.stack()
+            if stack:
+                stack[-1]['alloc_peak'] = max(stack[-1]['alloc_peak'], peak)
+            args['alloc_delta_mb'] = to_megabytes(current - frame['alloc_start'])
+            args['alloc_peak_mb'] = to_megabytes(peak - frame['alloc_start'])
+        args.update(frame['args'])
+
+        thread = threading.current_thread()
+        event = {'name': name, 'cat': 'stage', 'ph': 'X', 'pid': os.getpid(), 'tid': thread.ident,
+                 'ts': (frame['start'] - self.origin) / 1000, 'dur': (end - frame['start']) / 1000, 'args': args}
+        with self.lock:
+            self.threads[(os.getpid(), thread.ident)] = thread.name
+            self.events.append(event)
+            if rss_end is not None:
+                self.events.append({'name': 'memory', 'ph': 'C', 'pid': os.getpid(), 'tid': thread.ident,
+                                    'ts': event['ts'] + event['dur'], 'args': {'rss_mb': args['rss_mb']}})
+
+    # Rows processed by the innermost running stage of this thread, when only known at the end
+    def set_rows(self, rows):
+        stack = self.stack() if self.enabled else None
+        if stack:
+            stack[-1]['rows'] = rows
+
+    # Totals per stage name: calls, wall and CPU seconds, rows and rows per second
+    def summary(self):
+        totals = {}
+        for event in self.events:
+            if event['ph'] != 'X':
+                continue
+            args = event['args']
+            total = totals.setdefault(event['name'], {'calls': 0, 'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'rows': None,
+                                                      'peak_rss_growth_mb': 0.0})
+            total['calls'] += 1
+            total['wall_seconds'] += args['wall_seconds']
+            total['cpu_seconds'] += args['cpu_seconds']
+            total['peak_rss_growth_mb'] += args['peak_rss_growth_mb'] or 0.0
+            if 'rows' in args:
+                total['rows'] = (total['rows'] or 0) + args['rows']
+        for total in totals.values():
+            total['rows_per_sec'] = (round(total['rows'] / total['wall_seconds'], 1)
+                                     if total['rows'] is not None and total['wall_seconds'] > 0 else None)
+        return totals
+
+    def print_summary(self, limit=25):
+        totals = sorted(self.summary().items(), key=lambda item: item[1]['wall_seconds'], reverse=True)
+        print(f"\n{'Stage':<36} {'Calls':>6} {'Wall s':>9} {'CPU s':>9} {'Rows/sec':>12} {'Peak RSS +MB':>13}")
+        for name, total in totals[:limit]:
+            rate = f"{total['rows_per_sec']:,.0f}" if total['rows_per_sec'] is not None else '-'
+            print(f"{name:<36} {total['calls']:>6} {total['wall_seconds']:>9.3f} {total['cpu_seconds']:>9.3f} "
+                  f"{rate:>12} {total['peak_rss_growth_mb']:>13.1f}")
+
+    # Chrome trace-event JSON (object format), with the per-stage totals under otherData
+    def write_trace(self, path):
+        with self.lock:
+            events = list(self.events)
+            threads = dict(self.threads)
+        metadata = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': ident, 'args': {'name': name}}
+                    for (pid, ident), name in threads.items()]
+        metadata += [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': 'main' if pid == os.getpid() else 'worker'}}
+                     for pid in sorted({pid for pid, _ in threads})]
+        trace = {'traceEvents': metadata + events, 'displayTimeUnit': 'ms',
+                 'otherData': {'started_at': self.started_at.isoformat(), 'tracemalloc': self.memory,
+                               'summary': self.summary()}}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(trace, f)
+        os.replace(tmp_path, path)
+
+
+# The profiler stages report to; disabled (and nearly free) until enable_profiling is called
+active_profiler = StageProfiler(enabled=False)
+
+
+def enable_profiling(memory=False):
+    global active_profiler
+    active_profiler = StageProfiler(enabled=True, memory=memory)
+    return active_profiler
+
+
+def stage(name, rows=None, **args):
+    return active_profiler.stage(name, rows, **args)
+
+
+def set_rows(rows):
+    active_profiler.set_rows(rows)
+
+
+# Result of a function run in a worker process by run_profiled, with the stages it recorded there
+class WorkerProfile:
+    def __init__(self, result, events, threads):
+        self.result = result
+        self.events = events
+        self.threads = threads
+
+
+# Runs inside a worker process: profile func on a clock origin shared with the parent, so the
+# worker's stages line up with the parent's on one timeline (perf_counter is system-wide)
+def run_profiled(origin, memory, func, *args, **kwargs):
+    profiler = enable_profiling(memory)
+    profiler.origin = origin
+    result = func(*args, **kwargs)
+    return WorkerProfile(result, profiler.events, profiler.threads)
+
+
+# pool.submit that, with profiling on and a process pool, also records the stages run in the worker;
+# pair it with collect()
+def submit(pool, func, *args, **kwargs):
+    if not active_profiler.enabled or not isinstance(pool, ProcessPoolExecutor):
+        return pool.submit(func, *args, **kwargs)
+    return pool.submit(run_profiled, active_profiler.origin, active_profiler.memory, func, *args, **kwargs)
+
+
+# future.result() of a submit() call, merging any worker stages into the active profile
+def collect(future):
+    result = future.result()
+    if not isinstance(result, WorkerProfile):
+        return result
+    with active_profiler.lock:
+        active_profiler.events.extend(result.events)
+        active_profiler.threads.update(result.threads)
+    return result.result
+
+
+# Rows of a call: the length of its first DataFrame argument, else of a DataFrame it returns
+def call_rows(args, kwargs, result):
+    for value in (*args, *kwargs.values()):
+        if hasattr(value, 'columns') and hasattr(value, '__len__'):
+            return len(value)
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    if hasattr(result, 'columns') and hasattr(result, '__len__'):
+        return len(result)
+    return None
+
+
+# Decorator recording every call of a function as a stage named after it. The first string
+# argument (a table name or file path in this pipeline) is stored as the event's target.
+def profiled(func=None, name=None):
+    if func is None:
+        return functools.partial(profiled, name=name)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not active_profiler.enabled:
+            return func(*args, **kwargs)
+        target = next((value for value in args if isinstance(value, str)), None)
+        details = {'target': target} if target is not None else {}
+        with active_profiler.stage(name or func.__name__, **details) as frame:
+            result = func(*args, **kwargs)
+            if frame['rows'] is None:
+                frame['rows'] = call_rows(args, kwargs, result)
+            return result
+    return wrapper
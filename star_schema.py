@@ -0,0 +1,96 @@
+# In-memory star schema: Sales as the fact table, with Products, Customers and Stores resolved
+# through dense integer row positions. Looking up a dimension attribute for every Sales row is
+# then an array gather (take) instead of a hash merge, and only requested columns are built.
+import numpy as np
+import pandas as pd
+
+# Dimension table -> the key column it shares with the fact table
+dimension_keys = {"Products": 'ProductKey', "Customers": 'CustomerKey', "Stores": 'StoreKey'}
+
+# Natural keys get a direct lookup table (one slot per key value between the smallest and
+# largest key) unless that table would exceed both limits; sparser keys are hashed instead
+max_lookup_density = 16
+max_lookup_slots = 1 << 22
+
+
+# Dense surrogate key of every fact row: the row position of its dimension row, -1 when the
+# dimension has no row for that key (the NaN rows of a left merge)
+def surrogate_keys(fact_keys, key_values):
+    # Widen first so that key arithmetic cannot overflow a downcast int8/int16 column
+    fact_keys = np.asarray(fact_keys, dtype=np.int64)
+    keys = np.asarray(key_values, dtype=np.int64)
+    if len(keys) == 0:
+        return np.full(len(fact_keys), -1, dtype=np.intp)
+    if pd.Series(keys).duplicated().any():
+        raise ValueError("Dimension keys must be unique")
+    low, high = int(keys.min()), int(keys.max())
+    span = high - low + 1
+    if span > max(max_lookup_density * len(keys), max_lookup_slots):
+        return pd.Index(keys).get_indexer(fact_keys).astype(np.intp)
+
+    # Direct lookup table indexed by key - low; the extra last slot (-1) catches every fact
+    # key outside [low, high]
+    lookup = np.full(span + 1, -1, dtype=np.intp)
+    lookup[keys - low] = np.arange(len(keys))
+    offsets = fact_keys - low
+    offsets[(offsets < 0) | (offsets >= span)] = span
+    return lookup.take(offsets)
+
+
+class StarSchema:
+    def __init__(self, fact, dimensions):
+        self.fact = fact
+        self.dimensions = {name: df for name, df in dimensions.items() if name in dimension_keys}
+        self.positions = {}  # dimension -> surrogate key per fact row, built on first use
+        self.columns = {}  # (dimension, column) -> gathered Series, built on first use
+
+    @classmethod
+    def from_tables(cls, data_frames, fact_table="Sales"):
+        return cls(data_frames[fact_table], {name: df for name, df in data_frames.items() if name != fact_table})
+
+    def surrogate(self, dimension):
+        if dimension not in self.positions:
+            key = dimension_keys[dimension]
+            self.positions[dimension] = surrogate_keys(self.fact[key].to_numpy(),
+                                                       self.dimensions[dimension][key].to_numpy())
+        return self.positions[dimension]
+
+    # Which table a requested column comes from: "Table.Column" names it explicitly, otherwise
+    # fact columns win and a dimension column must exist in exactly one dimension
+    def resolve(self, name):
+        table, _, column = name.rpartition('.')
+        if table:
+            if table not in self.dimensions or column not in self.dimensions[table].columns:
+                raise KeyError(f"No column {column!r} in {table}")
+            return table, column
+        if name in self.fact.columns:
+            return None, name
+        owners = [table for table, df in self.dimensions.items() if name in df.columns]
+        if not owners:
+            raise KeyError(f"No column {name!r} in the fact table or its dimensions")
+        if len(owners) > 1:
+            raise KeyError(f"Column {name!r} is in {', '.join(owners)}; ask for 'Table.{name}'")
+        return owners[0], name
+
+    # One dimension attribute for every fact row, aligned with the fact index
+    def gather(self, dimension, column):
+        if (dimension, column) not in self.columns:
+            positions = self.surrogate(dimension)
+            series = self.dimensions[dimension][column]
+            # -1 positions become missing values, as in a left merge (ints widen to float)
+            allow_fill = bool((positions < 0).any())
+            if isinstance(series.dtype, np.dtype):
+                taken = pd.api.extensions.take(series.to_numpy(), positions, allow_fill=allow_fill)
+            else:
+                taken = series.array.take(positions, allow_fill=allow_fill)
+            self.columns[(dimension, column)] = pd.Series(taken, index=self.fact.index, name=column)
+        return self.columns[(dimension, column)]
+
+    # Wide Sales view with only the requested columns, the equivalent of left-merging the
+    # dimensions onto Sales and selecting those columns
+    def view(self, columns):
+        data = {}
+        for name in columns:
+            table, column = self.resolve(name)
+            data[name] = self.fact[column] if table is None else self.gather(table, column)
+        return pd.DataFrame(data, index=self.fact.index, copy=False)
@@ -0,0 +1,236 @@
+# Storage backends: the MySQL server used in production plus embedded SQLite and DuckDB engines,
+# so loads and queries can be run and compared locally with no database service running.
+# Each backend translates the MySQL DDL, upserts and analytical queries into its own dialect.
+import datetime
+import re
+import sqlite3
+
+try:
+    import mysql.connector
+    from mysql.connector import pooling
+except ImportError:
+    mysql = None
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# sqlite3 has no built-in adapters for dates on newer Pythons; store them as ISO text
+sqlite3.register_adapter(datetime.date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda value: value.isoformat(' '))
+
+
+# Shared SQL generation, written for the ON CONFLICT dialect of SQLite and DuckDB
+class StorageBackend:
+    name = None
+    placeholder = '?'
+    quote_char = '`'
+    # Embedded engines have a single writer, so parallel loaders collapse to one connection
+    max_writers = 1
+    insert_modes = ['row', 'executemany', 'batch']
+    max_parameters = 32766
+    supports_partitioning = False
+    supports_asof_join = False
+    error = Exception
+
+    def quote(self, identifier):
+        return f"{self.quote_char}{identifier}{self.quote_char}"
+
+    def translate_ddl(self, ddl):
+        return ddl
+
+    def translate_query(self, sql):
+        return sql
+
+    def upsert_statement(self, table_name, columns, key_columns, update_columns, row_count=1):
+        column_list = ', '.join(self.quote(col) for col in columns)
+        placeholders = '(' + ', '.join([self.placeholder] * len(columns)) + ')'
+        return (f"INSERT INTO {table_name} ({column_list}) "
+                f"VALUES {', '.join([placeholders] * row_count)}"
+                f"{self.upsert_clause(key_columns, update_columns)}")
+
+    def upsert_clause(self, key_columns, update_columns):
+        if not key_columns or not update_columns:
+            return ''
+        keys = ', '.join(self.quote(col) for col in key_columns)
+        updates = ', '.join(f"{self.quote(col)} = excluded.{self.quote(col)}" for col in update_columns)
+        return f" ON CONFLICT ({keys}) DO UPDATE SET {updates}"
+
+    # Names of the secondary indexes on a table (automatic primary key indexes excluded)
+    def index_names(self, cursor, table_name):
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                       (table_name,))
+        return {row[0] for row in cursor.fetchall()}
+
+    # Query plan as lines of text, one per plan step
+    def query_plan(self, cursor, sql):
+        cursor.execute(f"EXPLAIN QUERY PLAN {self.translate_query(sql)}")
+        return [row[-1] for row in cursor.fetchall()]
+
+    def connect(self, **options):
+        try:
+            conn = self.open_connection()
+            print(f"Connected to {self.name} database {self.path}")
+            return conn, conn.cursor()
+        except self.error as e:
+            print(f"Error connecting to {self.name}: {e}")
+            return None, None
+
+    def close(self, conn, cursor):
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+        print(f"{self.name} connection is closed")
+
+    def create_pool(self, size, **options):
+        return EmbeddedPool(self)
+
+
+# Stand-in for a connection pool on embedded engines: every caller gets its own connection
+class EmbeddedPool:
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get_connection(self):
+        return self.backend.open_connection()
+
+
+class MySQLBackend(StorageBackend):
+    name = 'mysql'
+    placeholder = '%s'
+    max_writers = 32
+    insert_modes = ['row', 'executemany', 'batch', 'infile']
+    max_parameters = 1 << 20
+    supports_partitioning = True
+
+    def __init__(self, config):
+        self.config = config
+        self.path = config.get('database')
+        self.error = mysql.connector.Error if mysql else Exception
+
+    def upsert_clause(self, key_columns, update_columns):
+        updates = ', '.join(f"{self.quote(col)} = VALUES({self.quote(col)})" for col in update_columns)
+        return f" ON DUPLICATE KEY UPDATE {updates}"
+
+    def index_names(self, cursor, table_name):
+        cursor.execute("SELECT DISTINCT INDEX_NAME FROM information_schema.STATISTICS "
+                       "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME <> 'PRIMARY'",
+                       (table_name,))
+        return {row[0] for row in cursor.fetchall()}
+
+    # One line per table access: the table and the index (key) it reads through
+    def query_plan(self, cursor, sql):
+        cursor.execute(f"EXPLAIN {sql}")
+        rows = [dict(zip(cursor.column_names, row)) for row in cursor.fetchall()]
+        return [f"{row['table']}: key={row['key']} type={row['type']} rows={row['rows']}" for row in rows]
+
+    def connect(self, allow_local_infile=False, **options):
+        try:
+            conn = mysql.connector.connect(**self.config, allow_local_infile=allow_local_infile)
+            if conn.is_connected():
+                print("Connected to MySQL database")
+                return conn, conn.cursor()
+        except self.error as e:
+            print(f"Error connecting to MySQL: {e}")
+        return None, None
+
+    def close(self, conn, cursor):
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+        print("MySQL connection is closed")
+
+    def create_pool(self, size, allow_local_infile=False, **options):
+        return pooling.MySQLConnectionPool(pool_name='data_spark', pool_size=size, **self.config,
+                                           allow_local_infile=allow_local_infile)
+
+
+class SQLiteBackend(StorageBackend):
+    name = 'sqlite'
+    error = sqlite3.Error
+
+    def __init__(self, path='data_spark.sqlite'):
+        self.path = path
+        # A named shared-cache database lets every connection see the same in-memory tables;
+        # the first connection is kept open so the database outlives the loaders
+        self.target = 'file:data_spark?mode=memory&cache=shared' if path == ':memory:' else path
+        self.keep_alive = self.open_connection() if path == ':memory:' else None
+
+    def open_connection(self):
+        conn = sqlite3.connect(self.target, uri=self.target.startswith('file:'), check_same_thread=False)
+        conn.execute('PRAGMA foreign_keys = ON')
+        return conn
+
+    # SQLite has no CREATE OR REPLACE VIEW; keep an existing view instead
+    def translate_ddl(self, ddl):
+        return re.sub(r'CREATE\s+OR\s+REPLACE\s+VIEW', 'CREATE VIEW IF NOT EXISTS', ddl, flags=re.I)
+
+    def translate_query(self, sql):
+        sql = re.sub(r"DATE_FORMAT\(\s*([^,]+?)\s*,\s*('[^']*')\s*\)", r"strftime(\2, \1)", sql, flags=re.I)
+        sql = re.sub(r"DATEDIFF\(\s*([^,]+?)\s*,\s*([^)]+?)\s*\)", r"(julianday(\1) - julianday(\2))", sql, flags=re.I)
+        sql = re.sub(r"EXTRACT\(\s*(YEAR|MONTH)\s+FROM\s+([^)]+?)\s*\)",
+                     lambda m: f"CAST(strftime('%{'Y' if m.group(1).upper() == 'YEAR' else 'm'}', {m.group(2)}) AS INTEGER)",
+                     sql, flags=re.I)
+        return sql
+
+
+class DuckDBBackend(StorageBackend):
+    name = 'duckdb'
+    quote_char = '"'
+    insert_modes = ['row', 'executemany', 'batch', 'infile']
+    supports_asof_join = True
+
+    def __init__(self, path='data_spark.duckdb'):
+        if duckdb is None:
+            raise ImportError("The duckdb backend needs the duckdb package (pip install duckdb)")
+        self.path = path
+        self.error = duckdb.Error
+        self.root = duckdb.connect(path)
+
+    # Cursors of one DuckDB connection are independent connections to the same database
+    def open_connection(self):
+        return self.root.cursor()
+
+    def translate_ddl(self, ddl):
+        return ddl.replace('`', '"')
+
+    def index_names(self, cursor, table_name):
+        cursor.execute("SELECT index_name FROM duckdb_indexes() WHERE table_name = ?", (table_name,))
+        return {row[0] for row in cursor.fetchall()}
+
+    def query_plan(self, cursor, sql):
+        cursor.execute(f"EXPLAIN {self.translate_query(sql)}")
+        return [line for row in cursor.fetchall() for line in row[1].splitlines()]
+
+    def translate_query(self, sql):
+        sql = sql.replace('`', '"')
+        sql = re.sub(r"DATE_FORMAT\(\s*([^,]+?)\s*,\s*('[^']*')\s*\)", r"strftime(\1, \2)", sql, flags=re.I)
+        sql = re.sub(r"DATEDIFF\(\s*([^,]+?)\s*,\s*([^)]+?)\s*\)", r"date_diff('day', \2, \1)", sql, flags=re.I)
+        return sql
+
+    # Fast path for the 'infile' mode: DuckDB scans the DataFrame directly
+    def bulk_upsert(self, cursor, table_name, df, key_columns, update_columns):
+        column_list = ', '.join(self.quote(col) for col in df.columns)
+        cursor.register('staging_frame', df)
+        try:
+            cursor.execute(f"INSERT INTO {table_name} ({column_list}) SELECT {column_list} FROM staging_frame"
+                           f"{self.upsert_clause(key_columns, update_columns)}")
+        finally:
+            cursor.unregister('staging_frame')
+
+
+backend_names = ['mysql', 'sqlite', 'duckdb']
+
+
+# Build a backend by name; path is the database file for the embedded engines
+def get_backend(name, mysql_config=None, path=None):
+    if name == 'mysql':
+        return MySQLBackend(mysql_config)
+    if name == 'sqlite':
+        return SQLiteBackend(path or 'data_spark.sqlite')
+    if name == 'duckdb':
+        return DuckDBBackend(path or 'data_spark.duckdb')
+    raise ValueError(f"Unknown storage backend {name!r}, expected one of {backend_names}")
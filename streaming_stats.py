@@ -0,0 +1,312 @@
+# One-pass, mergeable summary statistics for tables read in chunks (CSV chunks, SQL cursor
+# batches or slices handled by parallel workers). Gives what eda_summary prints: count, mean,
+# std, min/max, approximate quantiles, pairwise correlations and approximate distinct counts.
+import copy
+import datetime
+import decimal
+
+import numpy as np
+import pandas as pd
+
+quantile_levels = [0.25, 0.5, 0.75]
+
+
+# Mergeable quantile sketch (a simplified KLL sketch): values live in levels of at most k
+# items, an item on level h standing for 2**h values. A full level is sorted and every other
+# item moves up a level, so memory stays O(k log n) and rank error is about 1/k. Below k values
+# the quantiles are exact.
+class QuantileSketch:
+    def __init__(self, k=2048, seed=0):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        self.levels[0] = np.concatenate([self.levels[0], np.asarray(values, dtype=np.float64)])
+        self.compact()
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.compact()
+
+    def compact(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) > self.k:
+                items = np.sort(items)
+                # An odd item out stays on this level; the rest is halved with a random offset
+                keep, items = items[len(items) - len(items) % 2:], items[:len(items) - len(items) % 2]
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], items[self.rng.integers(2)::2]])
+                self.levels[level] = keep
+            level += 1
+
+    def quantiles(self, levels):
+        if len(self.levels) == 1:
+            return np.quantile(self.levels[0], levels) if len(self.levels[0]) else np.full(len(levels), np.nan)
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items_), 2.0 ** level) for level, items_ in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        items, weights = items[order], weights[order]
+        ranks = np.cumsum(weights) - weights / 2
+        return np.interp(np.asarray(levels) * weights.sum(), ranks, items)
+
+
+# HyperLogLog distinct counter with 2**p registers (about 1.04 / sqrt(2**p) relative error).
+# Until exact_limit distinct values have been seen their hashes are kept, so small columns get
+# exact counts.
+class DistinctCounter:
+    def __init__(self, p=14, exact_limit=1 << 16):
+        self.p = p
+        self.exact_limit = exact_limit
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+        self.exact = np.empty(0, dtype=np.uint64)
+
+    def update(self, values):
+        hashes = pd.util.hash_array(np.asarray(values))
+        if self.exact is not None:
+            self.exact = np.union1d(self.exact, hashes)
+            if len(self.exact) > self.exact_limit:
+                self.exact = None
+        # Register from the top p bits, rank = position of the first 1 in the remaining bits
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.intp)
+        rest = hashes & np.uint64((1 << (64 - self.p)) - 1)
+        rank = np.full(len(hashes), 64 - self.p + 1, dtype=np.uint8)
+        nonzero = rest > 0
+        rank[nonzero] = (64 - self.p - np.floor(np.log2(rest[nonzero].astype(np.float64)))).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        if self.exact is not None and other.exact is not None:
+            self.exact = np.union1d(self.exact, other.exact)
+            if len(self.exact) > self.exact_limit:
+                self.exact = None
+        else:
+            self.exact = None
+
+    def count(self):
+        if self.exact is not None:
+            return len(self.exact)
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(2.0 ** -self.registers.astype(np.float64))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)  # linear counting for small cardinalities
+        return int(round(estimate))
+
+
+# Uniform random sample of at most size values by bottom-k sampling: every value gets a random
+# key and the size smallest keys are kept. Reproducible for a given seed, and mergeable (give
+# each worker its own seed).
+class ReservoirSample:
+    def __init__(self, size=50000, seed=0):
+        self.size = size
+        self.rng = np.random.default_rng(seed)
+        self.values = np.empty(0)
+        self.keys = np.empty(0)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        self.keep(np.concatenate([self.values, values]), np.concatenate([self.keys, self.rng.random(len(values))]))
+
+    def merge(self, other):
+        self.keep(np.concatenate([self.values, other.values]), np.concatenate([self.keys, other.keys]))
+
+    def keep(self, values, keys):
+        if len(keys) > self.size:
+            kept = np.argpartition(keys, self.size)[:self.size]
+            values, keys = values[kept], keys[kept]
+        self.values, self.keys = values, keys
+
+
+# Gaussian kernel density of a sample on grid, with Scott's bandwidth as seaborn's kdeplot uses;
+# None when the sample is too small or constant to fit one
+def gaussian_kde(sample, grid, grid_chunk=16):
+    n = len(sample)
+    if n < 2 or np.std(sample) == 0:
+        return None
+    bandwidth = np.std(sample, ddof=1) * n ** (-1 / 5)
+    density = np.empty(len(grid))
+    for start in range(0, len(grid), grid_chunk):
+        z = (grid[start:start + grid_chunk, None] - sample[None, :]) / bandwidth
+        density[start:start + grid_chunk] = np.exp(-0.5 * z * z).sum(axis=1)
+    return density / (n * bandwidth * np.sqrt(2 * np.pi))
+
+
+# Column kinds: 'number' columns get moments, quantiles and correlations, 'datetime' columns
+# moments and quantiles over their timestamps, every column a count and a distinct count
+def column_kind(series):
+    if pd.api.types.is_bool_dtype(series):
+        return 'other'
+    if pd.api.types.is_numeric_dtype(series):
+        return 'number'
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return 'datetime'
+    return 'other'
+
+
+# Numeric (or datetime, as int64 nanoseconds) values as float64 with NaN for missing values
+def float_values(series, kind):
+    if kind == 'datetime':
+        values = series.to_numpy(dtype='datetime64[ns]')
+        return np.where(np.isnat(values), np.nan, values.astype(np.int64).astype(np.float64))
+    return series.to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+class StatsAccumulator:
+    def __init__(self, quantile_k=2048, hll_p=14, seed=0):
+        self.quantile_k = quantile_k
+        self.hll_p = hll_p
+        self.seed = seed
+        self.columns = None
+        self.rows = 0
+
+    def start(self, df):
+        self.columns = list(df.columns)
+        self.kinds = {col: column_kind(df[col]) for col in self.columns}
+        self.moment_columns = [col for col in self.columns if self.kinds[col] != 'other']
+        k = len(self.moment_columns)
+        self.counts = {col: 0 for col in self.columns}
+        # Pairwise statistics over the rows where both columns are present, as DataFrame.corr
+        # uses them: n, mean of each column, sum of squared deviations of each column and
+        # co-moment. The diagonal holds each column's own count, mean and M2.
+        self.pair_n = np.zeros((k, k))
+        self.pair_mean = np.zeros((k, k))  # [i, j]: mean of column i over rows with i and j
+        self.pair_m2 = np.zeros((k, k))
+        self.comoment = np.zeros((k, k))
+        self.minimum = np.full(k, np.inf)
+        self.maximum = np.full(k, -np.inf)
+        self.sketches = {col: QuantileSketch(self.quantile_k, self.seed) for col in self.moment_columns}
+        self.distinct = {col: DistinctCounter(self.hll_p) for col in self.columns}
+
+    # Fold one chunk into the statistics
+    def update(self, df):
+        if self.columns is None:
+            self.start(df)
+        self.rows += len(df)
+        for col in self.columns:
+            values = df[col]
+            present = values.notna().to_numpy()
+            self.counts[col] += int(present.sum())
+            # Only the chunk's distinct values are hashed (for categoricals, the used categories)
+            self.distinct[col].update(np.asarray(pd.unique(values[present])))
+
+        if not self.moment_columns or not len(df):
+            return
+        x = np.column_stack([float_values(df[col], self.kinds[col]) for col in self.moment_columns])
+        mask = ~np.isnan(x)
+        for i, col in enumerate(self.moment_columns):
+            if mask[:, i].any():
+                present = x[mask[:, i], i]
+                self.minimum[i] = min(self.minimum[i], present.min())
+                self.maximum[i] = max(self.maximum[i], present.max())
+                self.sketches[col].update(present)
+
+        # Shift by the chunk means first so the sums of products do not lose precision
+        m = mask.astype(np.float64)
+        counts = m.sum(axis=0)
+        shift = np.divide(np.nansum(x, axis=0), counts, out=np.zeros_like(counts), where=counts > 0)
+        centered = np.where(mask, x - shift, 0.0)
+        n = m.T @ m
+        sums = centered.T @ m  # [i, j]: sum of column i over rows where j is present
+        squares = (centered * centered).T @ m
+        products = centered.T @ centered
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = np.where(n > 0, sums / n, 0.0)
+            m2 = np.where(n > 0, squares - sums * mean, 0.0)
+            comoment = np.where(n > 0, products - sums * mean.T, 0.0)
+        self.combine(n, mean + shift[:, None], m2, comoment)
+
+    # Chan et al. pairwise update of (n, mean, M2, co-moment) with another partial result
+    def combine(self, n, mean, m2, comoment):
+        total = self.pair_n + n
+        with np.errstate(invalid='ignore', divide='ignore'):
+            delta = mean - self.pair_mean
+            weight = np.where(total > 0, self.pair_n * n / total, 0.0)
+            self.comoment += comoment + weight * delta * delta.T
+            self.pair_m2 += m2 + weight * delta * delta
+            self.pair_mean += np.where(total > 0, delta * n / total, 0.0)
+        self.pair_n = total
+
+    # Fold in another accumulator's partial result (same columns), e.g. from a parallel worker
+    def merge(self, other):
+        if other.columns is None:
+            return self
+        if self.columns is None:
+            self.__dict__.update(copy.deepcopy(other.__dict__))
+            return self
+        self.rows += other.rows
+        for col in self.columns:
+            self.counts[col] += other.counts[col]
+            self.distinct[col].merge(other.distinct[col])
+        for col in self.moment_columns:
+            self.sketches[col].merge(other.sketches[col])
+        self.minimum = np.minimum(self.minimum, other.minimum)
+        self.maximum = np.maximum(self.maximum, other.maximum)
+        self.combine(other.pair_n, other.pair_mean, other.pair_m2, other.comoment)
+        return self
+
+    # Fold in a batch of rows fetched from a SQL cursor (DECIMAL and DATE values included)
+    def update_rows(self, rows, column_names):
+        df = pd.DataFrame.from_records(rows, columns=column_names)
+        for col in df.columns:
+            sample = df[col].dropna()
+            if len(sample) and isinstance(sample.iloc[0], decimal.Decimal):
+                df[col] = pd.to_numeric(df[col].astype(object), errors='coerce')
+            elif len(sample) and isinstance(sample.iloc[0], (datetime.date, datetime.datetime)):
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+        self.update(df)
+
+    # describe(include='all')-style table: count and unique for every column, mean, std, min,
+    # quantiles and max for numeric and datetime columns
+    def summary(self):
+        index = ['count', 'unique', 'mean', 'std', 'min'] + [f"{q:.0%}" for q in quantile_levels] + ['max']
+        table = pd.DataFrame(index=index, columns=self.columns or [], dtype=object)
+        for col in self.columns or []:
+            table.loc['count', col] = self.counts[col]
+            if self.kinds[col] == 'other':
+                table.loc['unique', col] = self.distinct[col].count()
+                continue
+            i = self.moment_columns.index(col)
+            n = self.pair_n[i, i]
+            values = [self.pair_mean[i, i] if n else np.nan, self.minimum[i] if n else np.nan,
+                      *self.sketches[col].quantiles(quantile_levels), self.maximum[i] if n else np.nan]
+            labels = ['mean', 'min'] + index[5:]
+            if self.kinds[col] == 'datetime':
+                values = [pd.Timestamp(int(value)) if not np.isnan(value) else pd.NaT for value in values]
+            else:
+                table.loc['std', col] = np.sqrt(self.pair_m2[i, i] / (n - 1)) if n > 1 else np.nan
+            for label, value in zip(labels, values):
+                table.loc[label, col] = value
+        return table
+
+    # Pearson correlation of the numeric columns over pairwise-complete rows, as DataFrame.corr
+    def correlation(self):
+        columns = [col for col in self.moment_columns if self.kinds[col] == 'number'] if self.columns else []
+        positions = [self.moment_columns.index(col) for col in columns]
+        c = self.comoment[np.ix_(positions, positions)]
+        m2 = self.pair_m2[np.ix_(positions, positions)]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            corr = c / np.sqrt(m2 * m2.T)
+        corr[(self.pair_n[np.ix_(positions, positions)] < 2)] = np.nan
+        return pd.DataFrame(corr, index=columns, columns=columns)
+
+    def distinct_counts(self):
+        return {col: self.distinct[col].count() for col in self.columns or []}
+
+
+# Accumulate statistics over an executed SQL cursor, fetching batch_size rows at a time
+def accumulate_cursor(cursor, batch_size=10000, stats=None):
+    stats = stats if stats is not None else StatsAccumulator()
+    column_names = [description[0] for description in cursor.description]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return stats
+        stats.update_rows(rows, column_names)
@@ -0,0 +1,256 @@
+# Deterministic synthetic Global Electronics data: the six CSV files main() reads, with the same
+# columns and formats as the real ones (m/d/Y dates, "$1,234.56 " prices, a Latin-1 Customers
+# file, five currencies) and a realistic skew of Sales across products, customers and stores.
+# The same seed and row count always give byte-identical files.
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# Bump whenever the generated data changes, so cached data sets are regenerated
+generator_version = 1
+
+first_order_date = pd.Timestamp('2016-01-01')
+last_order_date = pd.Timestamp('2021-02-20')
+
+# Country -> (currency, continent, share of customers, [(state, state code, city)])
+geography = {
+    'United States': ('USD', 'North America', 0.45, [('California', 'CA', 'Los Angeles'), ('New York', 'NY', 'New York'),
+                                                     ('Texas', 'TX', 'Austin'), ('Florida', 'FL', 'Miami'),
+                                                     ('Illinois', 'IL', 'Chicago'), ('Washington', 'WA', 'Seattle')]),
+    'Canada': ('CAD', 'North America', 0.08, [('Ontario', 'ON', 'Toronto'), ('Quebec', 'QC', 'Montréal'),
+                                              ('British Columbia', 'BC', 'Vancouver')]),
+    'United Kingdom': ('GBP', 'Europe', 0.12, [('England', 'ENG', 'London'), ('Scotland', 'SCT', 'Edinburgh'),
+                                               ('Wales', 'WLS', 'Cardiff')]),
+    'Germany': ('EUR', 'Europe', 0.10, [('Bayern', 'BY', 'München'), ('Berlin', 'BE', 'Berlin'),
+                                        ('Nordrhein-Westfalen', 'NW', 'Köln')]),
+    'France': ('EUR', 'Europe', 0.06, [('Île-de-France', 'IDF', 'Paris'), ('Occitanie', 'OCC', 'Toulouse')]),
+    'Italy': ('EUR', 'Europe', 0.05, [('Lombardia', 'LOM', 'Milano'), ('Lazio', 'LAZ', 'Roma')]),
+    'Netherlands': ('EUR', 'Europe', 0.05, [('Noord-Holland', 'NH', 'Amsterdam'), ('Zuid-Holland', 'ZH', 'Rotterdam')]),
+    'Australia': ('AUD', 'Australia', 0.09, [('New South Wales', 'NSW', 'Sydney'), ('Victoria', 'VIC', 'Melbourne')]),
+}
+
+# Exchange rate per USD on the first day, followed by a small daily random walk
+base_rates = {'USD': 1.0, 'CAD': 1.39, 'AUD': 1.42, 'EUR': 0.92, 'GBP': 0.68}
+
+categories = {
+    'Audio': ['Bluetooth Headphones', 'MP4&MP3', 'Recording Pen'],
+    'Cameras and camcorders': ['Digital Cameras', 'Digital SLR Cameras', 'Camcorders'],
+    'Cell phones': ['Smart phones & PDAs', 'Touch Screen Phones', 'Cell phones Accessories'],
+    'Computers': ['Laptops', 'Desktops', 'Monitors', 'Printers, Scanners & Fax'],
+    'Games and Toys': ['Download Games', 'Boxed Games'],
+    'Home Appliances': ['Washers & Dryers', 'Refrigerators', 'Microwaves', 'Fans'],
+    'Music, Movies and Audio Books': ['Movie DVD'],
+    'TV and Video': ['Televisions', 'Home Theater System', 'Car Video'],
+}
+brands = ['Contoso', 'Wide World Importers', 'Northwind Traders', 'Adventure Works', 'Southridge Video',
+          'Litware', 'Fabrikam', 'Proseware', 'A. Datum', 'The Phone Company', 'Tailspin Toys']
+colors = ['Black', 'White', 'Silver', 'Blue', 'Red', 'Grey', 'Green', 'Pink', 'Orange', 'Brown',
+          'Gold', 'Yellow', 'Purple', 'Azure', 'Silver Grey', 'Transparent']
+first_names = ['Julian', 'Emma', 'Lukas', 'Chloé', 'Oliver', 'Sofia', 'Jürgen', 'Amelia', 'Mateo', 'Zoë',
+               'Noah', 'Léa', 'William', 'Isabella', 'Henrik', 'Grace', 'José', 'Mia', 'Thomas', 'Anaïs']
+last_names = ['Smith', 'Müller', 'Brown', 'Rossi', 'Dubois', 'Jansen', 'Wilson', 'Schäfer', 'Taylor', 'García',
+              'Martin', 'Bianchi', 'Nguyen', 'Côté', 'Walker', 'de Vries', 'Fischer', 'Thompson', 'Lefèvre', 'White']
+
+# Real files: Customers is Latin-1 (accented names and cities), the rest plain ASCII or UTF-8
+file_encodings = {"Customers": 'latin-1'}
+
+
+# m/d/Y text (no zero padding, like the source files) of every value, formatting each distinct
+# day once
+def format_dates(days):
+    codes, uniques = pd.factorize(pd.Series(days))
+    text = np.array([f"{day.month}/{day.day}/{day.year}" for day in pd.DatetimeIndex(uniques)] + [''],
+                    dtype=object)
+    return text[codes]  # missing days (code -1) pick up the trailing ''
+
+
+# "$1,234.56 " text of every price, with the source files' trailing space
+def format_prices(values):
+    return np.array([f"${value:,.2f} " for value in values], dtype=object)
+
+
+def make_stores(rng, countries):
+    rows = [(0, 'Online', 'Online', np.nan, pd.Timestamp('2010-01-01'))]
+    for country in countries:
+        for state, _, _ in geography[country][3]:
+            for _ in range(1 + int(rng.integers(0, 3))):
+                rows.append((len(rows), country, state, int(rng.integers(245, 2106)),
+                             pd.Timestamp('2005-01-01') + pd.Timedelta(days=int(rng.integers(0, 3650)))))
+    stores = pd.DataFrame(rows, columns=['StoreKey', 'Country', 'State', 'Square Meters', 'Open Date'])
+    stores['Square Meters'] = stores['Square Meters'].astype('Int64')
+    return stores
+
+
+def make_products(rng, count=2517):
+    subcategories = [(category, subcategory) for category, names in categories.items() for subcategory in names]
+    category_keys = {category: key for key, category in enumerate(categories, 1)}
+    sub = rng.integers(0, len(subcategories), count)
+    brand = rng.integers(0, len(brands), count)
+    color = rng.integers(0, len(colors), count)
+    # Log-normal costs give a few expensive products and many cheap ones
+    cost = np.round(rng.lognormal(4.5, 1.1, count).clip(0.5, 5000), 2)
+    price = np.round(cost * rng.uniform(1.6, 3.2, count), 2)
+    return pd.DataFrame({
+        'ProductKey': np.arange(1, count + 1),
+        'Product Name': [f"{brands[b]} {subcategories[s][1]} M{key:04d} {colors[c]}"
+                         for key, b, s, c in zip(range(1, count + 1), brand, sub, color)],
+        'Brand': np.array(brands, dtype=object)[brand],
+        'Color': np.array(colors, dtype=object)[color],
+        'Unit Cost USD': format_prices(cost),
+        'Unit Price USD': format_prices(price),
+        'SubcategoryKey': sub + 101,
+        'Subcategory': np.array([name for _, name in subcategories], dtype=object)[sub],
+        'CategoryKey': np.array([category_keys[category] for category, _ in subcategories])[sub],
+        'Category': np.array([category for category, _ in subcategories], dtype=object)[sub],
+    })
+
+
+def make_customers(rng, count):
+    countries = list(geography)
+    shares = np.array([geography[country][2] for country in countries])
+    country = rng.choice(len(countries), count, p=shares / shares.sum())
+    # Sparse, increasing keys, as in the source data
+    keys = np.cumsum(rng.integers(1, 20, count))
+    # One (state, state code, city) per customer within their country
+    sizes = np.array([len(geography[c][3]) for c in countries])
+    place = np.cumsum(sizes)[country] - sizes[country] + (rng.random(count) * sizes[country]).astype(np.int64)
+    places = np.array([row for c in countries for row in geography[c][3]], dtype=object)[place]
+    birthdays = pd.Timestamp('1935-01-01') + pd.to_timedelta(rng.integers(0, 67 * 365, count), unit='D')
+    return pd.DataFrame({
+        'CustomerKey': keys,
+        'Gender': np.where(rng.random(count) < 0.5, 'Male', 'Female'),
+        'Name': (pd.Series(np.array(first_names, dtype=object)[rng.integers(0, len(first_names), count)]) + ' '
+                 + pd.Series(np.array(last_names, dtype=object)[rng.integers(0, len(last_names), count)])).to_numpy(),
+        'City': places[:, 2],
+        'State Code': places[:, 1],
+        'State': places[:, 0],
+        'Zip Code': rng.integers(10000, 99999, count).astype(str),
+        'Country': np.array(countries, dtype=object)[country],
+        'Continent': np.array([geography[c][1] for c in countries], dtype=object)[country],
+        'Birthday': format_dates(birthdays),
+    })
+
+
+def make_exchange_rates(rng):
+    days = pd.date_range(first_order_date - pd.Timedelta(days=365), last_order_date, freq='D')
+    frames = []
+    for currency, base in base_rates.items():
+        walk = np.ones(len(days)) if currency == 'USD' else np.exp(np.cumsum(rng.normal(0, 0.004, len(days))))
+        frames.append(pd.DataFrame({'Date': format_dates(days), 'Currency': currency,
+                                    'Exchange': np.round(base * walk, 4)}))
+    return pd.concat(frames, ignore_index=True)
+
+
+# Sales lines grouped into orders of 1-7 lines. Every order has one customer, store, day and
+# currency; customers, products and stores follow heavy-tailed popularity, and about a fifth of
+# orders are placed online (StoreKey 0), the only ones with a Delivery Date.
+def make_sales(rng, rows, customers, products, stores):
+    lines_per_order = np.minimum(rng.geometric(0.45, rows), 7)
+    order_of_line = np.repeat(np.arange(rows), lines_per_order)[:rows]
+    orders = int(order_of_line[-1]) + 1 if rows else 0
+    line_item = np.arange(rows) - np.searchsorted(order_of_line, order_of_line)
+
+    # Orders are numbered in date order, with business growing over time
+    span = (last_order_date - first_order_date).days + 1
+    day = np.sort((rng.power(1.6, orders) * span).astype(np.int64))
+    order_date = first_order_date + pd.to_timedelta(day, unit='D')
+
+    customer_weights = rng.lognormal(0, 1.2, len(customers))
+    customer = rng.choice(len(customers), orders, p=customer_weights / customer_weights.sum())
+    countries = list(geography)
+    customer_country = pd.Index(countries).get_indexer(customers['Country'])[customer]
+
+    online = rng.random(orders) < 0.2
+    store_key = np.zeros(orders, dtype=np.int64)
+    for code, country in enumerate(countries):
+        local = stores[stores['Country'] == country]
+        in_country = ~online & (customer_country == code)
+        if not len(local):
+            online |= in_country
+            continue
+        size = local['Square Meters'].to_numpy(dtype=np.float64)
+        store_key[in_country] = rng.choice(local['StoreKey'].to_numpy(), int(in_country.sum()), p=size / size.sum())
+    delivery = np.where(online, rng.integers(2, 11, orders), -1)
+
+    # Zipf-like product popularity over a random ranking of the products
+    ranks = rng.permutation(len(products)) + 1
+    product_weights = 1.0 / ranks ** 0.7
+    product = rng.choice(products['ProductKey'].to_numpy(), rows, p=product_weights / product_weights.sum())
+    currency = np.array([geography[country][0] for country in countries], dtype=object)
+
+    delivery_date = pd.Series(order_date + pd.to_timedelta(delivery, unit='D')).where(delivery >= 0)
+    return pd.DataFrame({
+        'Order Number': order_of_line + 366000,
+        'Line Item': line_item,
+        'Order Date': format_dates(order_date)[order_of_line],
+        'Delivery Date': format_dates(delivery_date)[order_of_line],
+        'CustomerKey': customers['CustomerKey'].to_numpy()[customer][order_of_line],
+        'StoreKey': store_key[order_of_line],
+        'ProductKey': product,
+        'Quantity': np.minimum(rng.geometric(0.45, rows), 10),
+        'Currency Code': currency[customer_country][order_of_line],
+    })
+
+
+def make_data_dictionary(tables):
+    return pd.DataFrame([(table, column, f"{column} of the {table} table")
+                         for table, df in tables.items() for column in df.columns],
+                        columns=['Table', 'Field', 'Description'])
+
+
+# Every table as the raw text columns of its CSV file. customers defaults to one per four Sales
+# rows (about the ratio of the real data).
+def generate_tables(sales_rows, seed=0, customers=None):
+    rng = np.random.default_rng(seed)
+    customers_df = make_customers(rng, customers or max(1000, sales_rows // 4))
+    products = make_products(rng)
+    stores = make_stores(rng, list(geography))
+    sales = make_sales(rng, sales_rows, customers_df, products, stores)
+    stores['Open Date'] = format_dates(stores['Open Date'])
+    tables = {"Sales": sales, "Customers": customers_df, "Products": products,
+              "Exchange_Rates": make_exchange_rates(rng), "Stores": stores}
+    tables["Data_Dictionary"] = make_data_dictionary(tables)
+    return tables
+
+
+# Write the six CSV files to output_dir (skipped when it already holds this data set) and return
+# their paths keyed by table, as main() expects them
+def write_tables(output_dir, sales_rows, seed=0, customers=None):
+    manifest_path = os.path.join(output_dir, 'manifest.json')
+    manifest = {'generator_version': generator_version, 'sales_rows': sales_rows, 'seed': seed,
+                'customers': customers}
+    paths = {table: os.path.join(output_dir, f"{table}.csv")
+             for table in ("Sales", "Customers", "Products", "Exchange_Rates", "Data_Dictionary", "Stores")}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            if json.load(f) == manifest and all(os.path.exists(path) for path in paths.values()):
+                return paths
+    except (OSError, ValueError):
+        pass
+
+    os.makedirs(output_dir, exist_ok=True)
+    for table, df in generate_tables(sales_rows, seed, customers).items():
+        df.to_csv(paths[table], index=False, encoding=file_encodings.get(table, 'utf-8'))
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate synthetic Global Electronics CSV files')
+    parser.add_argument('--sales-rows', type=int, default=62884,
+                        help='Sales lines to generate (default: 62,884, the size of the real data)')
+    parser.add_argument('--customers', type=int, default=None,
+                        help='Customers to generate (default: one per four Sales rows, at least 1,000)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default: 0)')
+    parser.add_argument('--output', default='data', help='Directory for the CSV files (default: data)')
+    args = parser.parse_args(argv)
+    paths = write_tables(args.output, args.sales_rows, args.seed, args.customers)
+    print(f"Wrote {len(paths)} tables with {args.sales_rows:,} Sales rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
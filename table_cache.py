@@ -0,0 +1,86 @@
+# On-disk cache of cleaned tables, keyed by the source file fingerprint
+import glob
+import hashlib
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (Parquet support for pandas)
+    cache_format = 'parquet'
+except ImportError:
+    cache_format = 'pickle'
+
+table_cache_dir = os.path.join('.dataspark_cache', 'tables')
+default_max_bytes = 2 * 1024 ** 3
+
+
+# Fingerprint a source file by path, size and mtime (or by its contents when hash_contents is
+# True), plus the cleaning-logic version and any options that change the parsed result
+def source_fingerprint(path, cleaning_version, hash_contents=False, **options):
+    stat = os.stat(path)
+    digest = hashlib.sha256()
+    digest.update(f"{os.path.abspath(path)}|{stat.st_size}|v{cleaning_version}".encode())
+    if hash_contents:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    else:
+        digest.update(str(stat.st_mtime_ns).encode())
+    for key in sorted(options):
+        digest.update(f"|{key}={options[key]}".encode())
+    return digest.hexdigest()[:20]
+
+
+def cache_path(table_name, fingerprint):
+    extension = 'parquet' if cache_format == 'parquet' else 'pkl'
+    return os.path.join(table_cache_dir, f"{table_name}-{fingerprint}.{extension}")
+
+
+# Return the cached cleaned table for this fingerprint, or None on a miss
+def load_cached_table(table_name, fingerprint):
+    path = cache_path(table_name, fingerprint)
+    if not os.path.exists(path):
+        return None
+    try:
+        df = pd.read_parquet(path) if cache_format == 'parquet' else pd.read_pickle(path)
+    except Exception as e:
+        print(f"Ignoring unreadable cache entry {path}: {e}")
+        return None
+    # Touch the entry so eviction treats it as recently used
+    os.utime(path)
+    return df
+
+
+# Store a cleaned table, replacing older entries for the same table
+def store_cached_table(table_name, fingerprint, df):
+    os.makedirs(table_cache_dir, exist_ok=True)
+    path = cache_path(table_name, fingerprint)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        if cache_format == 'parquet':
+            df.to_parquet(tmp_path, index=False)
+        else:
+            df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Could not cache {table_name}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return
+    for stale in glob.glob(os.path.join(table_cache_dir, f"{table_name}-*")):
+        if stale != path and not stale.endswith('.tmp'):
+            os.remove(stale)
+
+
+# Delete least recently used entries until the cache fits in max_bytes
+def evict_cache(max_bytes=default_max_bytes):
+    entries = [(os.stat(path), path) for path in glob.glob(os.path.join(table_cache_dir, '*'))
+               if not path.endswith('.tmp')]
+    total = sum(stat.st_size for stat, _ in entries)
+    for stat, path in sorted(entries, key=lambda entry: entry[0].st_mtime):
+        if total <= max_bytes:
+            break
+        os.remove(path)
+        total -= stat.st_size
+        print(f"Evicted {os.path.basename(path)} from the table cache.")
@@ -0,0 +1,85 @@
+# Secondary indexes (on Sales and Exchange_Rates) and optional year partitioning for the Sales
+# fact table. The tables are created with only their primary key; the secondary indexes are
+# built once the bulk load has finished, so inserts do not have to maintain them row by row.
+import re
+import time
+
+secondary_indexes = {
+    "Sales": {
+        # Covers the quantity-per-product queries without touching the table rows
+        'idx_sales_product_quantity': ['ProductKey', 'Quantity'],
+        'idx_sales_customer': ['CustomerKey'],
+        'idx_sales_store': ['StoreKey'],
+        'idx_sales_order_date': ['Order Date'],
+    },
+    # Seek target of the as-of rate lookup: latest Date <= Order Date for one Currency
+    "Exchange_Rates": {
+        'idx_exchange_rates_currency_date': ['Currency', 'Date'],
+    }
+}
+
+
+# Build the missing secondary indexes of a table; returns the names that were created
+def create_secondary_indexes(cursor, backend, table_name):
+    existing = backend.index_names(cursor, table_name)
+    created = []
+    for index_name, columns in secondary_indexes.get(table_name, {}).items():
+        if index_name in existing:
+            continue
+        start = time.perf_counter()
+        try:
+            cursor.execute(f"CREATE INDEX {index_name} ON {table_name} "
+                           f"({', '.join(backend.quote(col) for col in columns)})")
+        except backend.error as err:
+            print(f"Error creating index {index_name} on {table_name}: {err}")
+            continue
+        created.append(index_name)
+        print(f"Built index {index_name} on {table_name} in {time.perf_counter() - start:.2f}s.")
+    return created
+
+
+# Drop the secondary indexes of a table before a full reload. MySQL keeps an index that a
+# FOREIGN KEY depends on, which is reported and left in place.
+def drop_secondary_indexes(cursor, backend, table_name):
+    existing = backend.index_names(cursor, table_name)
+    for index_name in secondary_indexes.get(table_name, {}):
+        if index_name not in existing:
+            continue
+        try:
+            if backend.name == 'mysql':
+                cursor.execute(f"DROP INDEX {index_name} ON {table_name}")
+            else:
+                cursor.execute(f"DROP INDEX {index_name}")
+            print(f"Dropped index {index_name} on {table_name} until the load finishes.")
+        except backend.error as err:
+            print(f"Keeping index {index_name} on {table_name}: {err}")
+
+
+# Rewrite the Sales DDL for RANGE partitioning by order year (MySQL only). MySQL requires the
+# partitioning column in every unique key and does not allow foreign keys on partitioned
+# tables, so `Order Date` joins the primary key and the FOREIGN KEY clauses are dropped.
+def partition_by_order_year(ddl, first_year, last_year):
+    ddl = re.sub(r',(\s*--[^\n]*)?\s*FOREIGN KEY\s*\([^)]*\)\s*REFERENCES\s+\w+\s*\([^)]*\)', '', ddl)
+    ddl = ddl.replace('PRIMARY KEY (`Order Number`, `Line Item`)',
+                      'PRIMARY KEY (`Order Number`, `Line Item`, `Order Date`)')
+    partitions = [f"PARTITION p{year} VALUES LESS THAN ({year + 1})" for year in range(first_year, last_year + 1)]
+    partitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+    partition_list = ',\n            '.join(partitions)
+    return (ddl.rstrip().rstrip(';') +
+            f"\n        PARTITION BY RANGE (YEAR(`Order Date`)) (\n            {partition_list}\n        );")
+
+
+# EXPLAIN every query and print which secondary indexes its plan reads through.
+# Returns {title: [index names]}; an empty list means the query scans the tables.
+def index_usage_report(cursor, backend, queries):
+    index_names = [name for indexes in secondary_indexes.values() for name in indexes]
+    usage = {}
+    for title, sql in queries:
+        try:
+            plan = '\n'.join(backend.query_plan(cursor, sql))
+        except backend.error as err:
+            print(f"{title}: could not EXPLAIN ({str(err).splitlines()[0]})")
+            continue
+        usage[title] = [name for name in index_names if re.search(rf'\b{name}\b', plan)]
+        print(f"{title}: {', '.join(usage[title]) if usage[title] else 'no secondary index (full scan)'}")
+    return usage
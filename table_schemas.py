@@ -0,0 +1,79 @@
+# Compact in-memory column types for each table, matching the DDL in create_table.
+#   int      - INT columns, downcast to the smallest width that holds the data
+#              (nullable Int8..Int64 when the column has missing values)
+#   float    - DECIMAL columns
+#   category - low-cardinality VARCHAR columns
+#   str      - free-text VARCHAR/TEXT columns, left as parsed
+#   date     - DATE columns, already normalized to datetime64 by clean_table
+import numpy as np
+import pandas as pd
+
+table_schemas = {
+    "Sales": {
+        'Order Number': 'int', 'Line Item': 'int', 'Order Date': 'date', 'Delivery Date': 'date',
+        'CustomerKey': 'int', 'StoreKey': 'int', 'ProductKey': 'int', 'Quantity': 'int',
+        'Currency Code': 'category'
+    },
+    "Customers": {
+        'CustomerKey': 'int', 'Gender': 'category', 'Name': 'str', 'City': 'str', 'State': 'category',
+        'State Code': 'category', 'Zip Code': 'str', 'Country': 'category', 'Continent': 'category',
+        'Birthday': 'date'
+    },
+    "Products": {
+        'ProductKey': 'int', 'Product Name': 'str', 'Brand': 'category', 'Color': 'category',
+        'Unit Cost USD': 'float', 'Unit Price USD': 'float', 'SubcategoryKey': 'int',
+        'Subcategory': 'category', 'CategoryKey': 'int', 'Category': 'category'
+    },
+    "Exchange_Rates": {
+        'Date': 'date', 'Currency': 'category', 'Exchange': 'float'
+    },
+    "Data_Dictionary": {
+        'Table': 'str', 'Field': 'str', 'Description': 'str'
+    },
+    "Stores": {
+        'StoreKey': 'int', 'Country': 'category', 'State': 'category', 'Square Meters': 'int',
+        'Open Date': 'date'
+    }
+}
+
+
+# Smallest (nullable when needed) integer dtype that holds every value of the series, or None
+# when the series has non-integral values
+def smallest_int_dtype(series):
+    values = series.dropna()
+    nullable = len(values) < len(series)
+    if len(values) and not (values == np.floor(values)).all():
+        return None
+    low, high = (values.min(), values.max()) if len(values) else (0, 0)
+    for bits in (8, 16, 32, 64):
+        info = np.iinfo(f'int{bits}')
+        if info.min <= low and high <= info.max:
+            return f'Int{bits}' if nullable else f'int{bits}'
+    return None
+
+
+# Convert the columns of a cleaned table to their compact dtypes, one column at a time.
+# Missing values stay as NaN/NaT/<NA>; insert_data swaps them for None per batch at bind time.
+def apply_schema(table_name, df, report=True):
+    schema = table_schemas.get(table_name)
+    if schema is None:
+        return df
+    before = df.memory_usage(deep=True).sum()
+
+    for col, kind in schema.items():
+        if col not in df.columns:
+            continue
+        if kind == 'int' and pd.api.types.is_numeric_dtype(df[col]):
+            dtype = smallest_int_dtype(df[col])
+            if dtype is not None:
+                df[col] = df[col].astype(dtype)
+        elif kind == 'float':
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+        elif kind == 'category' and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+
+    if report:
+        after = df.memory_usage(deep=True).sum()
+        print(f"Memory for {table_name}: {before / 1024 ** 2:,.1f} MB -> {after / 1024 ** 2:,.1f} MB "
+              f"({(1 - after / before) * 100 if before else 0:.0f}% smaller)")
+    return df